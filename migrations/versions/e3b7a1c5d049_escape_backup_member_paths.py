@@ -0,0 +1,27 @@
+"""escape backup member paths
+
+Revision ID: e3b7a1c5d049
+Revises: d7c4e2a9b165
+Create Date: 2026-10-18 23:58:03.417215
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e3b7a1c5d049"
+down_revision: Union[str, None] = "d7c4e2a9b165"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # backslashes in indexed paths are doubled now that bytes of names that aren't utf-8 are
+    # escaped as \xNN
+    op.execute("UPDATE backupmembers SET path = replace(path, '\\', '\\\\')")
+
+
+def downgrade() -> None:
+    op.execute("UPDATE backupmembers SET path = replace(path, '\\\\', '\\')")
@@ -1,14 +1,23 @@
 import logging
 import os
+import sys
 import uuid
 
+from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.job import Job
 from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
-from src.apschedule.tasks import task_create_backup, task_restore_backup
-from src.models import BackupSchedule, ScheduleCrontab
+from src.apschedule.tasks import (
+    task_create_backup,
+    task_restore_backup,
+    task_restore_path,
+    task_upload_backup,
+    task_verify_backups,
+    task_verify_uploads,
+)
+from src.models import BackupOptions, BackupSchedule, ScheduleCrontab
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +27,14 @@ APSCHEDULE_JOBSTORE_URL = os.environ.get(
     "sqlite:///example.sqlite",
 )
 TZ = os.environ.get("TZ", "UTC")
+# backups run on threads of their own, so backups waiting for a slot don't take the threads
+# restores, verifies and uploads run on
+BACKUP_EXECUTOR = "backups"
+# a backup waits for its device and global slots on its thread, so the pool isn't capped and the
+# backup limiter alone decides what runs. A pool the size of the global cap would be filled by
+# backups queued for one busy device, and backups of idle devices would wait behind them. Threads
+# are only started when none is free
+BACKUP_EXECUTOR_THREADS = sys.maxsize
 
 SCHEDULER = None
 
@@ -25,20 +42,44 @@ SCHEDULER = None
 def setup_scheduler() -> AsyncIOScheduler:
     global SCHEDULER  # noqa: PLW0603
     jobstores = {"default": SQLAlchemyJobStore(url=APSCHEDULE_JOBSTORE_URL)}
-    SCHEDULER = AsyncIOScheduler(jobstores=jobstores, timezone=TZ)
+    executors = {BACKUP_EXECUTOR: ThreadPoolExecutor(BACKUP_EXECUTOR_THREADS)}
+    SCHEDULER = AsyncIOScheduler(jobstores=jobstores, executors=executors, timezone=TZ)
     SCHEDULER.start()
+    move_backup_jobs(SCHEDULER)
     return SCHEDULER
 
 
+def move_backup_jobs(scheduler: AsyncIOScheduler) -> None:
+    """
+    schedules saved before backups had their own executor still run on the default one
+    """
+    for job in scheduler.get_jobs():
+        if job.func is task_create_backup and job.executor != BACKUP_EXECUTOR:
+            job.modify(executor=BACKUP_EXECUTOR)
+
+
+def has_incremental_schedules(scheduler: AsyncIOScheduler) -> bool:
+    """
+    whether a saved backup schedule takes incremental backups
+    """
+    return any(
+        job.func is task_create_backup and job.kwargs.get("options", {}).get("incremental")
+        for job in scheduler.get_jobs()
+    )
+
+
 def add_backup_job(
     job_name: str,
     volume_name: str,
     crontab: ScheduleCrontab = None,
     is_schedule: bool = False,
+    options: BackupOptions | None = None,
 ):
     job_id = str(uuid.uuid4())
 
     kwargs = {"is_schedule": True, "job_name": job_name} if is_schedule else {"job_name": job_name}
+    if options:
+        kwargs["options"] = options.model_dump(mode="json")
 
     if crontab:
         return SCHEDULER.add_job(
@@ -54,6 +95,7 @@ def add_backup_job(
             name=job_name,
             args=[volume_name, job_id],
             kwargs=kwargs,
+            executor=BACKUP_EXECUTOR,
             replace_existing=False,
         )
 
@@ -63,6 +105,7 @@ def add_backup_job(
         name=job_name,
         args=[volume_name, job_id],
         kwargs=kwargs,
+        executor=BACKUP_EXECUTOR,
         replace_existing=False,
         coalesce=True,
     )
@@ -73,6 +116,8 @@ def add_restore_job(
     volume_name: str,
     backup_filename: str,
     crontab: ScheduleCrontab = None,
+    swap: bool = False,
+    source_id: str | None = None,
 ):
     job_id = str(uuid.uuid4())
     if crontab:
@@ -81,7 +126,7 @@ def add_restore_job(
             trigger=CronTrigger(**crontab),
             id=job_id,
             name=job_name,
-            args=[volume_name, backup_filename, job_id, job_name],
+            args=[volume_name, backup_filename, job_id, job_name, swap, source_id],
             replace_existing=False,
         )
 
@@ -89,7 +134,59 @@ def add_restore_job(
         func=task_restore_backup,
         id=job_id,
         name=job_name,
-        args=[volume_name, backup_filename, job_id, job_name],
+        args=[volume_name, backup_filename, job_id, job_name, swap, source_id],
+        replace_existing=False,
+        coalesce=True,
+    )
+
+
+def add_restore_path_job(job_name: str, volume_name: str, backup_id: str, path: str):
+    job_id = str(uuid.uuid4())
+    return SCHEDULER.add_job(
+        func=task_restore_path,
+        id=job_id,
+        name=job_name,
+        args=[volume_name, backup_id, path, job_id, job_name],
+        replace_existing=False,
+        coalesce=True,
+    )
+
+
+def add_verify_job(job_name: str, backup_ids: list[str] | None = None):
+    job_id = str(uuid.uuid4())
+    return SCHEDULER.add_job(
+        func=task_verify_backups,
+        id=job_id,
+        name=job_name,
+        args=[job_id, backup_ids],
+        replace_existing=False,
+        coalesce=True,
+    )
+
+
+def add_verify_uploads_job(
+    job_name: str,
+    backup_ids: list[str] | None = None,
+    source_ids: list[str] | None = None,
+):
+    job_id = str(uuid.uuid4())
+    return SCHEDULER.add_job(
+        func=task_verify_uploads,
+        id=job_id,
+        name=job_name,
+        args=[job_id, backup_ids, source_ids],
+        replace_existing=False,
+        coalesce=True,
+    )
+
+
+def add_upload_job(job_name: str, backup_id: str, source_id: str):
+    job_id = str(uuid.uuid4())
+    return SCHEDULER.add_job(
+        func=task_upload_backup,
+        id=job_id,
+        name=job_name,
+        args=[backup_id, source_id, job_id],
         replace_existing=False,
         coalesce=True,
     )
@@ -112,6 +209,8 @@ def delete_backup_schedule(schedule_id: str):
 
 
 def map_job_to_backup_schedule(job: Job):
+    options = job.kwargs.get("options")
+    options = BackupOptions.model_validate(options) if options else None
     if isinstance(job.trigger, CronTrigger):
         logger.debug("felids: %s", job.trigger.fields)
         cron_fields = {field.name: str(field) for field in job.trigger.fields}
@@ -127,10 +226,12 @@ def map_job_to_backup_schedule(job: Job):
                 month=cron_fields["month"],
                 day_of_week=cron_fields["day_of_week"],
             ),
+            options=options,
         )
 
     return BackupSchedule(
         schedule_id=job.id,
         schedule_name=job.name,
         volume_name=job.args[0],
+        options=options,
     )
@@ -1,99 +1,865 @@
 import logging
 import os
+import time
 import uuid
-from datetime import datetime
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import groupby
 from pathlib import Path
 
 import pytz
 from sqlmodel import Session
 
+from src.archive import ArchiveResult, TeeSinks
+from src.compression import codec_extension, decompress_stream
 from src.db import engine
-from src.docker import backup_volume, restore_volume
-from src.models import BackupFilenames, Backups, BackUpStatus, RestoredBackups
+from src.docker import (
+    TarFilter,
+    backup_volume,
+    get_volume,
+    restore_volume,
+    restore_volume_from_archive,
+    restore_volume_from_stream,
+    select_entries,
+    stream_backup_volume,
+    volume_exclude_patterns,
+)
+from src.fingerprint import backup_fingerprint
+from src.helper_limits import DEFAULT_LIMITS, use_limits
+from src.incremental import commit_snapshot, discard_snapshot, has_snapshot, prepare_snapshot
+from src.limiter import BACKUP_LIMITER, DEFAULT_DEVICE, volume_device
+from src.models import (
+    BackupCodec,
+    BackupFilenames,
+    BackupOptions,
+    Backups,
+    BackUpStatus,
+    BackupStorageFormat,
+    BackupUploads,
+    ContainerDowntime,
+    RestoredBackups,
+    SftpBackupSource,
+    UploadStatus,
+)
+from src.parts import run_concurrently, stream_backup_parts
+from src.progress import track_progress
+from src.quiesce import quiesced_volume
+from src.repository import ChunkStore, backup_volume_to_repository, restore_volume_from_repository
+from src.routes.impl.volumes.backup_index import (
+    db_add_backup_index,
+    db_get_backup_frames,
+    db_get_backup_members,
+    db_has_backup_index,
+)
+from src.routes.impl.volumes.backups import (
+    db_get_archive_backup,
+    db_get_backup,
+    db_get_backup_by_filename,
+    db_get_backup_chain,
+    db_get_latest_backup,
+    db_get_latest_incremental_backup,
+    db_list_backup_parts,
+    db_list_backup_paths,
+    db_list_backups,
+)
+from src.routes.impl.volumes.db import db_get_sftp_backup_source
+from src.routes.impl.volumes.uploads import db_get_backup_upload, db_list_uploaded_archives
+from src.sftp import (
+    SFTP_UPLOAD_RETRIES,
+    SFTP_UPLOAD_RETRY_DELAY,
+    RemoteVerification,
+    SftpConnection,
+    SftpSink,
+    SftpTee,
+    read_remote_file,
+    remote_file_path,
+    sftp_connection,
+    upload_file,
+    upload_with_retries,
+    verify_remote_file,
+)
+from src.swap import swap_restore, verify_restored_volume
+from src.tar_index import ArchiveMember, read_archive_members
+from src.verify import VERIFY_MAX_RATE, Throttle, verify_backup
 
 TZ = os.environ.get("TZ", "UTC")
 BACKUP_DIR = os.getenv("BACKUP_DIR")
+BACKUP_STREAMING = os.getenv("BACKUP_STREAMING", "false").lower() == "true"
+# max level of an incremental chain before a new full backup is taken
+INCREMENTAL_MAX_LEVEL = int(os.getenv("INCREMENTAL_MAX_LEVEL", "6"))
 
 logger = logging.getLogger(__name__)
 
 
+def get_incremental_parent(session: Session, volume_name: str) -> tuple[Backups | None, int]:
+    """
+    find the backup a new incremental backup of the volume is chained to and its level,
+    starts a new chain with a full backup when there is no usable parent
+    """
+    parent = db_get_latest_incremental_backup(session, volume_name)
+    if (
+        not parent
+        or parent.backup_level >= INCREMENTAL_MAX_LEVEL
+        or not has_snapshot(BACKUP_DIR, volume_name)
+    ):
+        return None, 0
+    return parent, parent.backup_level + 1
+
+
+def is_streaming_backup(options: BackupOptions) -> bool:
+    """
+    the helper container only writes gzip archives with the default level, any other codec is
+    compressed by the app from the streamed tar output. Backups uploaded to backup sources are
+    streamed so the archive is teed to them while it's written
+    """
+    return (
+        BACKUP_STREAMING
+        or options.codec != BackupCodec.GZIP
+        or options.codec_level is not None
+        or bool(options.upload_to)
+    )
+
+
+def restore_archive(
+    volume_name: str, backup_file: str, codec: BackupCodec | None, incremental: bool
+) -> None:
+    if codec in (BackupCodec.ZSTD, BackupCodec.LZ4):
+        restore_volume_from_archive(volume_name, BACKUP_DIR, backup_file, codec, incremental=incremental)
+    elif incremental:
+        restore_volume(volume_name, BACKUP_DIR, backup_file, incremental=True)
+    else:
+        restore_volume(volume_name, BACKUP_DIR, backup_file)
+
+
+def backup_device(volume_name: str) -> str:
+    volume = get_volume(volume_name)
+    return volume_device(volume) if volume else DEFAULT_DEVICE
+
+
+def last_backup_size(session: Session, volume_name: str, storage_format: BackupStorageFormat) -> int | None:
+    """
+    size of the last backup of the volume, a new backup is expected to be about the same size
+    """
+    backup = db_get_latest_backup(session, volume_name, storage_format)
+    if not backup or not backup.backup_path:
+        return None
+    try:
+        if storage_format == BackupStorageFormat.Repository:
+            return ChunkStore(BACKUP_DIR).read_manifest(backup.backup_filename)["size"]
+        # the size of backups split into parts is the size of all of them
+        return backup.size or Path(backup.backup_path).stat().st_size
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def file_size(path: str) -> int | None:
+    try:
+        return Path(path).stat().st_size
+    except OSError:
+        return None
+
+
+def save_backup_index(
+    session: Session, backup_id: str, archives: list[tuple[str, ArchiveResult | None]]
+) -> None:
+    results = [result for _, result in archives if result and result.members]
+    if results:
+        # the backup row has to exist before the index rows pointing at it
+        session.flush()
+        db_add_backup_index(
+            session,
+            backup_id,
+            [member for result in results for member in result.members],
+            [frame for result in results for frame in result.frames],
+        )
+
+
+def backup_filenames(
+    backup_id: str, archives: list[tuple[str, ArchiveResult | None]]
+) -> list[BackupFilenames]:
+    if len(archives) == 1:
+        return [BackupFilenames(backup_filename=archives[0][0], backup_id=backup_id)]
+    return [
+        BackupFilenames(
+            backup_filename=filename,
+            backup_id=backup_id,
+            part=part,
+            checksum=result.checksum,
+            size=result.size,
+        )
+        for part, (filename, result) in enumerate(archives)
+    ]
+
+
+def get_indexed_backup(session: Session, backup_id: str, path: str) -> tuple[Backups, list[ArchiveMember]]:
+    backup = db_get_backup(session, backup_id)
+    if not backup:
+        msg = f"Backup {backup_id} does not exist"
+        raise ValueError(msg)
+    backup = db_get_archive_backup(session, backup)
+    members = db_get_backup_members(session, backup.backup_id, path)
+    if not members:
+        msg = f"{path} is not in the index of backup {backup_id}"
+        raise ValueError(msg)
+    return backup, members
+
+
+def write_archive_backup(
+    session: Session,
+    volume_name: str,
+    source_volume: str,
+    backup_file: str,
+    options: BackupOptions,
+    tar_filter: TarFilter | None = None,
+    tee: TeeSinks | None = None,
+) -> tuple[Backups | None, int | None, list[tuple[str, ArchiveResult | None]], str | None]:
+    """
+    write an archive of source_volume, which is volume_name or a staging copy of it. Returns the
+    parent and level of incremental backups, the filename of every archive written with the
+    result of the streamed ones and the sha256 of the archive taken while it was written, backups
+    split into parts have an archive per part with its own. Streamed archives are teed to the
+    sinks tee makes
+    """
+    if options.parts:
+        archives = stream_backup_parts(
+            source_volume,
+            BACKUP_DIR,
+            backup_file,
+            options.parts,
+            codec=options.codec,
+            codec_level=options.codec_level,
+            tar_filter=tar_filter,
+            tee=tee,
+        )
+        return None, None, archives, None
+
+    parent, level, snapshot_file, archive_result = None, None, None, None
+    if options.incremental:
+        parent, level = get_incremental_parent(session, volume_name)
+        snapshot_file = prepare_snapshot(BACKUP_DIR, volume_name, level)
+        logger.info("incremental backup of %s at level %s", volume_name, level)
+
+    try:
+        if is_streaming_backup(options):
+            archive_result = stream_backup_volume(
+                source_volume,
+                BACKUP_DIR,
+                backup_file,
+                snapshot_file=snapshot_file,
+                codec=options.codec,
+                codec_level=options.codec_level,
+                tar_filter=tar_filter,
+                tee=tee,
+            )
+            checksum = archive_result.checksum
+        else:
+            checksum = backup_volume(
+                source_volume, BACKUP_DIR, backup_file, snapshot_file=snapshot_file, tar_filter=tar_filter
+            )
+    except Exception:
+        if snapshot_file:
+            discard_snapshot(BACKUP_DIR, volume_name)
+        raise
+
+    if snapshot_file:
+        commit_snapshot(BACKUP_DIR, volume_name)
+    return parent, level, [(backup_file, archive_result)], checksum
+
+
+def unchanged_backup(
+    session: Session,
+    previous: Backups,
+    backup_id: str,
+    job_name: str | None,
+    created_at: datetime,
+    schedule_id: str | None,
+) -> Backups:
+    """
+    a backup of a volume that didn't change since the previous backup, it uses the archive of
+    the previous backup instead of writing its own
+    """
+    archive_backup = db_get_archive_backup(session, previous)
+    return Backups(
+        **previous.model_dump(
+            exclude={
+                "backup_id",
+                "schedule_id",
+                "backup_name",
+                "created_at",
+                "verified",
+                "verified_at",
+                "unchanged_backup_id",
+            }
+        ),
+        backup_id=backup_id,
+        schedule_id=schedule_id,
+        backup_name=job_name,
+        created_at=created_at.isoformat(),
+        unchanged_backup_id=archive_backup.backup_id,
+    )
+
+
 def task_create_backup(
     volume_name: str,
     job_id: str,
     job_name: str | None = None,
     is_schedule: bool = False,
+    options: dict | None = None,
+) -> None:
+    backup_options = BackupOptions.model_validate(options or {})
+    # TODO: hack to get this to work as the current apschedule events have no useful info sent to it
+    backup_id = str(uuid.uuid4()) if is_schedule else job_id
+    with Session(engine) as session:
+        sources = [db_get_sftp_backup_source(session, source_id) for source_id in backup_options.upload_to]
+    # the archive is written once and teed to the backup sources, what a source fell behind on
+    # is uploaded from the backup dir afterwards
+    tee = SftpTee([source for source in sources if source]) if any(sources) else None
+    try:
+        create_backup(volume_name, backup_id, job_id, job_name, is_schedule, backup_options, tee)
+    except Exception:
+        if tee:
+            tee.discard()
+        raise
+    if tee and tee.sinks:
+        with Session(engine) as session:
+            session.add_all([teed_upload(backup_id, sink) for sink in tee.sinks])
+            session.commit()
+    if backup_options.upload_to:
+        # imported here as the schedule module imports the tasks
+        from src.apschedule.schedule import add_upload_job
+
+        # every upload is a job of its own, so the backup doesn't hold a thread of the backup
+        # executor while it runs and a failed upload doesn't fail the backup
+        for source_id in backup_options.upload_to:
+            add_upload_job(f"upload-{uuid.uuid4()!s}", backup_id, source_id)
+
+
+def create_backup(
+    volume_name: str,
+    backup_id: str,
+    job_id: str,
+    job_name: str | None,
+    is_schedule: bool,
+    backup_options: BackupOptions,
+    tee: TeeSinks | None = None,
+) -> None:
+    limits = DEFAULT_LIMITS.merge(backup_options.limits)
+    # waits here while too many backups are running overall or on the volume's device
+    with BACKUP_LIMITER.acquire(backup_device(volume_name)), Session(engine) as session:
+        expected_bytes = last_backup_size(session, volume_name, backup_options.storage_format)
+        with (
+            track_progress(backup_id, "backup", volume_name, expected_bytes=expected_bytes),
+            use_limits(limits),
+        ):
+            dt_now = datetime.now(tz=pytz.timezone(TZ))
+            downtimes: list[ContainerDowntime] = []
+            try:
+                # the patterns of the volume label apply to every backup of it
+                exclude = [*volume_exclude_patterns(get_volume(volume_name)), *backup_options.exclude]
+                # fingerprinted before quiescing so an unchanged volume's containers aren't stopped
+                fingerprint = (
+                    backup_fingerprint(volume_name, backup_options, exclude)
+                    if backup_options.skip_unchanged
+                    else None
+                )
+                previous = db_get_latest_backup(session, volume_name, backup_options.storage_format)
+                if fingerprint and previous and previous.fingerprint == fingerprint:
+                    logger.info("volume %s didn't change since backup %s", volume_name, previous.backup_id)
+                    session.add(
+                        unchanged_backup(
+                            session, previous, backup_id, job_name, dt_now, job_id if is_schedule else None
+                        )
+                    )
+                    session.commit()
+                    return
+                with quiesced_volume(
+                    volume_name, backup_options.quiesce, backup_id, downtimes
+                ) as source_volume:
+                    parent, level, checksum = None, None, None
+                    tar_filter = TarFilter(select_entries(source_volume, backup_options.include), exclude)
+                    if backup_options.storage_format == BackupStorageFormat.Repository:
+                        backup_file = f"{volume_name}-{dt_now.isoformat()}.manifest.json"
+                        result = backup_volume_to_repository(
+                            session, source_volume, BACKUP_DIR, backup_file, tar_filter
+                        )
+                        backup_path = str(result.manifest_path)
+                        checksum = result.manifest_checksum
+                        archives = [(backup_file, None)]
+                    else:
+                        backup_file = (
+                            f"{volume_name}-{dt_now.isoformat()}{codec_extension(backup_options.codec)}"
+                        )
+                        parent, level, archives, checksum = write_archive_backup(
+                            session,
+                            volume_name,
+                            source_volume,
+                            backup_file,
+                            backup_options,
+                            tar_filter,
+                            tee,
+                        )
+                        backup_file = archives[0][0]
+                        backup_path = str(Path(BACKUP_DIR) / backup_file)
+
+                backup = Backups(
+                    backup_id=backup_id,
+                    backup_filename=backup_file,
+                    backup_name=job_name,
+                    created_at=dt_now.isoformat(),
+                    successful=True,
+                    backup_path=backup_path,
+                    volume_name=volume_name,
+                    status=BackUpStatus.Processed,
+                    parent_backup_id=parent.backup_id if parent else None,
+                    backup_level=level,
+                    storage_format=backup_options.storage_format,
+                    checksum=checksum,
+                    size=file_size(backup_path)
+                    if len(archives) == 1
+                    else sum(result.size for _, result in archives),
+                    limits=limits.model_dump(exclude_defaults=True) or None,
+                    include=backup_options.include or None,
+                    exclude=exclude or None,
+                    fingerprint=fingerprint,
+                )
+                if backup_options.storage_format == BackupStorageFormat.Archive:
+                    backup.codec = backup_options.codec
+                    backup.codec_level = backup_options.codec_level
+
+                if is_schedule:
+                    backup.schedule_id = job_id
+                session.add_all(backup_filenames(backup_id, archives))
+                session.add(backup)
+                save_backup_index(session, backup_id, archives)
+                session.add_all(downtimes)
+                session.commit()
+            except Exception as e:
+                session.rollback()
+                session.add(
+                    Backups(
+                        backup_id=backup_id,
+                        backup_name=job_name,
+                        created_at=dt_now.isoformat(),
+                        successful=False,
+                        error_message=str(e),
+                        status=BackUpStatus.Errored,
+                    ),
+                )
+                session.add_all(downtimes)
+                session.commit()
+                raise
+
+
+def teed_upload(backup_id: str, sink: SftpSink) -> BackupUploads:
+    """
+    the upload of an archive teed to a backup source while the backup wrote it, the upload
+    after the backup resumes the ones the source fell behind on from the confirmed offset
+    """
+    finished_at = datetime.now(tz=pytz.timezone(TZ))
+    return BackupUploads(
+        backup_id=backup_id,
+        source_id=str(sink.source.id),
+        backup_filename=sink.filename,
+        remote_path=sink.remote_path,
+        status=UploadStatus.Uploaded if sink.complete else UploadStatus.Failed,
+        size=(Path(BACKUP_DIR) / sink.filename).stat().st_size,
+        confirmed_bytes=sink.size if sink.complete else sink.confirmed,
+        throughput=sink.size / max(sink.elapsed, 0.001) if sink.complete else None,
+        started_at=(finished_at - timedelta(seconds=sink.elapsed)).isoformat(),
+        finished_at=finished_at.isoformat(),
+        error_message=sink.error,
+    )
+
+
+def upload_archive(
+    session: Session,
+    source: SftpBackupSource,
+    backup_id: str,
+    backup_filename: str,
+    local_path: Path,
+) -> BackupUploads:
+    """
+    upload an archive to a backup source and record the upload, an upload that didn't complete
+    before resumes from the offset the remote confirmed
+    """
+    key = (backup_id, str(source.id), backup_filename)
+    upload = db_get_backup_upload(session, *key) or BackupUploads(
+        backup_id=backup_id,
+        source_id=str(source.id),
+        backup_filename=backup_filename,
+        remote_path=remote_file_path(source, backup_filename),
+        size=local_path.stat().st_size,
+    )
+    if upload.status == UploadStatus.Uploaded:
+        logger.info("%s is already uploaded to %s", backup_filename, upload.remote_path)
+        return upload
+    upload.status = UploadStatus.Uploading
+    upload.started_at = datetime.now(tz=pytz.timezone(TZ)).isoformat()
+    upload.error_message = None
+    session.add(upload)
+    session.commit()
+
+    confirmed = [upload.confirmed_bytes]
+
+    def on_confirmed(offset: int) -> None:
+        # called from the upload streams, saved right away so a crash doesn't lose it
+        confirmed[0] = offset
+        with Session(engine) as confirm_session:
+            confirmed_upload = db_get_backup_upload(confirm_session, *key)
+            confirmed_upload.confirmed_bytes = offset
+            confirm_session.add(confirmed_upload)
+            confirm_session.commit()
+
+    started = time.monotonic()
+    try:
+        sent = upload_with_retries(
+            partial(sftp_connection, source),
+            lambda connection: upload_file(
+                connection, local_path, upload.remote_path, confirmed[0], on_confirmed
+            ),
+            SFTP_UPLOAD_RETRIES,
+            SFTP_UPLOAD_RETRY_DELAY,
+        )
+    except Exception as e:
+        upload = db_get_backup_upload(session, *key)
+        upload.status = UploadStatus.Failed
+        upload.error_message = str(e)
+        upload.finished_at = datetime.now(tz=pytz.timezone(TZ)).isoformat()
+        session.add(upload)
+        session.commit()
+        raise
+
+    upload = db_get_backup_upload(session, *key)
+    upload.status = UploadStatus.Uploaded
+    upload.confirmed_bytes = upload.size
+    upload.throughput = sent / max(time.monotonic() - started, 0.001)
+    upload.finished_at = datetime.now(tz=pytz.timezone(TZ)).isoformat()
+    session.add(upload)
+    session.commit()
+    logger.info(
+        "uploaded %s to %s, %s bytes at %.1f MiB/s",
+        backup_filename,
+        upload.remote_path,
+        sent,
+        upload.throughput / 1024 / 1024,
+    )
+    return upload
+
+
+def archive_checksum(session: Session, backup: Backups, backup_filename: str) -> str | None:
+    """
+    sha256 recorded for an archive of a backup, parts have their own
+    """
+    parts = {part.backup_filename: part for part in db_list_backup_parts(session, backup.backup_id)}
+    return parts[backup_filename].checksum if backup_filename in parts else backup.checksum
+
+
+def verify_upload(session: Session, connection: SftpConnection, upload: BackupUploads) -> bool | None:
+    """
+    check the copy of an archive on a backup source against the local archive without
+    downloading it and record the result, None when it couldn't be checked
+    """
+    backup = db_get_backup(session, upload.backup_id)
+    try:
+        result = verify_remote_file(
+            connection,
+            upload.remote_path,
+            upload.size,
+            archive_checksum(session, backup, upload.backup_filename),
+            Path(backup.backup_path).with_name(upload.backup_filename) if backup.backup_path else None,
+        )
+    except FileNotFoundError:
+        logger.warning("%s is missing on backup source %s", upload.remote_path, upload.source_id)
+        result = RemoteVerification(verified=False)
+    except RuntimeError:
+        logger.exception("verifying %s failed", upload.remote_path)
+        return None
+
+    upload.verified = result.verified
+    upload.verify_method = result.method
+    upload.remote_checksum = result.checksum
+    upload.verified_at = datetime.now(tz=pytz.timezone(TZ)).isoformat()
+    session.add(upload)
+    session.commit()
+    logger.info("verified %s by %s: %s", upload.remote_path, result.method, result.verified)
+    return result.verified
+
+
+def task_upload_backup(backup_id: str, source_id: str, job_id: str) -> None:
+    """
+    upload the archives of a backup to a sftp backup source
+    """
+    with Session(engine) as session:
+        backup = db_get_backup(session, backup_id)
+        if not backup:
+            msg = f"Backup {backup_id} does not exist"
+            raise ValueError(msg)
+        source = db_get_sftp_backup_source(session, source_id)
+        if not source:
+            msg = f"Backup source {source_id} does not exist"
+            raise ValueError(msg)
+        # unchanged backups upload the archive they use, which is then only sent once
+        backup = db_get_archive_backup(session, backup)
+        if backup.storage_format == BackupStorageFormat.Repository:
+            msg = f"Backup {backup_id} is stored in the repository, only archives can be uploaded"
+            raise ValueError(msg)
+
+        with track_progress(job_id, "upload", backup.volume_name):
+            uploads = [
+                upload_archive(session, source, backup.backup_id, Path(path).name, Path(path))
+                for path in db_list_backup_paths(session, backup)
+            ]
+        # verified right away, while the local archives are there to compare with
+        with sftp_connection(source) as connection:
+            for upload in uploads:
+                if upload.verified is None:
+                    verify_upload(session, connection, upload)
+
+
+def task_verify_uploads(
+    job_id: str,
+    backup_ids: list[str] | None = None,
+    source_ids: list[str] | None = None,
 ) -> None:
+    """
+    check the copies of the archives on the backup sources without downloading them and record
+    if they still match
+    """
     with Session(engine) as session:
-        # TODO: hack to get this to work as the current apschedule events have no useful info sent to it
-        backup_id = str(uuid.uuid4()) if is_schedule else job_id
+        if backup_ids:
+            # unchanged backups were uploaded as the backup whose archive they use
+            backups = db_list_backups(session, backup_ids)
+            backup_ids = [db_get_archive_backup(session, backup).backup_id for backup in backups]
+        uploads = db_list_uploaded_archives(session, backup_ids, source_ids)
+        failed = []
+        for source_id, source_uploads in groupby(uploads, key=lambda upload: upload.source_id):
+            source = db_get_sftp_backup_source(session, source_id)
+            if not source:
+                logger.warning("backup source %s of uploads to verify does not exist", source_id)
+                continue
+            try:
+                with sftp_connection(source) as connection:
+                    failed.extend(
+                        upload.remote_path
+                        for upload in source_uploads
+                        if verify_upload(session, connection, upload) is False
+                    )
+            except Exception:
+                logger.exception("verifying the uploads to backup source %s failed", source.name)
+        logger.info(
+            "verify job %s checked %s uploads, %s failed: %s",
+            job_id,
+            len(uploads),
+            len(failed),
+            failed,
+        )
+
+
+def restore_remote_archive(
+    volume_name: str,
+    source: SftpBackupSource,
+    upload: BackupUploads,
+    codec: BackupCodec | None,
+    incremental: bool,
+) -> None:
+    """
+    restore an archive uploaded to a backup source by streaming it into the helper, nothing is
+    written to the backup dir
+    """
+    logger.info("restoring %s from %s", upload.remote_path, source.hostname)
+    with sftp_connection(source) as connection:
+        restore_volume_from_stream(
+            volume_name,
+            decompress_stream(
+                codec or BackupCodec.GZIP, read_remote_file(connection, upload.remote_path, upload.size)
+            ),
+            incremental=incremental,
+        )
+
+
+def archive_restore(
+    session: Session,
+    volume_name: str,
+    source: SftpBackupSource | None,
+    backup: Backups | None,
+    backup_file: str,
+    incremental: bool,
+) -> Callable[[], None]:
+    """
+    restores an archive from the backup dir, or from the backup source it was uploaded to
+    """
+    codec = backup.codec if backup else None
+    if not source:
+        return partial(restore_archive, volume_name, backup_file, codec, incremental)
+    upload = (
+        db_get_backup_upload(session, backup.backup_id, str(source.id), backup_file) if backup else None
+    )
+    if not upload or upload.status != UploadStatus.Uploaded:
+        msg = f"{backup_file} isn't uploaded to backup source {source.name}"
+        raise ValueError(msg)
+    return partial(restore_remote_archive, volume_name, source, upload, codec, incremental)
+
+
+def get_restore_source(session: Session, source_id: str | None) -> SftpBackupSource | None:
+    if not source_id:
+        return None
+    source = db_get_sftp_backup_source(session, source_id)
+    if not source:
+        msg = f"Backup source {source_id} does not exist"
+        raise ValueError(msg)
+    return source
+
+
+def restore_backup_file(
+    session: Session,
+    volume_name: str,
+    backup_file: str,
+    source: SftpBackupSource | None = None,
+) -> Backups | None:
+    """
+    restore a backup from the backup dir, or streamed from the copy on source
+    """
+    backup = db_get_backup_by_filename(session, backup_file)
+    if backup:
+        backup = db_get_archive_backup(session, backup)
+    parts = db_list_backup_parts(session, backup.backup_id) if backup else []
+    if backup and backup.storage_format == BackupStorageFormat.Repository:
+        if source:
+            msg = f"Backup {backup_file} is stored in the repository, backup sources only hold archives"
+            raise ValueError(msg)
+        restore_volume_from_repository(volume_name, BACKUP_DIR, backup_file)
+    elif parts:
+        # the parts hold different files so they're extracted at the same time
+        logger.info("restoring %s parts of %s", len(parts), backup_file)
+        run_concurrently(
+            [
+                archive_restore(
+                    session, volume_name, source, backup, part.backup_filename, incremental=False
+                )
+                for part in parts
+            ]
+        )
+    elif backup and backup.backup_level is not None:
+        # incremental backups are restored by replaying the chain from the full backup
+        for chain_backup in db_get_backup_chain(session, backup):
+            logger.info("restoring %s level %s", chain_backup.backup_filename, chain_backup.backup_level)
+            archive_restore(
+                session, volume_name, source, chain_backup, chain_backup.backup_filename, incremental=True
+            )()
+    else:
+        archive_restore(session, volume_name, source, backup, backup_file, incremental=False)()
+    return backup
+
+
+def verify_restore(session: Session, backup: Backups | None, volume_name: str) -> None:
+    """
+    check a restored volume against the index of the backup, backups without a full index
+    are only checked by tar exiting cleanly
+    """
+    if not backup or backup.backup_level or not db_has_backup_index(session, backup.backup_id):
+        logger.info("backup %s has no index to verify the restore of %s with", backup, volume_name)
+        return
+    verify_restored_volume(volume_name, db_get_backup_members(session, backup.backup_id, ""))
+
+
+def task_restore_backup(
+    volume_name: str,
+    backup_file: str,
+    job_id: str,
+    job_name: str | None = None,
+    swap: bool = False,
+    source_id: str | None = None,
+) -> None:
+    # TODO: hack to get this to work as the current apschedule events have no useful info sent to it
+    with Session(engine) as session, track_progress(job_id, "restore", volume_name):
         dt_now = datetime.now(tz=pytz.timezone(TZ))
         try:
-            backup_file = f"{volume_name}-{dt_now.isoformat()}.tar.gz"
-            backup_volume(volume_name, BACKUP_DIR, backup_file)
+            logger.info("backup dir: %s", BACKUP_DIR)
+            # restores from a backup source stream the archive instead of reading the backup dir
+            source = get_restore_source(session, source_id)
+            rollback_volume = None
+            if swap:
+                # restored into a new volume that's swapped in once it's complete and verified
+                with swap_restore(volume_name, job_id) as rollback_volume:
+                    backup = restore_backup_file(session, rollback_volume, backup_file, source)
+                    verify_restore(session, backup, rollback_volume)
+            else:
+                restore_backup_file(session, volume_name, backup_file, source)
 
-            backup = Backups(
-                backup_id=backup_id,
+            backup = RestoredBackups(
+                restore_id=job_id,
                 backup_filename=backup_file,
-                backup_name=job_name,
+                restore_name=job_name,
                 created_at=dt_now.isoformat(),
                 successful=True,
                 backup_path=str(Path(BACKUP_DIR) / backup_file),
                 volume_name=volume_name,
-                status=BackUpStatus.Processed,
-            )
-
-            if is_schedule:
-                backup.schedule_id = job_id
-            session.add(
-                BackupFilenames(backup_filename=backup_file, backup_id=backup_id),
+                rollback_volume=rollback_volume,
             )
             session.add(backup)
             session.commit()
         except Exception as e:
             session.rollback()
             session.add(
-                Backups(
-                    backup_id=backup_id,
-                    backup_name=job_name,
-                    created_at=dt_now.isoformat(),
+                RestoredBackups(
+                    restore_id=job_id,
+                    restore_name=job_name,
                     successful=False,
+                    created_at=dt_now.isoformat(),
                     error_message=str(e),
-                    status=BackUpStatus.Errored,
                 ),
             )
             session.commit()
             raise
 
 
-def task_restore_backup(
+def task_restore_path(
     volume_name: str,
-    backup_file: str,
+    backup_id: str,
+    path: str,
     job_id: str,
     job_name: str | None = None,
 ) -> None:
-    # TODO: hack to get this to work as the current apschedule events have no useful info sent to it
-    with Session(engine) as session:
+    """
+    restore a file or directory from an indexed backup, only the frames of the archive holding
+    it are read and decompressed
+    """
+    with Session(engine) as session, track_progress(job_id, "restore", volume_name):
         dt_now = datetime.now(tz=pytz.timezone(TZ))
+        backup_file = None
         try:
-            logger.info("backup dir: %s", BACKUP_DIR)
-            restore_volume(volume_name, BACKUP_DIR, backup_file)
+            backup, members = get_indexed_backup(session, backup_id, path)
+            backup_file = backup.backup_filename
 
-            backup = RestoredBackups(
-                restore_id=job_id,
-                backup_filename=backup_file,
-                restore_name=job_name,
-                created_at=dt_now.isoformat(),
-                successful=True,
-                backup_path=str(Path(BACKUP_DIR) / backup_file),
-                volume_name=volume_name,
+            logger.info("restoring %s members of %s from %s", len(members), path, backup_file)
+            restore_volume_from_stream(
+                volume_name,
+                read_archive_members(
+                    db_list_backup_paths(session, backup),
+                    backup.codec or BackupCodec.GZIP,
+                    db_get_backup_frames(session, backup.backup_id),
+                    members,
+                ),
+            )
+
+            session.add(
+                RestoredBackups(
+                    restore_id=job_id,
+                    backup_filename=backup_file,
+                    restore_name=job_name,
+                    created_at=dt_now.isoformat(),
+                    successful=True,
+                    volume_name=volume_name,
+                )
             )
-            session.add(backup)
             session.commit()
         except Exception as e:
             session.rollback()
             session.add(
                 RestoredBackups(
                     restore_id=job_id,
+                    backup_filename=backup_file,
                     restore_name=job_name,
                     successful=False,
                     created_at=dt_now.isoformat(),
@@ -102,3 +868,38 @@ def task_restore_backup(
             )
             session.commit()
             raise
+
+
+def task_verify_backups(job_id: str, backup_ids: list[str] | None = None) -> None:
+    """
+    re-hash processed backups at a throttled rate and record if they still match
+    """
+    with Session(engine) as session:
+        backups = db_list_backups(session, backup_ids, BackUpStatus.Processed)
+        throttle = Throttle(VERIFY_MAX_RATE * 1024 * 1024)
+        failed = []
+        verified: set[str] = set()
+        for backup in backups:
+            # unchanged backups share the archive of another backup, it's hashed once per job
+            archive_backup = db_get_archive_backup(session, backup)
+            if archive_backup.backup_id not in verified:
+                verified.add(archive_backup.backup_id)
+                verify_backup(
+                    archive_backup,
+                    BACKUP_DIR,
+                    throttle,
+                    db_list_backup_parts(session, archive_backup.backup_id),
+                )
+            backup.checksum = archive_backup.checksum
+            backup.verified, backup.verified_at = archive_backup.verified, archive_backup.verified_at
+            if backup.verified is False:
+                failed.append(backup.backup_id)
+            session.add_all([backup, archive_backup])
+            session.commit()
+        logger.info(
+            "verify job %s checked %s backups, %s failed: %s",
+            job_id,
+            len(backups),
+            len(failed),
+            failed,
+        )
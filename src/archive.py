@@ -0,0 +1,156 @@
+import hashlib
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Protocol
+
+from src.compression import get_compressor
+from src.models import BackupCodec
+from src.tar_index import ArchiveFrame, ArchiveMember
+
+# uncompressed bytes per independently compressed frame of backup archives, small enough to
+# get single files out quickly and large enough to barely change the compression ratio
+FRAME_SIZE = 4 * 1024 * 1024
+
+
+class ArchiveSink(Protocol):
+    def write(self, data: bytes) -> None: ...
+
+    def close(self) -> None: ...
+
+    def abort(self) -> None: ...
+
+
+# makes the sinks an archive is teed to besides the backup dir, called with its filename
+TeeSinks = Callable[[str], list[ArchiveSink]]
+
+
+class FileSink:
+    """
+    writes the archive to a .part file next to the final path and only moves it into place
+    when the archive is complete, so a failed backup never leaves a truncated archive behind
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.part_path = self.path.with_name(f"{self.path.name}.part")
+        self._file = self.part_path.open("wb")
+
+    def write(self, data: bytes) -> None:
+        self._file.write(data)
+
+    def close(self) -> None:
+        self._file.close()
+        self.part_path.replace(self.path)
+
+    def abort(self) -> None:
+        self._file.close()
+        self.part_path.unlink(missing_ok=True)
+
+
+@dataclass
+class ArchiveResult:
+    # bytes written to the sinks
+    size: int
+    # bytes of the uncompressed tar stream read from the helper container
+    source_size: int
+    # sha256 of the bytes written to the sinks
+    checksum: str
+    frames: list[ArchiveFrame] = field(default_factory=list)
+    members: list[ArchiveMember] = field(default_factory=list)
+
+
+class ArchivePipeline:
+    """
+    compresses, hashes and writes a tar stream to all sinks in a single pass.
+
+    with a frame_size the stream is compressed as independent frames (gzip members, zstd or lz4
+    frames) of that many uncompressed bytes, which standard tools still read as one archive but
+    lets a part of it be decompressed without starting from the beginning. The compressor ends
+    a frame and goes on with the next one, it isn't made again for every frame
+    """
+
+    def __init__(
+        self,
+        sinks: list[ArchiveSink],
+        codec: BackupCodec = BackupCodec.GZIP,
+        codec_level: int | None = None,
+        frame_size: int | None = None,
+        threads: int = -1,
+    ) -> None:
+        self.sinks = sinks
+        self.size = 0
+        self.source_size = 0
+        self.frames: list[ArchiveFrame] = []
+        self.codec = codec
+        self.codec_level = codec_level
+        self.frame_size = frame_size
+        self._compressor = get_compressor(codec, codec_level, threads)
+        self._frame_start = ArchiveFrame(source_offset=0, offset=0, size=0)
+        self._hash = hashlib.sha256()
+
+    def write(self, chunk: bytes) -> None:
+        if not self._compressor:
+            self.source_size += len(chunk)
+            self._emit(chunk)
+            return
+
+        while chunk:
+            part = chunk
+            if self.frame_size:
+                part = chunk[: self.frame_size - (self.source_size - self._frame_start.source_offset)]
+            chunk = chunk[len(part) :]
+            self.source_size += len(part)
+            self._emit(self._compressor.compress(part))
+            if self.frame_size and self.source_size - self._frame_start.source_offset >= self.frame_size:
+                self._end_frame()
+
+    def close(self) -> ArchiveResult:
+        if self._compressor and (self.source_size > self._frame_start.source_offset or not self.frames):
+            self._end_frame()
+        for sink in self.sinks:
+            sink.close()
+        return ArchiveResult(
+            size=self.size,
+            source_size=self.source_size,
+            checksum=self._hash.hexdigest(),
+            frames=self.frames,
+        )
+
+    def _end_frame(self) -> None:
+        self._emit(self._compressor.flush())
+        self._frame_start.size = self.size - self._frame_start.offset
+        self.frames.append(self._frame_start)
+        self._frame_start = ArchiveFrame(source_offset=self.source_size, offset=self.size, size=0)
+
+    def abort(self) -> None:
+        for sink in self.sinks:
+            sink.abort()
+
+    def _emit(self, data: bytes) -> None:
+        if not data:
+            return
+        self._hash.update(data)
+        self.size += len(data)
+        for sink in self.sinks:
+            sink.write(data)
+
+
+def write_archive(
+    chunks: Iterable[bytes],
+    sinks: list[ArchiveSink],
+    codec: BackupCodec = BackupCodec.GZIP,
+    codec_level: int | None = None,
+    frame_size: int | None = None,
+    threads: int = -1,
+) -> ArchiveResult:
+    pipeline = ArchivePipeline(
+        sinks, codec=codec, codec_level=codec_level, frame_size=frame_size, threads=threads
+    )
+    try:
+        for chunk in chunks:
+            pipeline.write(chunk)
+    except Exception:
+        pipeline.abort()
+        raise
+    return pipeline.close()
@@ -0,0 +1,188 @@
+import io
+import os
+import zlib
+from collections.abc import Callable, Iterable, Iterator
+from pathlib import Path
+from typing import Protocol
+
+from src.models import CODEC_LEVELS, BackupCodec
+
+CODEC_EXTENSIONS = {
+    BackupCodec.NONE: ".tar",
+    BackupCodec.GZIP: ".tar.gz",
+    BackupCodec.ZSTD: ".tar.zst",
+    BackupCodec.LZ4: ".tar.lz4",
+}
+
+# gzip container for zlib, 16 + max window size
+GZIP_WBITS = 31
+READ_CHUNK_SIZE = 1024 * 1024
+# uncompressed bytes the zstd worker threads compress in parallel, small enough to split a
+# frame of an indexed archive between several of them. A single worker keeps the default as
+# smaller jobs only cost it time
+ZSTD_JOB_SIZE = 1024 * 1024
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    # ends the current frame (gzip member), data compressed after it starts a new one
+    def flush(self) -> bytes: ...
+
+
+class Decompressor(Protocol):
+    eof: bool
+    unused_data: bytes
+
+    def decompress(self, data: bytes) -> bytes: ...
+
+
+def _import_zstandard():  # noqa: ANN202
+    try:
+        import zstandard
+    except ImportError as e:
+        raise RuntimeError("the zstd codec needs the zstandard package installed") from e
+    return zstandard
+
+
+def _import_lz4_frame():  # noqa: ANN202
+    try:
+        import lz4.frame
+    except ImportError as e:
+        raise RuntimeError("the lz4 codec needs the lz4 package installed") from e
+    return lz4.frame
+
+
+class GzipCompressor:
+    def __init__(self, level: int) -> None:
+        self._level = level
+        self._compressor = zlib.compressobj(level, wbits=GZIP_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        data = self._compressor.flush()
+        self._compressor = zlib.compressobj(self._level, wbits=GZIP_WBITS)
+        return data
+
+
+class ZstdCompressor:
+    """
+    compresses every frame with the same context, so the worker threads and their buffers are
+    kept instead of being set up again for each frame
+    """
+
+    def __init__(self, level: int, threads: int) -> None:
+        zstandard = _import_zstandard()
+        if threads < 0:
+            threads = os.cpu_count() or 1
+        params = zstandard.ZstdCompressionParameters.from_level(
+            level, threads=threads, job_size=ZSTD_JOB_SIZE if threads > 1 else 0
+        )
+        self._flush_frame = zstandard.FLUSH_FRAME
+        self._output = io.BytesIO()
+        self._writer = zstandard.ZstdCompressor(compression_params=params).stream_writer(
+            self._output, closefd=False
+        )
+
+    def compress(self, data: bytes) -> bytes:
+        self._writer.write(data)
+        return self._take_output()
+
+    def flush(self) -> bytes:
+        self._writer.flush(self._flush_frame)
+        return self._take_output()
+
+    def _take_output(self) -> bytes:
+        data = self._output.getvalue()
+        self._output.seek(0)
+        self._output.truncate()
+        return data
+
+
+class Lz4Compressor:
+    def __init__(self, level: int) -> None:
+        self._compressor = _import_lz4_frame().LZ4FrameCompressor(compression_level=level)
+        self._started = False
+
+    def compress(self, data: bytes) -> bytes:
+        header = b""
+        if not self._started:
+            header = self._compressor.begin()
+            self._started = True
+        return header + self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        header = b"" if self._started else self._compressor.begin()
+        self._started = False
+        return header + self._compressor.flush()
+
+
+def codec_extension(codec: BackupCodec) -> str:
+    return CODEC_EXTENSIONS[codec]
+
+
+def get_compressor(codec: BackupCodec, level: int | None = None, threads: int = -1) -> Compressor | None:
+    """
+    get a streaming compressor for the codec, zstd uses threads worker threads, -1 is one per
+    cpu core
+    """
+    if codec == BackupCodec.NONE:
+        return None
+    if level is None:
+        level = CODEC_LEVELS[codec][2]
+    if codec == BackupCodec.GZIP:
+        return GzipCompressor(level)
+    if codec == BackupCodec.ZSTD:
+        return ZstdCompressor(level, threads)
+    if codec == BackupCodec.LZ4:
+        return Lz4Compressor(level)
+    msg = f"Unknown codec {codec}"
+    raise ValueError(msg)
+
+
+def _decompressor_factory(codec: BackupCodec) -> Callable[[], Decompressor]:
+    if codec == BackupCodec.GZIP:
+        return lambda: zlib.decompressobj(wbits=GZIP_WBITS)
+    if codec == BackupCodec.ZSTD:
+        return _import_zstandard().ZstdDecompressor().decompressobj
+    if codec == BackupCodec.LZ4:
+        return _import_lz4_frame().LZ4FrameDecompressor
+    msg = f"Unknown codec {codec}"
+    raise ValueError(msg)
+
+
+def decompress_stream(codec: BackupCodec, chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    decompress a stream that can hold several concatenated frames (gzip members)
+    """
+    if codec == BackupCodec.NONE:
+        yield from chunks
+        return
+
+    factory = _decompressor_factory(codec)
+    decompressor = factory()
+    # whether the current frame has had any input, so a truncated frame can be told apart
+    # from the end of the stream
+    in_frame = False
+    for chunk in chunks:
+        data = chunk
+        while data:
+            in_frame = True
+            if output := decompressor.decompress(data):
+                yield output
+            if not decompressor.eof:
+                break
+            data = decompressor.unused_data
+            decompressor = factory()
+            in_frame = False
+
+    if in_frame:
+        raise RuntimeError("compressed stream is truncated")
+
+
+def read_file(path: str | Path, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+    with Path(path).open("rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
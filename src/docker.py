@@ -1,24 +1,84 @@
 import logging
+import os
+import subprocess
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
 from functools import lru_cache
 from pathlib import Path
 
-from python_on_whales import DockerClient, DockerException, Volume
+from python_on_whales import Container, DockerClient, DockerException, Volume
+
+from src.archive import FRAME_SIZE, ArchiveResult, FileSink, TeeSinks, write_archive
+from src.compression import decompress_stream, read_file
+from src.engine import EngineVolume, get_engine_client
+from src.helper_image import HELPER_IMAGE, resolve_image
+from src.helper_limits import (
+    DEFAULT_LIMITS,
+    codec_threads,
+    current_limits,
+    limit_command,
+    run_flags,
+    run_options,
+)
+from src.helper_pool import DOCKER_VOLUMES_ROOT, HelperWorker, get_helper_pool, rewrite_paths, volume_path
+from src.inventory import get_volume_inventory
+from src.models import BackupCodec
+from src.progress import ProgressSink, current_job, expect_progress, report_progress
+from src.tar_index import TarIndexer, normalize_path
 
 logging.basicConfig()
 logger = logging.getLogger(__name__)
 
+STREAM_CHUNK_SIZE = 1024 * 1024
+# lines of helper stderr kept for error messages, tar -v lists every file on it
+STDERR_TAIL_LINES = 50
+# seconds between checks of the archive size while tar writes it in the helper container
+ARCHIVE_SIZE_INTERVAL = 1
+# busybox tar has no --listed-incremental support so incremental backups need gnu tar
+INCREMENTAL_HELPER_IMAGE = os.getenv("INCREMENTAL_HELPER_IMAGE", "debian:stable-slim")
+# cli forks the docker cli for every call, engine queries the engine api over the docker socket
+DOCKER_BACKEND = os.getenv("DOCKER_BACKEND", "cli").lower()
+# volume label with comma separated exclude patterns applied to every backup of the volume
+EXCLUDE_LABEL = "docker-volume-backup.exclude"
+# runs tar with the arguments after the archive path, tee writes its output to the archive and
+# sha256sum hashes it on the way. Not every sh has pipefail so tar and tee report failing on fd 3
+HASHED_TAR_SCRIPT = (
+    'archive="$1"; shift; exec 4>&1; '
+    'failed=$({ { tar "$@" 3>&- 4>&-; [ $? = 0 ] || echo tar >&3; } '
+    '| { tee "$archive" 3>&- 4>&-; [ $? = 0 ] || echo tee >&3; } '
+    "| sha256sum >&4; } 3>&1); "
+    '[ -z "$failed" ] || { echo "$failed failed" >&2; exit 1; }'
+)
+
 
 @lru_cache
 def get_docker_client() -> DockerClient:
     return DockerClient()
 
 
-def get_volumes() -> list[Volume]:
+def use_engine_api() -> bool:
+    return DOCKER_BACKEND == "engine"
+
+
+def get_volumes() -> list[Volume | EngineVolume]:
+    if inventory := get_volume_inventory():
+        return inventory.list_volumes()
+    if use_engine_api():
+        return get_engine_client().list_volumes()
     client = get_docker_client()
     return client.volume.list()
 
 
-def get_volume(volume_name: str) -> Volume | None:
+def get_volume(volume_name: str) -> Volume | EngineVolume | None:
+    if (inventory := get_volume_inventory()) and (volume := inventory.get_volume(volume_name)):
+        return volume
+    if use_engine_api():
+        return get_engine_client().inspect_volume(volume_name)
     client = get_docker_client()
     try:
         return client.volume.inspect(volume_name)
@@ -29,12 +89,167 @@ def get_volume(volume_name: str) -> Volume | None:
 
 
 def is_volume_attached(volume_name: str) -> bool:
+    if inventory := get_volume_inventory():
+        return not inventory.is_in_use(volume_name)
+    if use_engine_api():
+        volumes = get_engine_client().list_volumes({"name": [volume_name], "dangling": ["0"]})
+        return len(volumes) == 0
     client = get_docker_client()
 
     return len(client.volume.list(filters={"name": volume_name, "dangling": 0})) == 0
 
 
-def backup_volume(volume_name: str, backup_dir: str, filename: str) -> None:
+def get_volume_containers(volume_name: str) -> list[Container]:
+    """
+    running containers with the volume mounted
+    """
+    client = get_docker_client()
+    return client.container.list(filters={"volume": volume_name})
+
+
+def create_volume(volume_name: str, labels: dict[str, str] | None = None) -> Volume:
+    client = get_docker_client()
+    return client.volume.create(volume_name, labels=labels or {})
+
+
+def remove_volume(volume_name: str) -> None:
+    client = get_docker_client()
+    client.volume.remove(volume_name)
+
+
+def copy_volume(source_volume: str, dest_volume: str) -> None:
+    """
+    copy the files of a volume into another keeping owners, modes and timestamps, a plain copy
+    on the same disk is much faster than tar and compression
+    """
+    client = get_docker_client()
+    logger.info("Copying volume %s to %s", source_volume, dest_volume)
+    output = _run_helper(
+        client,
+        HELPER_IMAGE,
+        ["cp", "-a", "/source/.", "/dest"],
+        [(source_volume, "/source"), (dest_volume, "/dest")],
+    )
+    _follow_helper_output(output)
+
+
+def exchange_volumes(volume_name: str, other_volume_name: str) -> None:
+    """
+    swap the files of two local volumes by renaming their data directories, which takes the same
+    time however big the volumes are. Containers using either volume need to be stopped first as
+    a running container keeps the directory it mounted
+    """
+    paths = []
+    for name in (volume_name, other_volume_name):
+        path = volume_path(get_volume(name))
+        if not path:
+            msg = f"Volume {name} isn't a local volume in {DOCKER_VOLUMES_ROOT}"
+            raise ValueError(msg)
+        paths.append(f"/volumes/{path}")
+
+    client = get_docker_client()
+    logger.info("Exchanging the files of volumes %s and %s", volume_name, other_volume_name)
+    # a failed rename puts back the ones before it, so both volumes keep their own files
+    output = _run_helper(
+        client,
+        HELPER_IMAGE,
+        [
+            "sh",
+            "-c",
+            'mv "$1" "$1.swap" || exit 1; '
+            'if ! mv "$2" "$1"; then mv "$1.swap" "$1"; exit 1; fi; '
+            'if ! mv "$1.swap" "$2"; then mv "$1" "$2" && mv "$1.swap" "$1"; exit 1; fi',
+            "sh",
+            *paths,
+        ],
+        [(DOCKER_VOLUMES_ROOT, "/volumes")],
+    )
+    try:
+        _follow_helper_output(output)
+    except DockerException as e:
+        host_paths = [path.replace("/volumes", DOCKER_VOLUMES_ROOT, 1) for path in paths]
+        msg = (
+            f"Exchanging {host_paths[0]} and {host_paths[1]} failed and was rolled back, files "
+            f"missing from either of them are in {host_paths[0]}.swap"
+        )
+        raise RuntimeError(msg) from e
+
+
+def list_volume_files(volume_name: str) -> dict[str, int]:
+    """
+    size of every file in a volume by its path relative to the volume root
+    """
+    output = b"".join(
+        stream_helper_output(
+            ["sh", "-c", 'cd "$1" && find . -type f -exec stat -c "%s %n" {} +', "sh", "/source"],
+            [(volume_name, "/source")],
+        )
+    )
+    files = {}
+    for line in output.decode("utf-8", "surrogateescape").splitlines():
+        size, _, name = line.partition(" ")
+        files[normalize_path(name)] = int(size)
+    return files
+
+
+@dataclass
+class TarFilter:
+    """
+    what tar archives of a volume
+    """
+
+    # entries in the root of the volume, None archives the whole volume
+    entries: list[str] | None = None
+    # patterns of the files and directories tar leaves out
+    exclude: list[str] = field(default_factory=list)
+
+    def arguments(self) -> list[str]:
+        """
+        tar arguments after -C of the volume
+        """
+        sources = [f"./{entry}" for entry in self.entries] if self.entries else ["."]
+        return [*(f"--exclude={pattern}" for pattern in self.exclude), *sources]
+
+
+def volume_exclude_patterns(volume: object) -> list[str]:
+    """
+    exclude patterns set on a volume with the exclude label
+    """
+    labels = getattr(volume, "labels", None) or {}
+    return [pattern.strip() for pattern in labels.get(EXCLUDE_LABEL, "").split(",") if pattern.strip()]
+
+
+def stat_volume_tree(volume_name: str) -> dict[str, str]:
+    """
+    mtime, ctime, size, mode and owner of every path in a volume by its path relative to the
+    volume root, the root itself is "". The times have nanoseconds so a file written again in
+    the same second as the last fingerprint still changes it
+    """
+    output = b"".join(
+        stream_helper_output(
+            ["sh", "-c", 'cd "$1" && find . -exec stat -c "%y %z %s %a %u:%g %n" {} +', "sh", "/source"],
+            [(volume_name, "/source")],
+        )
+    )
+    tree = {}
+    for line in output.decode("utf-8", "surrogateescape").splitlines():
+        # each time is "date time.nanoseconds zone", the name can have spaces of its own
+        *stat, name = line.split(" ", 9)
+        tree["" if name == "." else normalize_path(name)] = " ".join(stat)
+    return tree
+
+
+def backup_volume(
+    volume_name: str,
+    backup_dir: str,
+    filename: str,
+    snapshot_file: str | None = None,
+    tar_filter: TarFilter | None = None,
+) -> str:
+    """
+    backup a volume to a gzip archive tar writes in the helper container, returns the sha256 of
+    the archive taken while it was written
+    """
     client = get_docker_client()
 
     volume = get_volume(volume_name)
@@ -48,36 +263,447 @@ def backup_volume(volume_name: str, backup_dir: str, filename: str) -> None:
         volume_name,
         Path(backup_dir) / filename,
     )
-    client.run(
-        image="busybox",
-        command=[
-            "tar",
-            "cvaf",
-            f"/dest/{filename}",
-            "-C",
-            "/source",
-            ".",
-        ],  # f"tar cvaf /dest/{backup_file} -C /source .",
-        remove=True,
-        volumes=[(volume, "/source"), (backup_dir, "/dest")],
+    arguments = ["-czvf", "-", "-C", "/source", *(tar_filter or TarFilter()).arguments()]
+    if snapshot_file:
+        image = INCREMENTAL_HELPER_IMAGE
+        arguments = [f"--listed-incremental=/dest/{snapshot_file}", "--no-check-device", *arguments]
+    else:
+        image = HELPER_IMAGE
+    output = _run_helper(
+        client,
+        image,
+        ["sh", "-c", HASHED_TAR_SCRIPT, "sh", f"/dest/{filename}", *arguments],
+        [(volume, "/source"), (backup_dir, "/dest")],
     )
-    if not Path.exists(Path(backup_dir) / filename):
+    checksum = _follow_helper_output(output, Path(backup_dir) / filename, hashed=True)
+    if not checksum or not Path.exists(Path(backup_dir) / filename):
         raise RuntimeError("Backup failed")
+    return checksum
+
+
+def _follow_helper_output(
+    output: Iterable[tuple[str, bytes]], archive_path: Path | None = None, hashed: bool = False
+) -> str | None:
+    """
+    read the output of a helper container running tar -v, every line is a file. While tar
+    writes an archive its size is reported as the progress bytes. A hashed archive is written
+    with HASHED_TAR_SCRIPT, the digest sha256sum prints on stdout is returned
+    """
+    checksum = None
+    reported_size = 0
+    checked_at = time.monotonic()
+    for source, line in output:
+        if hashed and source == "stdout":
+            checksum = line.split()[0].decode()
+            continue
+        size = reported_size
+        if archive_path and time.monotonic() - checked_at >= ARCHIVE_SIZE_INTERVAL:
+            checked_at = time.monotonic()
+            try:
+                size = archive_path.stat().st_size
+            except OSError:
+                size = reported_size
+        report_progress(bytes=size - reported_size, files=1)
+        reported_size = size
+    return checksum
+
+
+@contextmanager
+def _pooled_helper(
+    image: str,
+    volumes: list[tuple[Volume | EngineVolume | str, str]],
+) -> Iterator[tuple[HelperWorker, dict[str, str]] | None]:
+    """
+    a warm pool container and the paths of the mounts in it when the job can run in one, jobs
+    with other limits than the pool containers or volumes they can't see get their own container
+    """
+    pool = get_helper_pool()
+    if not pool or image != pool.image or run_options(current_limits()) != run_options(DEFAULT_LIMITS):
+        yield None
+        return
+    paths = {}
+    for source, dest in volumes:
+        volume = get_volume(source) if isinstance(source, str) and not source.startswith("/") else source
+        path = pool.container_path(volume) if volume else None
+        if path is None:
+            yield None
+            return
+        paths[dest] = path
+    with pool.worker() as worker:
+        yield (worker, paths) if worker else None
 
 
-def restore_volume(volume_name: str, backup_dir: str, filename: str) -> None:
+def _run_helper(
+    client: DockerClient,
+    image: str,
+    command: list[str],
+    volumes: list[tuple[Volume | EngineVolume | str, str]],
+) -> Iterator[tuple[str, bytes]]:
+    """
+    run a helper container with the resource limits of the current job and stream its output
+    """
+    limits = current_limits()
+    with _pooled_helper(image, volumes) as pooled:
+        if pooled:
+            worker, paths = pooled
+            yield from client.container.execute(
+                worker.container_id,
+                limit_command(limits, rewrite_paths(command, paths)),
+                stream=True,
+            )
+            return
+        yield from client.run(
+            image=resolve_image(image),
+            command=limit_command(limits, command),
+            remove=True,
+            stream=True,
+            volumes=volumes,
+            **run_options(limits),
+        )
+
+
+@contextmanager
+def _helper_command(
+    image: str,
+    command: list[str],
+    volumes: list[tuple[str, str]],
+    interactive: bool = False,
+) -> Iterator[list[str]]:
+    """
+    docker cli command running a helper, an exec in a pool container when one is free
+    """
     client = get_docker_client()
-    client.run(
-        image="busybox",
-        command=[
-            "tar",
-            "xvf",
-            f"/source/{filename}",
-            "-C",
-            "/dest",
-        ],
-        remove=True,
-        volumes=[(volume_name, "/dest"), (backup_dir, "/source")],
+    limits = current_limits()
+    with _pooled_helper(image, volumes) as pooled:
+        if pooled:
+            worker, paths = pooled
+            full_cmd = [*client.docker_cmd, "exec"]
+            if interactive:
+                full_cmd.append("--interactive")
+            full_cmd.extend([worker.container_id, *limit_command(limits, rewrite_paths(command, paths))])
+            yield full_cmd
+            return
+        full_cmd = [*client.docker_cmd, "run", "--rm", *run_flags(limits)]
+        if interactive:
+            full_cmd.append("--interactive")
+        for source, dest in volumes:
+            full_cmd.extend(["--volume", f"{source}:{dest}"])
+        full_cmd.extend([resolve_image(image), *limit_command(limits, command)])
+        yield full_cmd
+
+
+def _drain_stderr(process: subprocess.Popen, stderr: deque, list_files: bool = False) -> threading.Thread:
+    # the reader runs in its own thread so it's given the job to report to
+    job = current_job()
+
+    def read_stderr() -> None:
+        for line in process.stderr:
+            stderr.append(line)
+            if list_files:
+                report_progress(files=1, job=job)
+
+    stderr_reader = threading.Thread(target=read_stderr, daemon=True)
+    stderr_reader.start()
+    return stderr_reader
+
+
+def stream_helper_output(
+    command: list[str],
+    volumes: list[tuple[str, str]],
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    image: str = HELPER_IMAGE,
+    list_files: bool = False,
+) -> Iterator[bytes]:
+    """
+    run a helper container and yield its stdout in fixed size chunks, python_on_whales
+    streams output line by line which doesn't work for binary data like a tar stream.
+
+    list_files is for commands that list a file per line on stderr (tar -v), these are
+    reported as progress
+    """
+    with _helper_command(image, command, volumes) as full_cmd:
+        process = subprocess.Popen(full_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)  # noqa: S603
+        stderr = deque(maxlen=STDERR_TAIL_LINES)
+        stderr_reader = _drain_stderr(process, stderr, list_files=list_files)
+        try:
+            while chunk := process.stdout.read(chunk_size):
+                yield chunk
+        except GeneratorExit:
+            # consumer stopped reading, SIGTERM gets proxied to the container by the docker cli
+            # so the helper doesn't stay blocked on a full pipe. A pool container is replaced
+            # as the exec'd command may outlive the cli
+            process.terminate()
+            raise
+        finally:
+            exit_code = process.wait()
+            stderr_reader.join()
+
+        if exit_code != 0:
+            raise DockerException(full_cmd, exit_code, stderr=b"".join(stderr))
+
+
+def stream_helper_input(
+    command: list[str],
+    volumes: list[tuple[str, str]],
+    chunks: Iterable[bytes],
+    image: str = HELPER_IMAGE,
+) -> None:
+    """
+    run a helper container and write chunks to its stdin, e.g. to extract a tar stream that
+    isn't stored as a single archive in the backup dir
+    """
+    with _helper_command(image, command, volumes, interactive=True) as full_cmd:
+        process = subprocess.Popen(  # noqa: S603
+            full_cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        stderr = deque(maxlen=STDERR_TAIL_LINES)
+        stderr_reader = _drain_stderr(process, stderr)
+        try:
+            for chunk in chunks:
+                process.stdin.write(chunk)
+            process.stdin.close()
+        except BrokenPipeError:
+            # the helper exited early, the exit code and stderr below tell us why
+            pass
+        except Exception:
+            process.terminate()
+            raise
+        finally:
+            exit_code = process.wait()
+            stderr_reader.join()
+
+        if exit_code != 0:
+            raise DockerException(full_cmd, exit_code, stderr=b"".join(stderr))
+
+
+def list_top_level_sizes(volume_name: str) -> list[tuple[str, int]]:
+    """
+    the entries in the root of a volume with their size in KiB
+    """
+    output = b"".join(
+        stream_helper_output(
+            [
+                "sh",
+                "-c",
+                'cd "$1" && for f in * .[!.]* ..?*; do '
+                'if [ -e "$f" ] || [ -L "$f" ]; then du -sk "$f"; fi; done',
+                "sh",
+                "/source",
+            ],
+            [(volume_name, "/source")],
+        )
     )
+    entries = []
+    for line in output.decode("utf-8", "surrogateescape").splitlines():
+        size, _, name = line.partition("\t")
+        entries.append((name, int(size)))
+    return entries
+
+
+def list_top_level_entries(volume_name: str) -> list[str]:
+    """
+    names of the entries in the root of a volume
+    """
+    output = b"".join(
+        stream_helper_output(
+            [
+                "sh",
+                "-c",
+                'cd "$1" && for f in * .[!.]* ..?*; do '
+                'if [ -e "$f" ] || [ -L "$f" ]; then echo "$f"; fi; done',
+                "sh",
+                "/source",
+            ],
+            [(volume_name, "/source")],
+        )
+    )
+    return output.decode("utf-8", "surrogateescape").splitlines()
+
+
+def select_entries(volume_name: str, include: list[str]) -> list[str] | None:
+    """
+    entries in the root of a volume matching one of the include patterns, None without patterns
+    """
+    if not include:
+        return None
+    entries = [
+        entry
+        for entry in list_top_level_entries(volume_name)
+        if any(fnmatchcase(entry, pattern) for pattern in include)
+    ]
+    if not entries:
+        msg = f"Nothing in volume {volume_name} matches the include patterns {include}"
+        raise ValueError(msg)
+    return entries
+
+
+def stream_volume_tar(
+    volume_name: str,
+    backup_dir: str | None = None,
+    snapshot_file: str | None = None,
+    tar_filter: TarFilter | None = None,
+) -> Iterator[bytes]:
+    """
+    yield the uncompressed tar stream of a volume from the helper container, of only what the
+    filter selects when one is given
+    """
+    arguments = (tar_filter or TarFilter()).arguments()
+    if snapshot_file:
+        return stream_helper_output(
+            [
+                "tar",
+                f"--listed-incremental=/dest/{snapshot_file}",
+                "--no-check-device",
+                "-cvf",
+                "-",
+                "-C",
+                "/source",
+                *arguments,
+            ],
+            [(volume_name, "/source"), (backup_dir, "/dest")],
+            image=INCREMENTAL_HELPER_IMAGE,
+            list_files=True,
+        )
+    return stream_helper_output(
+        ["tar", "cvf", "-", "-C", "/source", *arguments],
+        [(volume_name, "/source")],
+        list_files=True,
+    )
+
+
+def stream_backup_volume(
+    volume_name: str,
+    backup_dir: str,
+    filename: str,
+    snapshot_file: str | None = None,
+    codec: BackupCodec = BackupCodec.GZIP,
+    codec_level: int | None = None,
+    tar_filter: TarFilter | None = None,
+    tee: TeeSinks | None = None,
+) -> ArchiveResult:
+    """
+    backup a volume by streaming the tar output of the helper container through the archive
+    pipeline, which compresses, hashes and writes it to the backup dir in a single pass. tee
+    makes the sinks the archive is written to at the same time
+    """
+    volume = get_volume(volume_name)
+
+    if not volume:
+        msg = f"Volume {volume_name} does not exist"
+        raise ValueError(msg)
+
+    logger.info(
+        "Streaming backup of volume %s to %s",
+        volume_name,
+        Path(backup_dir) / filename,
+    )
+    # the member index and frames let single files be restored without reading the whole archive
+    indexer = TarIndexer()
+    chunks = indexer.observe(stream_volume_tar(volume_name, backup_dir, snapshot_file, tar_filter))
+    result = write_archive(
+        chunks,
+        [FileSink(Path(backup_dir) / filename), ProgressSink(), *(tee(filename) if tee else [])],
+        codec=codec,
+        codec_level=codec_level,
+        frame_size=FRAME_SIZE,
+        threads=codec_threads(current_limits()),
+    )
+    result.members = indexer.members
+    return result
+
+
+def restore_volume_from_stream(
+    volume_name: str,
+    chunks: Iterable[bytes],
+    incremental: bool = False,
+) -> None:
+    """
+    extract an uncompressed tar stream into a volume
+    """
+    logger.info("Restoring volume %s from tar stream", volume_name)
+    if incremental:
+        stream_helper_input(
+            ["tar", "--listed-incremental=/dev/null", "-xf", "-", "-C", "/dest"],
+            [(volume_name, "/dest")],
+            chunks,
+            image=INCREMENTAL_HELPER_IMAGE,
+        )
+    else:
+        stream_helper_input(
+            ["tar", "xf", "-", "-C", "/dest"],
+            [(volume_name, "/dest")],
+            chunks,
+        )
+
+
+def restore_volume_from_archive(
+    volume_name: str,
+    backup_dir: str,
+    filename: str,
+    codec: BackupCodec,
+    incremental: bool = False,
+) -> None:
+    """
+    restore an archive the helper container can't decompress itself, the archive is
+    decompressed by the app and streamed into the helper
+    """
+    path = Path(backup_dir) / filename
+    if not path.exists():
+        msg = f"Backup {filename} does not exist"
+        raise RuntimeError(msg)
+    expect_progress(path.stat().st_size)
+    restore_volume_from_stream(
+        volume_name,
+        decompress_stream(codec, _report_read(read_file(path))),
+        incremental=incremental,
+    )
+
+
+def _report_read(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    for chunk in chunks:
+        report_progress(bytes=len(chunk))
+        yield chunk
+
+
+def restore_volume(
+    volume_name: str,
+    backup_dir: str,
+    filename: str,
+    incremental: bool = False,
+) -> None:
+    client = get_docker_client()
+    if incremental:
+        # gnu tar only removes files deleted between levels when it's given a snapshot file,
+        # it detects whether the archive is gzipped by itself
+        output = _run_helper(
+            client,
+            INCREMENTAL_HELPER_IMAGE,
+            [
+                "tar",
+                "--listed-incremental=/dev/null",
+                "-xvf",
+                f"/source/{filename}",
+                "-C",
+                "/dest",
+            ],
+            [(volume_name, "/dest"), (backup_dir, "/source")],
+        )
+    else:
+        output = _run_helper(
+            client,
+            HELPER_IMAGE,
+            [
+                "tar",
+                "xvf",
+                f"/source/{filename}",
+                "-C",
+                "/dest",
+            ],
+            [(volume_name, "/dest"), (backup_dir, "/source")],
+        )
+    _follow_helper_output(output)
     if not Path.exists(Path("/backup") / filename):
         raise RuntimeError("Restore failed")
@@ -0,0 +1,131 @@
+import json
+import os
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+
+import httpx
+
+DOCKER_SOCKET = os.getenv("DOCKER_SOCKET", "/var/run/docker.sock")
+DOCKER_API_VERSION = os.getenv("DOCKER_API_VERSION", "v1.41")
+ENGINE_TIMEOUT = 30
+
+
+class EngineError(Exception):
+    pass
+
+
+@dataclass
+class EngineVolume:
+    """
+    volume returned by the engine api, has the same attributes the app uses from
+    python_on_whales volumes
+    """
+
+    name: str
+    driver: str
+    mountpoint: str
+    created_at: datetime | None
+    labels: dict[str, str] = field(default_factory=dict)
+    options: dict[str, str] = field(default_factory=dict)
+    status: dict = field(default_factory=dict)
+    scope: str = "local"
+
+    def __str__(self) -> str:
+        # python_on_whales uses str() on the volumes given to docker run
+        return self.name
+
+    @classmethod
+    def from_api(cls, data: dict) -> "EngineVolume":
+        return cls(
+            name=data["Name"],
+            driver=data.get("Driver", "local"),
+            mountpoint=data.get("Mountpoint", ""),
+            created_at=_parse_timestamp(data.get("CreatedAt")),
+            labels=data.get("Labels") or {},
+            options=data.get("Options") or {},
+            status=data.get("Status") or {},
+            scope=data.get("Scope", "local"),
+        )
+
+
+def _parse_timestamp(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    value = value.replace("Z", "+00:00")
+    # the engine returns nanoseconds, datetime only takes microseconds
+    if "." in value:
+        seconds, _, rest = value.partition(".")
+        digits = len(rest) - len(rest.lstrip("0123456789"))
+        value = f"{seconds}.{rest[:min(digits, 6)].ljust(6, '0')}{rest[digits:]}"
+    return datetime.fromisoformat(value)
+
+
+class EngineClient:
+    """
+    talks to the docker engine api over the unix socket, the connection is kept open and reused
+    between calls instead of forking the docker cli for every call
+    """
+
+    def __init__(
+        self,
+        socket_path: str = DOCKER_SOCKET,
+        api_version: str = DOCKER_API_VERSION,
+        transport: httpx.BaseTransport | None = None,
+    ) -> None:
+        self._client = httpx.Client(
+            transport=transport or httpx.HTTPTransport(uds=socket_path),
+            base_url=f"http://docker/{api_version}",
+            timeout=ENGINE_TIMEOUT,
+        )
+
+    def _get(self, path: str, params: dict | None = None) -> httpx.Response:
+        response = self._client.get(path, params=params)
+        if response.is_error and response.status_code != httpx.codes.NOT_FOUND:
+            msg = f"Docker engine api error {response.status_code}: {response.text}"
+            raise EngineError(msg)
+        return response
+
+    def list_volumes(self, filters: dict[str, list[str]] | None = None) -> list[EngineVolume]:
+        params = {"filters": json.dumps(filters)} if filters else None
+        data = self._get("/volumes", params=params).json()
+        return [EngineVolume.from_api(volume) for volume in data.get("Volumes") or []]
+
+    def inspect_volume(self, volume_name: str) -> EngineVolume | None:
+        response = self._get(f"/volumes/{volume_name}")
+        if response.status_code == httpx.codes.NOT_FOUND:
+            return None
+        return EngineVolume.from_api(response.json())
+
+    def list_containers(self, all: bool = True) -> list[dict]:
+        return self._get("/containers/json", params={"all": str(all).lower()}).json()
+
+    def events(
+        self,
+        filters: dict[str, list[str]],
+        since: int | None = None,
+        read_timeout: float | None = None,
+    ) -> Iterator[dict]:
+        """
+        stream engine events, raises httpx.ReadTimeout when no event arrives within read_timeout
+        """
+        params = {"filters": json.dumps(filters)}
+        if since is not None:
+            params["since"] = str(since)
+        timeout = httpx.Timeout(ENGINE_TIMEOUT, read=read_timeout)
+        with self._client.stream("GET", "/events", params=params, timeout=timeout) as response:
+            if response.is_error:
+                msg = f"Docker engine api error {response.status_code}: {response.read().decode()}"
+                raise EngineError(msg)
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def close(self) -> None:
+        self._client.close()
+
+
+@lru_cache
+def get_engine_client() -> EngineClient:
+    return EngineClient()
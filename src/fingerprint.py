@@ -0,0 +1,45 @@
+import hashlib
+import json
+import logging
+from collections import defaultdict
+
+from src.docker import stat_volume_tree
+from src.models import BackupOptions
+
+logger = logging.getLogger(__name__)
+
+
+def merkle_root(tree: dict[str, str]) -> str:
+    """
+    root hash of a tree of paths and their metadata, the hash of a path covers its metadata and
+    the sorted names and hashes of its children so any change below a directory changes it
+    """
+    children: dict[str, list[tuple[str, str]]] = defaultdict(list)
+    # deepest paths first so every directory is hashed after its children, the root last
+    for path in sorted(tree, key=lambda path: path.count("/") if path else -1, reverse=True):
+        digest = hashlib.sha256(tree[path].encode("utf-8", "surrogateescape"))
+        for name, child in sorted(children.pop(path, [])):
+            digest.update(b"\0" + name.encode("utf-8", "surrogateescape") + b"\0" + child.encode())
+        if not path:
+            return digest.hexdigest()
+        parent, _, name = path.rpartition("/")
+        children[parent].append((name, digest.hexdigest()))
+    return hashlib.sha256().hexdigest()
+
+
+def backup_fingerprint(volume_name: str, options: BackupOptions, exclude: list[str]) -> str:
+    """
+    fingerprint of a volume for a backup with these options, only the metadata of the files is
+    read. A backup with other options never matches, so it's written again when they change
+    """
+    tree = stat_volume_tree(volume_name)
+    digest = hashlib.sha256(merkle_root(tree).encode())
+    for value in [
+        options.model_dump_json(
+            include={"incremental", "storage_format", "codec", "codec_level", "parts", "include"}
+        ),
+        json.dumps(exclude),
+    ]:
+        digest.update(b"\0" + value.encode())
+    logger.info("fingerprinted %s paths of volume %s", len(tree), volume_name)
+    return digest.hexdigest()
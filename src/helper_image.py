@@ -0,0 +1,130 @@
+import logging
+import os
+import threading
+
+from python_on_whales import DockerClient, DockerException
+
+from src.models import HelperImageStatus
+
+logger = logging.getLogger(__name__)
+
+# image of the helper containers, a custom image can add tools like zstd or pigz
+HELPER_IMAGE = os.getenv("HELPER_IMAGE", "busybox")
+# seconds between pull attempts of a helper image that couldn't be pulled
+HELPER_IMAGE_PULL_RETRY = int(os.getenv("HELPER_IMAGE_PULL_RETRY", "60"))
+
+
+def image_repository(name: str) -> str:
+    """
+    image name without its tag or digest
+    """
+    name = name.split("@", 1)[0]
+    repository, _, tag = name.rpartition(":")
+    # a : before the last / is a registry port
+    return repository if repository and "/" not in tag else name
+
+
+class HelperImages:
+    """
+    pulls the helper images in the background when the app starts, so the first job doesn't wait
+    for the pull, and pins them by digest so every job runs the same image even when the tag
+    moves. Jobs started before an image is ready run it by name. Images only some jobs need are
+    pulled from their first use instead
+    """
+
+    def __init__(self, client: DockerClient, names: list[str]) -> None:
+        self.client = client
+        self._images = {name: HelperImageStatus(name=name) for name in dict.fromkeys(names)}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def resolve(self, name: str) -> str:
+        """
+        the pinned reference of an image, an image that wasn't pulled at startup starts pulling
+        in the background and is run by name until it's ready
+        """
+        with self._lock:
+            image = self._images.get(name)
+            if image:
+                return image.reference or name
+            self._images[name] = HelperImageStatus(name=name)
+        self._start([name])
+        return name
+
+    def status(self) -> list[HelperImageStatus]:
+        with self._lock:
+            return [image.model_copy() for image in self._images.values()]
+
+    def _pin(self, name: str) -> str:
+        image = self.client.image.inspect(name)
+        if not image.repo_digests:
+            # built locally, the id is all there is to pin
+            return image.id
+        digest = image.repo_digests[0].rpartition("@")[2]
+        return f"{image_repository(name)}@{digest}"
+
+    def prepare(self, name: str) -> bool:
+        """
+        pull an image and pin it, an image that's already there is used when the pull fails
+        e.g. on a host without access to the registry
+        """
+        error = None
+        try:
+            self.client.image.pull(name, quiet=True)
+        except DockerException as e:
+            error = str(e)
+            logger.warning("pulling helper image %s failed: %s", name, error)
+        try:
+            reference = self._pin(name)
+        except DockerException as e:
+            reference, error = None, error or str(e)
+        with self._lock:
+            self._images[name] = HelperImageStatus(
+                name=name,
+                reference=reference,
+                ready=reference is not None,
+                error=error,
+            )
+        if reference:
+            logger.info("helper image %s ready as %s", name, reference)
+        return reference is not None
+
+    def warm_up(self, names: list[str] | None = None) -> None:
+        pending = list(self._images) if names is None else names
+        while pending and not self._stop.is_set():
+            pending = [name for name in pending if not self.prepare(name)]
+            if pending:
+                self._stop.wait(HELPER_IMAGE_PULL_RETRY)
+
+    def _start(self, names: list[str] | None = None) -> threading.Thread:
+        thread = threading.Thread(target=self.warm_up, args=(names,), name="helper-images", daemon=True)
+        thread.start()
+        return thread
+
+    def start(self) -> None:
+        self._thread = self._start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+_images: HelperImages | None = None
+
+
+def start_helper_images(client: DockerClient, names: list[str]) -> HelperImages:
+    global _images  # noqa: PLW0603
+    _images = HelperImages(client, names)
+    _images.start()
+    return _images
+
+
+def get_helper_images() -> HelperImages | None:
+    return _images
+
+
+def resolve_image(name: str) -> str:
+    """
+    the pinned reference of a helper image once it's pulled, otherwise the name
+    """
+    return _images.resolve(name) if _images else name
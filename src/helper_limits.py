@@ -0,0 +1,103 @@
+import math
+import os
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from src.models import HelperLimits
+
+
+def _env_list(name: str) -> list[str]:
+    return [value.strip() for value in os.getenv(name, "").split(",") if value.strip()]
+
+
+def _env_number(name: str, cast: type) -> int | float | None:
+    value = os.getenv(name)
+    return cast(value) if value else None
+
+
+# limits of every helper container, backups can override them with their limits option
+DEFAULT_LIMITS = HelperLimits(
+    cpus=_env_number("HELPER_CPUS", float),
+    memory=os.getenv("HELPER_MEMORY") or None,
+    blkio_weight=_env_number("HELPER_BLKIO_WEIGHT", int),
+    device_read_bps=_env_list("HELPER_DEVICE_READ_BPS"),
+    device_write_bps=_env_list("HELPER_DEVICE_WRITE_BPS"),
+    nice=_env_number("HELPER_NICE", int),
+    ionice_class=_env_number("HELPER_IONICE_CLASS", int),
+    ionice_level=_env_number("HELPER_IONICE_LEVEL", int),
+)
+
+_current = threading.local()
+
+
+def current_limits() -> HelperLimits:
+    return getattr(_current, "limits", None) or DEFAULT_LIMITS
+
+
+@contextmanager
+def use_limits(limits: HelperLimits) -> Iterator[HelperLimits]:
+    """
+    helper containers started by this thread in the block run with limits, the limits from
+    before apply again after it
+    """
+    previous = getattr(_current, "limits", None)
+    _current.limits = limits
+    try:
+        yield limits
+    finally:
+        _current.limits = previous
+
+
+def codec_threads(limits: HelperLimits) -> int:
+    """
+    zstd worker threads of archives the app compresses, one per cpu of the limit and one per
+    core without one
+    """
+    return max(1, math.ceil(limits.cpus)) if limits.cpus else -1
+
+
+def run_options(limits: HelperLimits) -> dict:
+    """
+    python_on_whales run arguments of the container limits that are set
+    """
+    options = {
+        "cpus": limits.cpus,
+        "memory": limits.memory,
+        "blkio_weight": limits.blkio_weight,
+        "device_read_bps": limits.device_read_bps,
+        "device_write_bps": limits.device_write_bps,
+    }
+    return {name: value for name, value in options.items() if value}
+
+
+def run_flags(limits: HelperLimits) -> list[str]:
+    """
+    docker run flags of the container limits that are set
+    """
+    flags = []
+    if limits.cpus:
+        flags.extend(["--cpus", str(limits.cpus)])
+    if limits.memory:
+        flags.extend(["--memory", limits.memory])
+    if limits.blkio_weight:
+        flags.extend(["--blkio-weight", str(limits.blkio_weight)])
+    for device in limits.device_read_bps:
+        flags.extend(["--device-read-bps", device])
+    for device in limits.device_write_bps:
+        flags.extend(["--device-write-bps", device])
+    return flags
+
+
+def limit_command(limits: HelperLimits, command: list[str]) -> list[str]:
+    """
+    run the helper command with nice and ionice, both are in busybox and gnu based images
+    """
+    if limits.ionice_class is not None:
+        ionice = ["ionice", "-c", str(limits.ionice_class)]
+        if limits.ionice_level is not None and limits.ionice_class == 2:  # noqa: PLR2004
+            ionice.extend(["-n", str(limits.ionice_level)])
+        command = [*ionice, *command]
+    if limits.nice is not None:
+        command = ["nice", "-n", str(limits.nice), *command]
+    return command
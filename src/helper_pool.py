@@ -0,0 +1,236 @@
+import logging
+import os
+import posixpath
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from python_on_whales import DockerClient, DockerException
+
+from src.helper_image import resolve_image
+from src.helper_limits import DEFAULT_LIMITS, run_options
+
+logger = logging.getLogger(__name__)
+
+# warm helper containers kept running for backups and restores, 0 starts a container per job
+HELPER_POOL_SIZE = int(os.getenv("HELPER_POOL_SIZE", "0"))
+# directory docker keeps local volumes in, mounted into the pool containers
+DOCKER_VOLUMES_ROOT = os.getenv("DOCKER_VOLUMES_ROOT", "/var/lib/docker/volumes").rstrip("/")
+# jobs a pool container runs before it's replaced by a fresh one
+HELPER_POOL_MAX_JOBS = int(os.getenv("HELPER_POOL_MAX_JOBS", "100"))
+# seconds between health checks of the idle pool containers
+HELPER_POOL_HEALTH_INTERVAL = int(os.getenv("HELPER_POOL_HEALTH_INTERVAL", "60"))
+# label set on the pool containers so leftovers of a previous run can be removed
+POOL_LABEL = "docker-volume-backup.helper-pool"
+POOL_VOLUMES_DIR = "/volumes"
+POOL_BACKUP_DIR = "/backup"
+
+
+def volume_path(volume: object, volumes_root: str = DOCKER_VOLUMES_ROOT) -> str | None:
+    """
+    path of a local volume relative to the volumes root, None for volumes that aren't in it
+    """
+    # volumes with driver options like nfs or bind devices are only mounted while a
+    # container uses them
+    if getattr(volume, "driver", None) != "local" or getattr(volume, "options", None):
+        return None
+    mountpoint = getattr(volume, "mountpoint", "") or ""
+    if not mountpoint.startswith(f"{volumes_root}/"):
+        return None
+    return mountpoint.removeprefix(f"{volumes_root}/")
+
+
+@dataclass
+class HelperWorker:
+    container_id: str
+    jobs: int = 0
+
+
+class HelperPool:
+    """
+    long running helper containers that run backup and restore commands with docker exec, which
+    skips creating, starting and removing a container for every job. Volumes can't be mounted
+    into a running container so the pool containers mount the directory docker keeps local
+    volumes in and the backup dir, commands are rewritten to use the paths of the volumes in it.
+    Idle containers are health checked and a container is replaced after max_jobs jobs or when a
+    job run in it fails
+    """
+
+    def __init__(
+        self,
+        client: DockerClient,
+        size: int,
+        image: str,
+        backup_dir: str,
+        volumes_root: str = DOCKER_VOLUMES_ROOT,
+        max_jobs: int = HELPER_POOL_MAX_JOBS,
+    ) -> None:
+        self.client = client
+        self.size = size
+        self.image = image
+        self.backup_dir = backup_dir
+        self.volumes_root = volumes_root.rstrip("/")
+        self.max_jobs = max_jobs
+        self._idle: list[HelperWorker] = []
+        self._count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def container_path(self, source: object) -> str | None:
+        """
+        path in the pool containers of a volume or the backup dir, None when a pool container
+        can't see it and the job needs its own container
+        """
+        if isinstance(source, str):
+            return POOL_BACKUP_DIR if source.rstrip("/") == self.backup_dir.rstrip("/") else None
+        path = volume_path(source, self.volumes_root)
+        return posixpath.join(POOL_VOLUMES_DIR, path) if path else None
+
+    def _create(self) -> HelperWorker:
+        container = self.client.run(
+            image=resolve_image(self.image),
+            command=["sleep", "infinity"],
+            detach=True,
+            remove=True,
+            labels={POOL_LABEL: "true"},
+            volumes=[
+                (self.volumes_root, POOL_VOLUMES_DIR),
+                (self.backup_dir, POOL_BACKUP_DIR),
+            ],
+            **run_options(DEFAULT_LIMITS),
+        )
+        return HelperWorker(container.id)
+
+    def _remove(self, worker: HelperWorker) -> None:
+        try:
+            self.client.container.remove(worker.container_id, force=True)
+        except DockerException:
+            logger.exception("removing helper pool container %s failed", worker.container_id)
+
+    def _is_healthy(self, worker: HelperWorker) -> bool:
+        try:
+            self.client.container.execute(worker.container_id, ["true"])
+        except DockerException:
+            return False
+        return True
+
+    def fill(self) -> None:
+        """
+        start containers until the pool has size containers
+        """
+        while not self._stop.is_set():
+            with self._lock:
+                if self._count >= self.size:
+                    return
+                self._count += 1
+            try:
+                worker = self._create()
+            except DockerException:
+                with self._lock:
+                    self._count -= 1
+                logger.exception("starting helper pool container failed")
+                return
+            with self._lock:
+                self._idle.append(worker)
+
+    def check_health(self) -> None:
+        """
+        replace the idle containers that don't respond to exec
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            if self._is_healthy(worker):
+                with self._lock:
+                    self._idle.append(worker)
+            else:
+                logger.warning("helper pool container %s is unhealthy, replacing it", worker.container_id)
+                self._discard(worker)
+        self.fill()
+
+    def _discard(self, worker: HelperWorker) -> None:
+        self._remove(worker)
+        with self._lock:
+            self._count -= 1
+
+    @contextmanager
+    def worker(self) -> Iterator[HelperWorker | None]:
+        """
+        an idle container for a job, None when all of them are busy. The container is replaced
+        once the block exits when the job failed or it ran max_jobs jobs
+        """
+        with self._lock:
+            worker = self._idle.pop() if self._idle and not self._stop.is_set() else None
+        if not worker:
+            yield None
+            return
+        try:
+            yield worker
+        except BaseException:
+            self._discard(worker)
+            raise
+        worker.jobs += 1
+        if worker.jobs >= self.max_jobs or self._stop.is_set():
+            self._discard(worker)
+        else:
+            with self._lock:
+                self._idle.append(worker)
+
+    def maintain(self) -> None:
+        self.fill()
+        while not self._stop.wait(HELPER_POOL_HEALTH_INTERVAL):
+            self.check_health()
+
+    def remove_leftovers(self) -> None:
+        try:
+            leftovers = self.client.container.list(all=True, filters={"label": POOL_LABEL})
+            if leftovers:
+                self.client.container.remove(leftovers, force=True)
+        except DockerException:
+            logger.exception("removing leftover helper pool containers failed")
+
+    def start(self) -> None:
+        self.remove_leftovers()
+        self._thread = threading.Thread(target=self.maintain, name="helper-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            self._discard(worker)
+
+
+_pool: HelperPool | None = None
+
+
+def start_helper_pool(client: DockerClient, image: str, backup_dir: str) -> HelperPool:
+    global _pool  # noqa: PLW0603
+    _pool = HelperPool(client, HELPER_POOL_SIZE, image, backup_dir)
+    _pool.start()
+    return _pool
+
+
+def get_helper_pool() -> HelperPool | None:
+    return _pool
+
+
+def rewrite_paths(command: list[str], paths: dict[str, str]) -> list[str]:
+    """
+    replace the mount points of a helper command with the paths in the pool container, for
+    arguments that are a mount point, a path under one or an --option=path
+    """
+
+    def rewrite(argument: str) -> str:
+        prefix, separator, value = (
+            argument.partition("=") if argument.startswith("-") else ("", "", argument)
+        )
+        for mount, path in paths.items():
+            if value == mount or value.startswith(f"{mount}/"):
+                return f"{prefix}{separator}{path}{value.removeprefix(mount)}"
+        return argument
+
+    return [rewrite(argument) for argument in command]
@@ -0,0 +1,45 @@
+import shutil
+from pathlib import Path
+
+# snapshot files are kept in the backup dir so the helper container can read and update them
+SNAPSHOT_DIR = ".snapshots"
+
+
+def _snapshot_path(backup_dir: str, volume_name: str) -> Path:
+    return Path(backup_dir) / SNAPSHOT_DIR / f"{volume_name}.snar"
+
+
+def _working_snapshot_path(backup_dir: str, volume_name: str) -> Path:
+    return Path(backup_dir) / SNAPSHOT_DIR / f"{volume_name}.snar.new"
+
+
+def has_snapshot(backup_dir: str, volume_name: str) -> bool:
+    return _snapshot_path(backup_dir, volume_name).exists()
+
+
+def prepare_snapshot(backup_dir: str, volume_name: str, level: int) -> str:
+    """
+    create the working copy of the volume snapshot tar will update for this backup, the stored
+    snapshot is only replaced once the backup succeeds so a failed run doesn't break the chain.
+
+    returns the path of the working copy relative to the backup dir
+    """
+    snapshot = _snapshot_path(backup_dir, volume_name)
+    working = _working_snapshot_path(backup_dir, volume_name)
+    snapshot.parent.mkdir(parents=True, exist_ok=True)
+
+    if level == 0:
+        # no snapshot file means tar writes a full (level 0) archive
+        working.unlink(missing_ok=True)
+    else:
+        shutil.copyfile(snapshot, working)
+
+    return f"{SNAPSHOT_DIR}/{working.name}"
+
+
+def commit_snapshot(backup_dir: str, volume_name: str) -> None:
+    _working_snapshot_path(backup_dir, volume_name).replace(_snapshot_path(backup_dir, volume_name))
+
+
+def discard_snapshot(backup_dir: str, volume_name: str) -> None:
+    _working_snapshot_path(backup_dir, volume_name).unlink(missing_ok=True)
@@ -0,0 +1,133 @@
+import logging
+import os
+import threading
+import time
+
+import httpx
+
+from src.engine import EngineClient, EngineError, EngineVolume, get_engine_client
+
+logger = logging.getLogger(__name__)
+
+VOLUME_INVENTORY = os.getenv("VOLUME_INVENTORY", "false").lower() == "true"
+# seconds between full resyncs when there are no events, also the backoff after the events stream fails
+VOLUME_INVENTORY_RESYNC = int(os.getenv("VOLUME_INVENTORY_RESYNC", "300"))
+EVENT_FILTERS = {"type": ["volume", "container"]}
+# container events that can change which volumes are in use
+CONTAINER_ACTIONS = {"create", "destroy"}
+
+
+def volumes_in_use(containers: list[dict]) -> set[str]:
+    return {
+        mount["Name"]
+        for container in containers
+        for mount in container.get("Mounts") or []
+        if mount.get("Type") == "volume"
+    }
+
+
+class VolumeInventory:
+    """
+    in memory copy of the volumes and which are used by a container, built with a full sync and
+    then kept up to date from the docker events stream
+    """
+
+    def __init__(self, client: EngineClient) -> None:
+        self.client = client
+        self.ready = False
+        self._volumes: dict[str, EngineVolume] = {}
+        self._in_use: set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def list_volumes(self) -> list[EngineVolume]:
+        with self._lock:
+            return list(self._volumes.values())
+
+    def get_volume(self, volume_name: str) -> EngineVolume | None:
+        with self._lock:
+            return self._volumes.get(volume_name)
+
+    def is_in_use(self, volume_name: str) -> bool:
+        with self._lock:
+            return volume_name in self._in_use
+
+    def sync(self) -> None:
+        volumes = {volume.name: volume for volume in self.client.list_volumes()}
+        in_use = volumes_in_use(self.client.list_containers())
+        with self._lock:
+            self._volumes = volumes
+            self._in_use = in_use
+        self.ready = True
+        logger.info("volume inventory synced %s volumes, %s in use", len(volumes), len(in_use))
+
+    def sync_containers(self) -> None:
+        in_use = volumes_in_use(self.client.list_containers())
+        with self._lock:
+            self._in_use = in_use
+
+    def apply_event(self, event: dict) -> None:
+        action = event.get("Action", "")
+        if event.get("Type") == "volume":
+            volume_name = event["Actor"]["ID"]
+            if action == "create":
+                volume = self.client.inspect_volume(volume_name)
+                if volume:
+                    with self._lock:
+                        self._volumes[volume_name] = volume
+            elif action == "destroy":
+                with self._lock:
+                    self._volumes.pop(volume_name, None)
+                    self._in_use.discard(volume_name)
+        elif event.get("Type") == "container" and action in CONTAINER_ACTIONS:
+            self.sync_containers()
+
+    def watch(self) -> None:
+        """
+        full sync then apply events until stopped, resyncs when the stream is idle for a while
+        or when it fails
+        """
+        while not self._stop.is_set():
+            # events since just before the sync are replayed so nothing is missed in between
+            since = int(time.time())
+            try:
+                self.sync()
+                for event in self.client.events(
+                    EVENT_FILTERS, since=since, read_timeout=VOLUME_INVENTORY_RESYNC
+                ):
+                    if self._stop.is_set():
+                        return
+                    self.apply_event(event)
+            except httpx.ReadTimeout:
+                continue
+            except (httpx.HTTPError, EngineError):
+                logger.exception("volume inventory events stream failed, resyncing")
+                self.ready = False
+                self._stop.wait(min(VOLUME_INVENTORY_RESYNC, 30))
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.watch, name="volume-inventory", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+_inventory: VolumeInventory | None = None
+
+
+def start_volume_inventory() -> VolumeInventory:
+    global _inventory  # noqa: PLW0603
+    _inventory = VolumeInventory(get_engine_client())
+    _inventory.start()
+    return _inventory
+
+
+def get_volume_inventory() -> VolumeInventory | None:
+    """
+    the inventory when it's running and synced, otherwise None and docker is queried directly
+    """
+    if _inventory and _inventory.ready:
+        return _inventory
+    return None
@@ -0,0 +1,60 @@
+import logging
+import os
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# max backups running at once
+BACKUP_MAX_CONCURRENCY = int(os.getenv("BACKUP_MAX_CONCURRENCY", "4"))
+# max backups reading from the same storage device at once
+BACKUP_MAX_PER_DEVICE = int(os.getenv("BACKUP_MAX_PER_DEVICE", "1"))
+
+# device key of volumes that live in the docker data root
+DEFAULT_DEVICE = "docker-root"
+
+
+def volume_device(volume: object) -> str:
+    """
+    key of the storage device a volume is stored on. Volumes created with a device option
+    (bind mounts of another disk or a block device) are keyed by that device, everything else
+    shares the docker data root. When the path is visible to the app its st_dev is used so
+    volumes on the same filesystem share a key.
+    """
+    options = getattr(volume, "options", None) or {}
+    path = options.get("device") or str(getattr(volume, "mountpoint", "") or "")
+    try:
+        return f"dev-{Path(path).stat().st_dev}" if path else DEFAULT_DEVICE
+    except OSError:
+        return options.get("device") or DEFAULT_DEVICE
+
+
+class BackupLimiter:
+    """
+    caps how many backups run at once overall and per storage device, the device slot is taken
+    first so a backup waiting on a busy device doesn't hold a global slot other devices could use
+    """
+
+    def __init__(self, max_concurrency: int, max_per_device: int) -> None:
+        self.max_per_device = max_per_device
+        self._global = threading.BoundedSemaphore(max_concurrency)
+        self._devices: dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _device_semaphore(self, device: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if device not in self._devices:
+                self._devices[device] = threading.BoundedSemaphore(self.max_per_device)
+            return self._devices[device]
+
+    @contextmanager
+    def acquire(self, device: str) -> Iterator[None]:
+        with self._device_semaphore(device):
+            logger.debug("acquired device slot %s", device)
+            with self._global:
+                yield
+
+
+BACKUP_LIMITER = BackupLimiter(BACKUP_MAX_CONCURRENCY, BACKUP_MAX_PER_DEVICE)
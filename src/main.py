@@ -6,8 +6,13 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from src.apschedule.schedule import setup_scheduler
+from src.apschedule.schedule import has_incremental_schedules, setup_scheduler
+from src.docker import INCREMENTAL_HELPER_IMAGE, get_docker_client
+from src.helper_image import HELPER_IMAGE, start_helper_images
+from src.helper_pool import HELPER_POOL_SIZE, start_helper_pool
+from src.inventory import VOLUME_INVENTORY, start_volume_inventory
 from src.routes import api, html
+from src.sftp import start_sftp_pool
 
 logger = logging.getLogger(__name__)
 CORS_ORIGINS = os.getenv("CORS_ORIGINS").split(",") if os.getenv("CORS_ORIGINS") else ["*"]
@@ -18,7 +23,28 @@ logger.info("CORS allow_origins: %s", CORS_ORIGINS)
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     scheduler = setup_scheduler()
+    inventory = start_volume_inventory() if VOLUME_INVENTORY else None
+    # the helper images are pulled in the background, jobs started before they're ready pull them.
+    # The bigger incremental image is only pulled up front when a schedule takes incremental
+    # backups, otherwise from the first job that runs it
+    images = (
+        [HELPER_IMAGE, INCREMENTAL_HELPER_IMAGE] if has_incremental_schedules(scheduler) else [HELPER_IMAGE]
+    )
+    helper_images = start_helper_images(get_docker_client(), images)
+    helper_pool = (
+        start_helper_pool(get_docker_client(), HELPER_IMAGE, os.getenv("BACKUP_DIR"))
+        if HELPER_POOL_SIZE
+        else None
+    )
+    # connections to the sftp backup sources are shared by the uploads to a source
+    sftp_pool = start_sftp_pool()
     yield
+    sftp_pool.stop()
+    if helper_pool:
+        helper_pool.stop()
+    helper_images.stop()
+    if inventory:
+        inventory.stop()
     scheduler.shutdown(wait=False)
 
 
@@ -2,7 +2,8 @@ import uuid
 from enum import Enum
 from typing import Optional, Self
 
-from pydantic import BaseModel, model_validator
+from pydantic import BaseModel, field_validator, model_validator
+from sqlalchemy import JSON, Column
 from sqlmodel import Field, SQLModel
 
 
@@ -28,6 +29,12 @@ class RestoreVolumeResponse(BaseModel):
 class RestoreVolume(BaseModel):
     volume_name: str
     backup_filename: str
+    # restore into a new volume and swap it in once it's verified, the replaced files are kept
+    # in a rollback volume
+    swap: bool = False
+    # restore from the copy uploaded to this sftp backup source, it's streamed into the volume
+    # without being written to the backup dir
+    source_id: str | None = None
 
 
 class RestoreVolumeHtmlRequest(BaseModel):
@@ -44,10 +51,214 @@ class ScheduleCrontab(BaseModel):
     day_of_week: str = "*"
 
 
+class BackupStorageFormat(Enum):
+    # a single tarball in the backup dir
+    Archive = "Archive"  # pylint: disable=invalid-name
+    # deduplicated chunks in the backup dir repository, the backup filename is the manifest
+    Repository = "Repository"  # pylint: disable=invalid-name
+
+
+class BackupCodec(str, Enum):
+    NONE = "none"
+    GZIP = "gzip"
+    ZSTD = "zstd"
+    LZ4 = "lz4"
+
+
+class QuiesceMode(str, Enum):
+    # back up the volume as it is, only volumes no container uses can be backed up
+    NONE = "none"
+    # pause or stop the containers using the volume while it's copied to a staging volume
+    PAUSE = "pause"
+    STOP = "stop"
+
+
+# (min, max, default) compression level of each codec
+CODEC_LEVELS = {
+    BackupCodec.GZIP: (1, 9, 6),
+    BackupCodec.ZSTD: (1, 22, 3),
+    BackupCodec.LZ4: (0, 16, 0),
+}
+
+
+class HelperLimits(BaseModel):
+    """
+    resources the helper containers of a job can use, unset fields aren't limited
+    """
+
+    # cpus the helper can use, e.g. 0.5 for half a core
+    cpus: float | None = Field(default=None, gt=0)
+    # docker memory limit, e.g. 256m
+    memory: str | None = None
+    # relative block io weight, 10 to 1000
+    blkio_weight: int | None = Field(default=None, ge=10, le=1000)
+    # max bytes per second per device, e.g. /dev/sda:50mb
+    device_read_bps: list[str] = []
+    device_write_bps: list[str] = []
+    # the helper command runs with nice and ionice, class 2 is best effort and 3 idle
+    nice: int | None = Field(default=None, ge=0, le=19)
+    ionice_class: int | None = Field(default=None, ge=2, le=3)
+    ionice_level: int | None = Field(default=None, ge=0, le=7)
+
+    def merge(self, overrides: Self | None) -> Self:
+        """
+        these limits with the fields set in overrides replacing them
+        """
+        if not overrides:
+            return self
+        return self.model_copy(update=overrides.model_dump(exclude_unset=True))
+
+
+class HelperImageStatus(BaseModel):
+    # image as configured
+    name: str
+    # the image pinned by digest that helpers run once it's pulled
+    reference: str | None = None
+    ready: bool = False
+    # why the last pull failed
+    error: str | None = None
+
+
+class BackupOptions(BaseModel):
+    # write a level-N archive chained to the last backup of the volume instead of a full backup
+    incremental: bool = False
+    storage_format: BackupStorageFormat = BackupStorageFormat.Archive
+    codec: BackupCodec = BackupCodec.GZIP
+    # None uses the default level of the codec
+    codec_level: int | None = None
+    quiesce: QuiesceMode = QuiesceMode.NONE
+    # resource limits of the helper containers, on top of the global HELPER_* limits
+    limits: HelperLimits | None = None
+    # write the archive as this many parts split by top level entry, which are compressed and
+    # extracted concurrently
+    parts: int | None = Field(default=None, ge=2, le=64)
+    # glob patterns of the entries in the root of the volume to back up, everything when empty
+    include: list[str] = []
+    # glob patterns of the files and directories left out of the backup e.g. cache or *.log
+    exclude: list[str] = []
+    # record a backup pointing at the archive of the last backup when the fingerprint of the
+    # volume tree didn't change since it, instead of archiving the volume again
+    skip_unchanged: bool = False
+    # ids of the sftp backup sources the archives are written to along with the backup dir
+    upload_to: list[str] = []
+
+    @field_validator("include")
+    @classmethod
+    def check_include(cls, include: list[str]) -> list[str]:
+        include = [pattern.removeprefix("./").strip("/") for pattern in include]
+        if any(not pattern or "/" in pattern for pattern in include):
+            raise ValueError("include patterns must match entries in the root of the volume")
+        return include
+
+    @field_validator("exclude")
+    @classmethod
+    def check_exclude(cls, exclude: list[str]) -> list[str]:
+        if any(not pattern.strip() for pattern in exclude):
+            raise ValueError("exclude patterns can't be empty")
+        return exclude
+
+    @model_validator(mode="after")
+    def check_storage_format(self) -> Self:
+        if self.incremental and self.storage_format == BackupStorageFormat.Repository:
+            raise ValueError("incremental backups can only be stored as an archive")
+        if self.storage_format == BackupStorageFormat.Repository and (
+            self.codec != BackupCodec.GZIP or self.codec_level is not None
+        ):
+            raise ValueError("codec can only be set for backups stored as an archive")
+        if self.parts and (self.incremental or self.storage_format == BackupStorageFormat.Repository):
+            raise ValueError("only full backups stored as an archive can be split into parts")
+        if self.upload_to and self.storage_format == BackupStorageFormat.Repository:
+            raise ValueError("only backups stored as an archive can be uploaded to backup sources")
+        return self
+
+    @model_validator(mode="after")
+    def check_codec_level(self) -> Self:
+        if self.codec_level is None:
+            return self
+        if self.codec not in CODEC_LEVELS:
+            msg = f"codec {self.codec.value} doesn't support a compression level"
+            raise ValueError(msg)
+        min_level, max_level, _ = CODEC_LEVELS[self.codec]
+        if not min_level <= self.codec_level <= max_level:
+            msg = f"compression level for {self.codec.value} must be between {min_level} and {max_level}"
+            raise ValueError(msg)
+        return self
+
+
+class BatchBackupRequest(BaseModel):
+    volume_names: list[str] = Field(min_length=1)
+    options: BackupOptions | None = None
+
+
+class RestoreBackupPath(BaseModel):
+    # file or directory in the backup, relative to the volume root, escaped like the index
+    path: str
+    volume_name: str
+
+
+class VerifyBackups(BaseModel):
+    # all processed backups are verified when not set
+    backup_ids: list[str] | None = None
+
+
+class VerifyUploads(BaseModel):
+    # all uploaded archives are verified when not set
+    backup_ids: list[str] | None = None
+    source_ids: list[str] | None = None
+
+
+class VerifyBackupsResponse(BaseModel):
+    verify_id: str
+
+
+class UploadBackupResponse(BaseModel):
+    upload_id: str
+
+
+class BackupFileEntry(BaseModel):
+    name: str
+    path: str
+    member_type: str
+    # for directories the files and bytes of everything under them
+    file_count: int
+    size: int
+    mtime: int | None = None
+
+
+class BackupFilesPage(BaseModel):
+    path: str
+    entries: list[BackupFileEntry]
+    # pass as after to get the next page, None on the last page
+    next_after: str | None = None
+
+
+class BackupDiffEntry(BaseModel):
+    path: str
+    # added, removed or modified
+    change: str
+    member_type: str
+    old_size: int | None = None
+    new_size: int | None = None
+    size_delta: int
+
+
+class BackupDiff(BaseModel):
+    volume_name: str | None
+    base_backup_id: str
+    backup_id: str
+    added: int
+    removed: int
+    modified: int
+    size_delta: int
+    # the changes with the biggest size delta first
+    entries: list[BackupDiffEntry]
+
+
 class CreateBackupSchedule(BaseModel):
     schedule_name: str
     volume_name: str
     crontab: ScheduleCrontab
+    options: BackupOptions | None = None
 
 
 class BackupSchedule(BaseModel):
@@ -55,6 +266,7 @@ class BackupSchedule(BaseModel):
     volume_name: str
     schedule_name: str | None = None
     crontab: ScheduleCrontab = None
+    options: BackupOptions | None = None
 
 
 # db models
@@ -77,6 +289,28 @@ class Backups(SQLModel, table=True):
     status: BackUpStatus | None = BackUpStatus.Created
     error_message: Optional[str] = Field(default=None)
     created_at: Optional[str] = Field(default=None)
+    # incremental backups, level 0 is the full backup the chain starts from
+    parent_backup_id: Optional[str] = Field(default=None)
+    backup_level: Optional[int] = Field(default=None)
+    storage_format: BackupStorageFormat | None = BackupStorageFormat.Archive
+    # compression of archives, null for backups from before codecs were added which are gzip
+    codec: BackupCodec | None = Field(default=None)
+    codec_level: Optional[int] = Field(default=None)
+    # sha256 and size in bytes of the archive, or of the manifest for repository backups
+    checksum: Optional[str] = Field(default=None)
+    size: Optional[int] = Field(default=None)
+    # result of the last verify job run, null when it hasn't been verified yet
+    verified: Optional[bool] = Field(default=None)
+    verified_at: Optional[str] = Field(default=None)
+    # resource limits the helper containers ran with, null when nothing was limited
+    limits: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    # include and exclude patterns the backup was written with, null when everything was archived
+    include: Optional[list] = Field(default=None, sa_column=Column(JSON))
+    exclude: Optional[list] = Field(default=None, sa_column=Column(JSON))
+    # hash of the volume tree and the backup options, null when it wasn't computed
+    fingerprint: Optional[str] = Field(default=None)
+    # backup whose archive this one uses as the volume didn't change since it
+    unchanged_backup_id: Optional[str] = Field(default=None)
 
 
 class BackupFilenames(SQLModel, table=True):
@@ -85,6 +319,105 @@ class BackupFilenames(SQLModel, table=True):
         default=None,
         foreign_key="backups.backup_id",
     )
+    # number of the part for backups split into parts, with the sha256 and size of the part
+    part: Optional[int] = Field(default=None)
+    checksum: Optional[str] = Field(default=None)
+    size: Optional[int] = Field(default=None)
+
+
+class BackupMembers(SQLModel, table=True):
+    """
+    index of the files in an archive, offsets are in the uncompressed tar stream
+    """
+
+    backup_id: str = Field(primary_key=True, foreign_key="backups.backup_id")
+    path: str = Field(primary_key=True)
+    member_type: str
+    size: int
+    mtime: int
+    offset: int
+    data_offset: int
+    # part of a backup split into parts the member is in, offsets are in the tar stream of the part
+    part: int = 0
+
+
+class BackupFrames(SQLModel, table=True):
+    """
+    independently compressed frames of an archive, decompression can start at any of them
+    """
+
+    backup_id: str = Field(primary_key=True, foreign_key="backups.backup_id")
+    frame: int = Field(primary_key=True)
+    source_offset: int
+    offset: int
+    size: int
+    part: int = 0
+
+
+class ContainerDowntime(SQLModel, table=True):
+    """
+    how long a container was paused or stopped while the volume it uses was copied for a backup
+    """
+
+    backup_id: str = Field(primary_key=True, foreign_key="backups.backup_id")
+    container_id: str = Field(primary_key=True)
+    container_name: Optional[str] = Field(default=None)
+    quiesce: QuiesceMode
+    stopped_at: str
+    restarted_at: Optional[str] = Field(default=None)
+    # seconds between stopping and restarting the container, None when it failed to restart
+    downtime: Optional[float] = Field(default=None)
+
+
+class UploadStatus(str, Enum):
+    Uploading = "Uploading"
+    Uploaded = "Uploaded"
+    Failed = "Failed"
+
+
+class UploadVerifyMethod(str, Enum):
+    # the server hashed the remote copy with a command run over ssh
+    Hash = "Hash"
+    # ranges of the remote copy were read and compared with the local archive
+    Sampled = "Sampled"
+
+
+class BackupUploads(SQLModel, table=True):
+    """
+    upload of an archive of a backup to an sftp backup source, backups split into parts have a
+    row per part
+    """
+
+    backup_id: str = Field(primary_key=True, foreign_key="backups.backup_id")
+    source_id: str = Field(primary_key=True)
+    backup_filename: str = Field(primary_key=True)
+    remote_path: str
+    status: UploadStatus = UploadStatus.Uploading
+    size: int
+    # bytes from the start of the archive the remote confirmed, an interrupted upload resumes here
+    confirmed_bytes: int = 0
+    # bytes per second of the last attempt
+    throughput: Optional[float] = Field(default=None)
+    started_at: Optional[str] = Field(default=None)
+    finished_at: Optional[str] = Field(default=None)
+    error_message: Optional[str] = Field(default=None)
+    # result of the last verification of the remote copy, null when it hasn't been verified yet
+    verified: Optional[bool] = Field(default=None)
+    verified_at: Optional[str] = Field(default=None)
+    verify_method: Optional[UploadVerifyMethod] = Field(default=None)
+    # sha256 the server computed for the remote copy, null when it was sampled
+    remote_checksum: Optional[str] = Field(default=None)
+
+
+class RepositoryChunks(SQLModel, table=True):
+    """
+    index of the unique chunks stored in the deduplicated backup repository
+    """
+
+    chunk_hash: str = Field(primary_key=True)
+    size: int
+    stored_size: int
+    created_at: Optional[str] = Field(default=None)
 
 
 class RestoredBackups(SQLModel, table=True):
@@ -95,6 +428,8 @@ class RestoredBackups(SQLModel, table=True):
     created_at: Optional[str] = Field(default=None)
     successful: bool = True
     error_message: Optional[str] = Field(default=None)
+    # volume holding the files a swap restore replaced
+    rollback_volume: Optional[str] = Field(default=None)
 
 
 class SshKeyTypes(str, Enum):
@@ -0,0 +1,113 @@
+import logging
+import os
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import TypeVar
+
+from src.archive import ArchiveResult, TeeSinks
+from src.docker import TarFilter, list_top_level_sizes, stream_backup_volume
+from src.helper_limits import current_limits, use_limits
+from src.models import BackupCodec
+from src.progress import current_job, report_to
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# max parts of a backup written or extracted at once
+PARTS_MAX_WORKERS = int(os.getenv("PARTS_MAX_WORKERS", str(os.cpu_count() or 2)))
+# max bytes of entry names passed to tar on its command line, volumes with more in their root
+# are written as a single part
+PARTS_MAX_ARGS = 512 * 1024
+
+
+def part_filename(backup_file: str, part: int) -> str:
+    """
+    name of a part of the backup, the part number goes before the archive extensions
+    """
+    name, dot, extensions = backup_file.rpartition(".tar")
+    return f"{name}.part{part:03d}{dot}{extensions}"
+
+
+def split_entries(entries: list[tuple[str, int]], parts: int) -> list[list[str]]:
+    """
+    spread the entries over at most parts groups of about the same size, the biggest entries
+    are placed first each in the smallest group so far
+    """
+    groups: list[tuple[int, list[str]]] = [(0, []) for _ in range(min(parts, len(entries)))]
+    for name, size in sorted(entries, key=lambda entry: entry[1], reverse=True):
+        index = min(range(len(groups)), key=lambda i: groups[i][0])
+        total, names = groups[index]
+        groups[index] = (total + size, [*names, name])
+    return [sorted(names) for _, names in groups]
+
+
+def run_concurrently(functions: list[Callable[[], T]], max_workers: int = PARTS_MAX_WORKERS) -> list[T]:
+    """
+    run the functions in threads that report progress to the job of this thread and start
+    helper containers with its limits, returns their results in order
+    """
+    job, limits = current_job(), current_limits()
+
+    def run(function: Callable[[], T]) -> T:
+        with report_to(job), use_limits(limits):
+            return function()
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="backup-part") as executor:
+        return list(executor.map(run, functions))
+
+
+def stream_backup_parts(
+    volume_name: str,
+    backup_dir: str,
+    backup_file: str,
+    parts: int,
+    codec: BackupCodec = BackupCodec.GZIP,
+    codec_level: int | None = None,
+    tar_filter: TarFilter | None = None,
+    tee: TeeSinks | None = None,
+) -> list[tuple[str, ArchiveResult]]:
+    """
+    backup a volume as independent archives of groups of the entries in its root, or of the
+    entries of the filter, written concurrently. Returns the filename and result of every part,
+    the members and frames of each result are numbered with its part
+    """
+    tar_filter = tar_filter or TarFilter()
+    entries = list_top_level_sizes(volume_name)
+    if tar_filter.entries is not None:
+        entries = [(name, size) for name, size in entries if name in tar_filter.entries]
+    groups = split_entries(entries, parts)
+    if not groups or sum(len(name) + 3 for name, _ in entries) > PARTS_MAX_ARGS:
+        groups = [tar_filter.entries or []]
+    filenames = [part_filename(backup_file, part) for part in range(len(groups))]
+    logger.info("Backing up volume %s as %s parts", volume_name, len(groups))
+    try:
+        results = run_concurrently(
+            [
+                partial(
+                    stream_backup_volume,
+                    volume_name,
+                    backup_dir,
+                    filename,
+                    codec=codec,
+                    codec_level=codec_level,
+                    tar_filter=TarFilter(group or None, tar_filter.exclude),
+                    tee=tee,
+                )
+                for filename, group in zip(filenames, groups, strict=True)
+            ]
+        )
+    except Exception:
+        # parts that did complete are useless without the others
+        for filename in filenames:
+            (Path(backup_dir) / filename).unlink(missing_ok=True)
+        raise
+
+    for part, result in enumerate(results):
+        for member in result.members:
+            member.part = part
+        for frame in result.frames:
+            frame.part = part
+    return list(zip(filenames, results, strict=True))
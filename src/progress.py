@@ -0,0 +1,222 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncIterator, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from fastapi import Request
+
+# seconds of samples used for the current throughput
+THROUGHPUT_WINDOW = 10
+# how long finished jobs are still sent to subscribers so they see the final state
+FINISHED_RETENTION = 60
+# seconds between checks for new progress on an events stream
+EVENTS_INTERVAL = 1
+# seconds between keep alive comments on an idle events stream
+KEEP_ALIVE_INTERVAL = 15
+
+
+@dataclass
+class JobProgress:
+    job_id: str
+    kind: str
+    volume_name: str
+    # archive size of the last backup, used for the eta
+    expected_bytes: int | None = None
+    status: str = "running"
+    error: str | None = None
+    bytes: int = 0
+    files: int = 0
+    started_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+    _samples: deque = field(default_factory=deque, repr=False)
+
+    @property
+    def throughput(self) -> float:
+        """
+        bytes per second over the last THROUGHPUT_WINDOW seconds
+        """
+        if len(self._samples) < 2:  # noqa: PLR2004
+            return 0.0
+        (start, start_bytes), (end, end_bytes) = self._samples[0], self._samples[-1]
+        return (end_bytes - start_bytes) / (end - start) if end > start else 0.0
+
+    @property
+    def eta(self) -> float | None:
+        throughput = self.throughput
+        if not self.expected_bytes or not throughput or self.status != "running":
+            return None
+        return max(self.expected_bytes - self.bytes, 0) / throughput
+
+    def add(self, bytes: int, files: int) -> None:
+        self.bytes += bytes
+        self.files += files
+        now = time.monotonic()
+        self._samples.append((now, self.bytes))
+        while len(self._samples) > 2 and now - self._samples[0][0] > THROUGHPUT_WINDOW:  # noqa: PLR2004
+            self._samples.popleft()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "volume_name": self.volume_name,
+            "status": self.status,
+            "error": self.error,
+            "bytes": self.bytes,
+            "files": self.files,
+            "expected_bytes": self.expected_bytes,
+            "throughput": round(self.throughput),
+            "eta": round(self.eta) if self.eta is not None else None,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class ProgressRegistry:
+    """
+    progress of the running backups and restores, updated from the scheduler worker threads and
+    read by the events streams. version goes up on every change so streams only send when
+    something happened
+    """
+
+    def __init__(self) -> None:
+        self.version = 0
+        self._jobs: dict[str, JobProgress] = {}
+        self._lock = threading.Lock()
+
+    def start(self, job: JobProgress) -> JobProgress:
+        with self._lock:
+            self._prune()
+            self._jobs[job.job_id] = job
+            self.version += 1
+        return job
+
+    def update(self, job: JobProgress, bytes: int = 0, files: int = 0) -> None:
+        with self._lock:
+            job.add(bytes, files)
+            self.version += 1
+
+    def finish(self, job: JobProgress, error: str | None = None) -> None:
+        with self._lock:
+            job.status = "errored" if error else "finished"
+            job.error = error
+            job.finished_at = time.time()
+            self.version += 1
+
+    def jobs(self) -> list[dict]:
+        with self._lock:
+            self._prune()
+            return [job.to_dict() for job in self._jobs.values()]
+
+    def _prune(self) -> None:
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at and now - job.finished_at > FINISHED_RETENTION:
+                del self._jobs[job_id]
+
+
+PROGRESS = ProgressRegistry()
+_current = threading.local()
+
+
+def current_job() -> JobProgress | None:
+    return getattr(_current, "job", None)
+
+
+@contextmanager
+def track_progress(
+    job_id: str,
+    kind: str,
+    volume_name: str,
+    expected_bytes: int | None = None,
+) -> Iterator[JobProgress]:
+    """
+    track the progress of a job running in this thread, report_progress calls made in the block
+    are added to it
+    """
+    job = PROGRESS.start(JobProgress(job_id, kind, volume_name, expected_bytes=expected_bytes))
+    _current.job = job
+    try:
+        yield job
+    except Exception as e:
+        PROGRESS.finish(job, error=str(e))
+        raise
+    else:
+        PROGRESS.finish(job)
+    finally:
+        _current.job = None
+
+
+@contextmanager
+def report_to(job: JobProgress | None) -> Iterator[None]:
+    """
+    progress reported by this thread in the block goes to a job running in another thread
+    """
+    _current.job = job
+    try:
+        yield
+    finally:
+        _current.job = None
+
+
+def report_progress(bytes: int = 0, files: int = 0, job: JobProgress | None = None) -> None:
+    """
+    add to the progress of the job running in this thread, threads started by the job need to
+    pass the job they got from current_job()
+    """
+    job = job or current_job()
+    if job:
+        PROGRESS.update(job, bytes=bytes, files=files)
+
+
+def expect_progress(bytes: int) -> None:
+    """
+    add to the bytes the job running in this thread is expected to process
+    """
+    job = current_job()
+    if job:
+        job.expected_bytes = (job.expected_bytes or 0) + bytes
+
+
+class ProgressSink:
+    """
+    archive sink that reports the bytes written to the archive
+    """
+
+    def __init__(self, job: JobProgress | None = None) -> None:
+        self.job = job or current_job()
+
+    def write(self, data: bytes) -> None:
+        report_progress(bytes=len(data), job=self.job)
+
+    def close(self) -> None:
+        pass
+
+    def abort(self) -> None:
+        pass
+
+
+def format_event(jobs: list[dict]) -> str:
+    return f"event: progress\ndata: {json.dumps(jobs)}\n\n"
+
+
+async def progress_events(request: Request, registry: ProgressRegistry = PROGRESS) -> AsyncIterator[str]:
+    """
+    server sent events stream of the progress of all jobs, sent whenever it changes
+    """
+    version = None
+    idle = 0.0
+    while not await request.is_disconnected():
+        if registry.version != version:
+            version = registry.version
+            idle = 0.0
+            yield format_event(registry.jobs())
+        elif idle >= KEEP_ALIVE_INTERVAL:
+            idle = 0.0
+            yield ": keep alive\n\n"
+        await asyncio.sleep(EVENTS_INTERVAL)
+        idle += EVENTS_INTERVAL
@@ -0,0 +1,95 @@
+import logging
+import os
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from python_on_whales import DockerException
+
+from src.docker import copy_volume, create_volume, get_docker_client, get_volume_containers, remove_volume
+from src.helper_limits import DEFAULT_LIMITS, use_limits
+from src.models import ContainerDowntime, QuiesceMode
+
+logger = logging.getLogger(__name__)
+
+# seconds docker waits for a container to stop before killing it
+QUIESCE_STOP_TIMEOUT = int(os.getenv("QUIESCE_STOP_TIMEOUT", "10"))
+# label set on the staging volumes so leftovers can be found
+STAGING_LABEL = "docker-volume-backup.staging"
+
+
+def staging_volume_name(volume_name: str, backup_id: str) -> str:
+    return f"{volume_name}-staging-{backup_id[:8]}"
+
+
+def _now() -> str:
+    return datetime.now(tz=timezone.utc).isoformat()
+
+
+@contextmanager
+def quiesced_volume(
+    volume_name: str,
+    mode: QuiesceMode,
+    backup_id: str,
+    downtimes: list[ContainerDowntime],
+) -> Iterator[str]:
+    """
+    name of the volume to back up. With a quiesce mode the running containers using the volume
+    are paused or stopped only while it's copied to a staging volume, they are restarted before
+    the copy is archived and the staging volume is removed once the block exits. The copy runs
+    with the global helper limits. The downtime of every container is added to downtimes
+    """
+    containers = get_volume_containers(volume_name) if mode != QuiesceMode.NONE else []
+    if not containers:
+        yield volume_name
+        return
+
+    client = get_docker_client()
+    staging = staging_volume_name(volume_name, backup_id)
+    create_volume(staging, labels={STAGING_LABEL: volume_name})
+    try:
+        logger.info(
+            "%s containers %s to copy volume %s",
+            "pausing" if mode == QuiesceMode.PAUSE else "stopping",
+            [container.name for container in containers],
+            volume_name,
+        )
+        stopped_at, started = _now(), time.monotonic()
+        try:
+            if mode == QuiesceMode.PAUSE:
+                client.container.pause(containers)
+            else:
+                client.container.stop(containers, time=QUIESCE_STOP_TIMEOUT)
+            # the containers are down while it copies, the limits of the backup only apply to
+            # archiving the copy
+            with use_limits(DEFAULT_LIMITS):
+                copy_volume(volume_name, staging)
+        finally:
+            restarted_at, downtime = None, None
+            try:
+                if mode == QuiesceMode.PAUSE:
+                    client.container.unpause(containers)
+                else:
+                    client.container.start(containers)
+                restarted_at, downtime = _now(), time.monotonic() - started
+            finally:
+                downtimes.extend(
+                    ContainerDowntime(
+                        backup_id=backup_id,
+                        container_id=container.id,
+                        container_name=container.name,
+                        quiesce=mode,
+                        stopped_at=stopped_at,
+                        restarted_at=restarted_at,
+                        downtime=downtime,
+                    )
+                    for container in containers
+                )
+        logger.info("volume %s copied, containers were down for %.1fs", volume_name, downtime)
+        yield staging
+    finally:
+        try:
+            remove_volume(staging)
+        except DockerException:
+            logger.exception("removing staging volume %s failed", staging)
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import logging
+import uuid
+import zlib
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlmodel import Session
+
+from src.docker import TarFilter, get_volume, restore_volume_from_stream, stream_volume_tar
+from src.models import RepositoryChunks
+from src.progress import expect_progress, report_progress
+from src.routes.impl.volumes.repository import db_add_repository_chunks, db_get_repository_chunk
+
+logger = logging.getLogger(__name__)
+
+REPOSITORY_DIR = "repository"
+MANIFEST_VERSION = 1
+
+TAR_BLOCK_SIZE = 512
+CHUNK_MIN_SIZE = 256 * 1024
+CHUNK_AVG_SIZE = 1024 * 1024
+CHUNK_MAX_SIZE = 4 * 1024 * 1024
+# new chunks indexed per transaction, each one only holds the database locked briefly
+CHUNK_INDEX_BATCH = 64
+
+
+def chunk_tar_stream(
+    stream: Iterable[bytes],
+    min_size: int = CHUNK_MIN_SIZE,
+    avg_size: int = CHUNK_AVG_SIZE,
+    max_size: int = CHUNK_MAX_SIZE,
+) -> Iterator[bytes]:
+    """
+    split a tar stream into content defined chunks.
+
+    tar writes everything in 512 byte blocks, so adding or removing data only shifts the rest of
+    the stream by whole blocks. That means cut points only need to be checked on block boundaries
+    by hashing single blocks, instead of a rolling hash over every byte, and they still line up
+    again after a change. A block is a cut point when its crc32 matches the mask, which gives
+    chunks of avg_size on average.
+    """
+    mask = avg_size // TAR_BLOCK_SIZE - 1
+    pending = bytearray()
+    # offset in pending up to which blocks have been checked for a cut point
+    scanned = min_size - TAR_BLOCK_SIZE
+
+    for data in stream:
+        pending += data
+        while True:
+            cut = None
+            limit = min(len(pending), max_size)
+            while scanned + TAR_BLOCK_SIZE <= limit:
+                block_end = scanned + TAR_BLOCK_SIZE
+                if zlib.crc32(pending[scanned:block_end]) & mask == 0:
+                    cut = block_end
+                    break
+                scanned = block_end
+
+            if cut is None and len(pending) >= max_size:
+                cut = max_size
+            if cut is None:
+                break
+
+            yield bytes(pending[:cut])
+            del pending[:cut]
+            scanned = min_size - TAR_BLOCK_SIZE
+
+    if pending:
+        yield bytes(pending)
+
+
+class ChunkStore:
+    """
+    chunks are stored zlib compressed in the backup dir repository, named by the sha256 of
+    the uncompressed chunk
+    """
+
+    def __init__(self, backup_dir: str) -> None:
+        self.root = Path(backup_dir) / REPOSITORY_DIR
+
+    def chunk_path(self, chunk_hash: str) -> Path:
+        return self.root / "chunks" / chunk_hash[:2] / chunk_hash
+
+    def manifest_path(self, manifest_filename: str) -> Path:
+        return self.root / "manifests" / manifest_filename
+
+    def put(self, chunk_hash: str, data: bytes) -> int:
+        path = self.chunk_path(chunk_hash)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        compressed = zlib.compress(data)
+        # concurrent backups can store the same chunk, each writes its own part file
+        part_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.part")
+        part_path.write_bytes(compressed)
+        part_path.replace(path)
+        return len(compressed)
+
+    def get(self, chunk_hash: str) -> bytes:
+        data = zlib.decompress(self.chunk_path(chunk_hash).read_bytes())
+        if hashlib.sha256(data).hexdigest() != chunk_hash:
+            msg = f"Chunk {chunk_hash} is corrupt"
+            raise RuntimeError(msg)
+        return data
+
+    def write_manifest(self, manifest_filename: str, manifest: dict) -> Path:
+        path = self.manifest_path(manifest_filename)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(manifest))
+        return path
+
+    def read_manifest(self, manifest_filename: str) -> dict:
+        return json.loads(self.manifest_path(manifest_filename).read_text())
+
+
+@dataclass
+class RepositoryResult:
+    manifest_path: Path
+    # sha256 of the manifest, the chunks are checked against their own hashes
+    manifest_checksum: str
+    # bytes of the uncompressed tar stream
+    size: int
+    chunk_count: int
+    new_chunk_count: int
+    # compressed bytes of the chunks that weren't in the repository yet
+    new_stored_size: int
+
+
+def write_repository_backup(
+    session: Session,
+    stream: Iterable[bytes],
+    backup_dir: str,
+    manifest_filename: str,
+) -> RepositoryResult:
+    """
+    store a tar stream in the repository, only chunks that aren't in the chunk index yet are
+    written. New chunks are indexed in short transactions of their own once their files are
+    written, so the session doesn't hold a write lock on the database for the whole backup.
+    """
+    store = ChunkStore(backup_dir)
+    chunk_hashes = []
+    new_chunks = set()
+    pending: list[RepositoryChunks] = []
+    size = 0
+    new_stored_size = 0
+    created_at = datetime.now(tz=timezone.utc).isoformat()
+
+    def index_pending() -> None:
+        if not pending:
+            return
+        with Session(session.get_bind()) as index_session:
+            db_add_repository_chunks(index_session, pending)
+            index_session.commit()
+        pending.clear()
+
+    for chunk in chunk_tar_stream(stream):
+        chunk_hash = hashlib.sha256(chunk).hexdigest()
+        chunk_hashes.append(chunk_hash)
+        size += len(chunk)
+        report_progress(bytes=len(chunk))
+        with session.no_autoflush:
+            if chunk_hash in new_chunks or db_get_repository_chunk(session, chunk_hash):
+                continue
+
+        stored_size = store.put(chunk_hash, chunk)
+        new_chunks.add(chunk_hash)
+        new_stored_size += stored_size
+        pending.append(
+            RepositoryChunks(
+                chunk_hash=chunk_hash,
+                size=len(chunk),
+                stored_size=stored_size,
+                created_at=created_at,
+            )
+        )
+        if len(pending) >= CHUNK_INDEX_BATCH:
+            index_pending()
+    index_pending()
+
+    manifest_path = store.write_manifest(
+        manifest_filename,
+        {"version": MANIFEST_VERSION, "size": size, "chunks": chunk_hashes},
+    )
+    return RepositoryResult(
+        manifest_path=manifest_path,
+        manifest_checksum=hashlib.sha256(manifest_path.read_bytes()).hexdigest(),
+        size=size,
+        chunk_count=len(chunk_hashes),
+        new_chunk_count=len(new_chunks),
+        new_stored_size=new_stored_size,
+    )
+
+
+def read_repository_backup(backup_dir: str, manifest_filename: str) -> Iterator[bytes]:
+    store = ChunkStore(backup_dir)
+    manifest = store.read_manifest(manifest_filename)
+    expect_progress(manifest["size"])
+    for chunk_hash in manifest["chunks"]:
+        chunk = store.get(chunk_hash)
+        report_progress(bytes=len(chunk))
+        yield chunk
+
+
+def backup_volume_to_repository(
+    session: Session,
+    volume_name: str,
+    backup_dir: str,
+    manifest_filename: str,
+    tar_filter: TarFilter | None = None,
+) -> RepositoryResult:
+    if not get_volume(volume_name):
+        msg = f"Volume {volume_name} does not exist"
+        raise ValueError(msg)
+
+    logger.info("Backing up volume %s to repository manifest %s", volume_name, manifest_filename)
+    result = write_repository_backup(
+        session, stream_volume_tar(volume_name, tar_filter=tar_filter), backup_dir, manifest_filename
+    )
+    logger.info(
+        "Backup of %s stored %s of %s chunks, %s bytes written",
+        volume_name,
+        result.new_chunk_count,
+        result.chunk_count,
+        result.new_stored_size,
+    )
+    return result
+
+
+def restore_volume_from_repository(volume_name: str, backup_dir: str, manifest_filename: str) -> None:
+    restore_volume_from_stream(volume_name, read_repository_backup(backup_dir, manifest_filename))
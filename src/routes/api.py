@@ -1,41 +1,82 @@
 import logging
 import uuid
+from typing import Annotated
+from urllib.parse import quote
 
 from apscheduler.jobstores.base import ConflictingIdError, JobLookupError
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlmodel import Session
 
 from src.apschedule.schedule import (
     add_backup_job,
     add_restore_job,
+    add_restore_path_job,
+    add_upload_job,
+    add_verify_job,
+    add_verify_uploads_job,
     delete_backup_schedule,
     get_backup_schedule,
     list_backup_schedules,
 )
 from src.db import get_session
 from src.docker import get_volume, is_volume_attached
+from src.helper_image import get_helper_images
 from src.models import (
+    BackupCodec,
+    BackupDiff,
+    BackupFilesPage,
+    BackupOptions,
     Backups,
     BackupSchedule,
     BackUpStatus,
+    BackupStorageFormat,
+    BackupUploads,
+    BatchBackupRequest,
+    ContainerDowntime,
     CreateBackupResponse,
     CreateBackupSchedule,
+    HelperImageStatus,
+    QuiesceMode,
+    RestoreBackupPath,
     RestoredBackups,
     RestoreVolume,
     RestoreVolumeResponse,
     SftpBackupSourceCreate,
     SftpBackupSourcePublic,
+    UploadBackupResponse,
+    VerifyBackups,
+    VerifyBackupsResponse,
+    VerifyUploads,
     VolumeItem,
 )
-from src.routes.impl.volumes.backups import db_get_backup, db_list_backups
+from src.progress import progress_events
+from src.routes.impl.volumes.backup_index import (
+    db_diff_backups,
+    db_get_backup_frames,
+    db_get_backup_members,
+    db_has_backup_index,
+    db_list_backup_files,
+)
+from src.routes.impl.volumes.backups import (
+    db_get_archive_backup,
+    db_get_backup,
+    db_list_backup_paths,
+    db_list_backups,
+    db_list_container_downtime,
+)
 from src.routes.impl.volumes.db import (
     db_create_sftp_backup_source,
     db_delete_sftp_backup_source,
     db_get_sftp_backup_source,
     db_list_sftp_backup_sources,
 )
-from src.routes.impl.volumes.resored_backups import db_list_restored_backups
-from src.routes.impl.volumes.volumes import list_volumes
+from src.routes.impl.volumes.resored_backups import db_get_restored_backup, db_list_restored_backups
+from src.routes.impl.volumes.uploads import db_list_backup_uploads
+from src.routes.impl.volumes.volumes import find_unavailable_volumes, list_volumes
+from src.sftp import get_sftp_pool
+from src.swap import swap_volumes
+from src.tar_index import normalize_path, read_archive_members, read_archive_ranges, unescape_path
 
 router = APIRouter(prefix="/api", tags=["api"])
 
@@ -48,6 +89,19 @@ def get_volumes() -> list[VolumeItem]:
     return list_volumes()
 
 
+@router.get(
+    "/progress",
+    description="Server sent events stream of the progress of running backups and restores",
+    response_class=StreamingResponse,
+)
+async def progress(request: Request) -> StreamingResponse:
+    return StreamingResponse(
+        progress_events(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
 @router.get(
     "/volumes/backup",
     description="Get a list of all backups",
@@ -76,24 +130,237 @@ def get_backup(backup_id: str, session: Session = Depends(get_session)) -> Backu
     return backup
 
 
+@router.get(
+    "/volumes/backup/{backup_id}/downtime",
+    description="How long each container was paused or stopped for a quiesced backup",
+    response_model=list[ContainerDowntime],
+)
+def get_backup_downtime(backup_id: str, session: Session = Depends(get_session)) -> list[ContainerDowntime]:
+    if not db_get_backup(session, backup_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Backup {backup_id} does not exist",
+        )
+    return db_list_container_downtime(session, backup_id)
+
+
+@router.get(
+    "/volumes/backup/{backup_id}/files",
+    description="List the files in a directory of a backup from its index, a page at a time",
+)
+def list_backup_files(
+    backup_id: str,
+    path: str = "",
+    prefix: str = "",
+    after: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+    session: Session = Depends(get_session),
+) -> BackupFilesPage:
+    backup = db_get_backup(session, backup_id)
+    if not backup:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Backup {backup_id} does not exist",
+        )
+    backup = db_get_archive_backup(session, backup)
+    if not db_has_backup_index(session, backup.backup_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Backup {backup_id} has no file index",
+        )
+
+    return db_list_backup_files(session, backup.backup_id, path, prefix, after, limit)
+
+
+@router.get(
+    "/volumes/backup/{backup_id}/diff",
+    description="Compare a backup with an older backup of the same volume using their file indexes",
+)
+def diff_backups(
+    backup_id: str,
+    base: str,
+    limit: Annotated[int, Query(ge=1, le=10000)] = 1000,
+    session: Session = Depends(get_session),
+) -> BackupDiff:
+    backups = {id: db_get_backup(session, id) for id in (base, backup_id)}
+    for id, backup in backups.items():
+        if not backup:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Backup {id} does not exist",
+            )
+        backups[id] = db_get_archive_backup(session, backup)
+        if not db_has_backup_index(session, backups[id].backup_id):
+            raise HTTPException(
+                status_code=404,
+                detail=f"Backup {id} has no file index",
+            )
+        if backup.backup_level:
+            # the index of an incremental backup only holds what changed since its parent
+            raise HTTPException(
+                status_code=409,
+                detail=f"Backup {id} is an incremental backup",
+            )
+    if backups[base].volume_name != backups[backup_id].volume_name:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Backups {base} and {backup_id} are of different volumes",
+        )
+
+    return db_diff_backups(session, backups[base], backups[backup_id], limit)
+
+
+def attachment_disposition(filename: str) -> str:
+    """
+    Content-Disposition of a download, filename is a plain ascii fallback and filename* the
+    real name (RFC 5987) so any name makes a valid latin-1 header
+    """
+    fallback = "".join(char if " " <= char <= "~" and char not in '"\\;' else "_" for char in filename)
+    encoded = quote(filename.encode("utf-8", "surrogateescape"), safe="")
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{encoded}"
+
+
+@router.get(
+    "/volumes/backup/{backup_id}/files/download",
+    description="Download a file, or a tar of a directory, from a backup without extracting all of it",
+    response_class=StreamingResponse,
+)
+def download_backup_files(
+    backup_id: str, path: str, session: Session = Depends(get_session)
+) -> StreamingResponse:
+    backup = db_get_backup(session, backup_id)
+    if not backup:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Backup {backup_id} does not exist",
+        )
+    backup = db_get_archive_backup(session, backup)
+    members = db_get_backup_members(session, backup.backup_id, path)
+    if not members:
+        raise HTTPException(
+            status_code=404,
+            detail=f"{path} is not in the index of backup {backup_id}",
+        )
+
+    codec = backup.codec or BackupCodec.GZIP
+    frames = db_get_backup_frames(session, backup.backup_id)
+    paths = db_list_backup_paths(session, backup)
+    # a path naming a file gets its contents, anything else a tar of what's under it
+    if (
+        len(members) == 1
+        and members[0].member_type == "file"
+        and members[0].path == unescape_path(normalize_path(path))
+    ):
+        member = members[0]
+        return StreamingResponse(
+            read_archive_ranges(
+                paths[member.part],
+                codec,
+                [frame for frame in frames if frame.part == member.part],
+                [(member.data_offset, member.data_offset + member.size)],
+            ),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": attachment_disposition(member.path.rsplit("/", 1)[-1])},
+        )
+    return StreamingResponse(
+        read_archive_members(paths, codec, frames, members),
+        media_type="application/x-tar",
+    )
+
+
+@router.post(
+    "/volumes/backup/{backup_id}/restore-path",
+    description="Restore a file or directory from a backup into a volume",
+)
+def restore_backup_path(
+    backup_id: str,
+    restore: RestoreBackupPath,
+    session: Session = Depends(get_session),
+) -> RestoreVolumeResponse:
+    backup = db_get_backup(session, backup_id)
+    if not backup:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Backup {backup_id} does not exist",
+        )
+    if not db_get_backup_members(session, db_get_archive_backup(session, backup).backup_id, restore.path):
+        raise HTTPException(
+            status_code=404,
+            detail=f"{restore.path} is not in the index of backup {backup_id}",
+        )
+
+    task = add_restore_path_job(
+        f"restore-{restore.volume_name}-{uuid.uuid4()!s}",
+        restore.volume_name,
+        backup_id,
+        restore.path,
+    )
+    logger.info(
+        "restore of %s from %s started task id: %s",
+        restore.path,
+        backup_id,
+        task.id,
+        extra={"task_id": task.id},
+    )
+    return RestoreVolumeResponse(
+        restore_id=task.id,
+        volume_name=restore.volume_name,
+    )
+
+
+@router.post(
+    "/volumes/backup",
+    description="Backup several volumes, they run in parallel up to the backup concurrency limits",
+)
+def backup_volumes(batch: BatchBackupRequest) -> list[CreateBackupResponse]:
+    volume_names = list(dict.fromkeys(batch.volume_names))
+    logger.info("backing up volumes: %s", volume_names)
+    missing, attached = find_unavailable_volumes(volume_names)
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Volumes {', '.join(missing)} do not exist",
+        )
+    # with a quiesce mode the containers are paused or stopped while the volumes are copied
+    if attached and (not batch.options or batch.options.quiesce == QuiesceMode.NONE):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Volumes {', '.join(attached)} are attached to a container",
+        )
+
+    backups = []
+    for volume_name in volume_names:
+        job = add_backup_job(f"backup-{volume_name}-{uuid.uuid4()!s}", volume_name, options=batch.options)
+        logger.info(
+            "backup %s started task id: %s",
+            volume_name,
+            job.id,
+            extra={"task_id": job.id},
+        )
+        backups.append(CreateBackupResponse(backup_id=job.id, volume_name=volume_name))
+
+    return backups
+
+
 @router.post(
     "/volumes/backup/{volume_name}",
     description="Backup a volume",
 )
-def backup_volume(volume_name: str) -> CreateBackupResponse:
+def backup_volume(volume_name: str, options: BackupOptions | None = None) -> CreateBackupResponse:
     logger.info("backing up volume: %s", volume_name)
     if not get_volume(volume_name):
         raise HTTPException(
             status_code=404,
             detail=f"Volume {volume_name} does not exist",
         )
-    if not is_volume_attached(volume_name):
+    quiesce = options.quiesce if options else QuiesceMode.NONE
+    if not is_volume_attached(volume_name) and quiesce == QuiesceMode.NONE:
         raise HTTPException(
             status_code=409,
             detail=f"Volume {volume_name} is attached to a container",
         )
 
-    job = add_backup_job(f"backup-{volume_name}-{uuid.uuid4()!s}", volume_name)
+    job = add_backup_job(f"backup-{volume_name}-{uuid.uuid4()!s}", volume_name, options=options)
     logger.info(
         "backup %s started task id: %s",
         volume_name,
@@ -121,6 +388,8 @@ def restore_volume(restore_volume: RestoreVolume) -> RestoreVolumeResponse:
         f"restore-{restore_volume.volume_name}-{uuid.uuid4()!s}",
         restore_volume.volume_name,
         restore_volume.backup_filename,
+        swap=restore_volume.swap,
+        source_id=restore_volume.source_id,
     )
     logger.info(
         "restore of %s started task id: %s",
@@ -134,6 +403,113 @@ def restore_volume(restore_volume: RestoreVolume) -> RestoreVolumeResponse:
     )
 
 
+@router.post(
+    "/volumes/restore/{restore_id}/rollback",
+    description="Swap the files replaced by a swap restore back into the volume, again redoes the restore",
+)
+def rollback_restore(restore_id: str, session: Session = Depends(get_session)) -> RestoredBackups:
+    restore = db_get_restored_backup(session, restore_id)
+    if not restore:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Restore {restore_id} does not exist",
+        )
+    if not restore.rollback_volume:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Restore {restore_id} wasn't a swap restore",
+        )
+    if not get_volume(restore.rollback_volume):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Rollback volume {restore.rollback_volume} of restore {restore_id} does not exist",
+        )
+    logger.info("rolling back restore %s of %s", restore_id, restore.volume_name)
+    swap_volumes(restore.volume_name, restore.rollback_volume)
+    return restore
+
+
+@router.get(
+    "/volumes/backup/{backup_id}/uploads",
+    description="Uploads of the archives of a backup to sftp backup sources",
+    response_model=list[BackupUploads],
+)
+def list_backup_uploads(backup_id: str, session: Session = Depends(get_session)) -> list[BackupUploads]:
+    backup = db_get_backup(session, backup_id)
+    if not backup:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Backup {backup_id} does not exist",
+        )
+    return db_list_backup_uploads(session, db_get_archive_backup(session, backup).backup_id)
+
+
+@router.post(
+    "/volumes/backup/{backup_id}/upload/{source_id}",
+    description="Upload a backup to a sftp backup source, an earlier upload that failed is resumed",
+)
+def upload_backup(
+    backup_id: str, source_id: str, session: Session = Depends(get_session)
+) -> UploadBackupResponse:
+    backup = db_get_backup(session, backup_id)
+    if not backup:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Backup {backup_id} does not exist",
+        )
+    if not db_get_sftp_backup_source(session, source_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Backup source {source_id} does not exist",
+        )
+    if backup.storage_format == BackupStorageFormat.Repository:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Backup {backup_id} is stored in the repository, only archives can be uploaded",
+        )
+    if backup.status != BackUpStatus.Processed:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Backup {backup_id} isn't processed, only finished backups can be uploaded",
+        )
+    job = add_upload_job(f"upload-{uuid.uuid4()!s}", backup_id, source_id)
+    logger.info("upload of %s to %s started task id: %s", backup_id, source_id, job.id)
+    return UploadBackupResponse(upload_id=job.id)
+
+
+@router.post(
+    "/volumes/verify",
+    description="Re-hash backups in the background and check them against their stored checksums",
+)
+def verify_backups(verify: VerifyBackups | None = None) -> VerifyBackupsResponse:
+    backup_ids = verify.backup_ids if verify else None
+    job = add_verify_job(f"verify-{uuid.uuid4()!s}", backup_ids)
+    logger.info("verify of %s started task id: %s", backup_ids or "all backups", job.id)
+    return VerifyBackupsResponse(verify_id=job.id)
+
+
+@router.post(
+    "/volumes/verify/uploads",
+    description="Check the copies on the sftp backup sources against the local archives in place",
+)
+def verify_uploads(verify: VerifyUploads | None = None) -> VerifyBackupsResponse:
+    verify = verify or VerifyUploads()
+    job = add_verify_uploads_job(f"verify-uploads-{uuid.uuid4()!s}", verify.backup_ids, verify.source_ids)
+    logger.info(
+        "verify of the uploads of %s started task id: %s", verify.backup_ids or "all backups", job.id
+    )
+    return VerifyBackupsResponse(verify_id=job.id)
+
+
+@router.get(
+    "/helper/images",
+    description="Get the helper images, the digest they're pinned to and whether they've been pulled",
+)
+def api_list_helper_images() -> list[HelperImageStatus]:
+    helper_images = get_helper_images()
+    return helper_images.status() if helper_images else []
+
+
 @router.get(
     "/volumes/restores",
     description="Get a list of all volumes that have been restored from a backup",
@@ -206,6 +582,7 @@ async def create_backup_schedule(schedule: CreateBackupSchedule) -> BackupSchedu
             schedule.volume_name,
             schedule.crontab,
             is_schedule=True,
+            options=schedule.options,
         )
 
     except ConflictingIdError as e:
@@ -221,6 +598,7 @@ async def create_backup_schedule(schedule: CreateBackupSchedule) -> BackupSchedu
         schedule_name=schedule.schedule_name,
         volume_name=schedule.volume_name,
         crontab=schedule.crontab,
+        options=schedule.options,
     )
 
 
@@ -261,10 +639,15 @@ def delete_backup_source(
     source_id: str,
     session: Session = Depends(get_session),
 ) -> str:
-    if not db_get_sftp_backup_source(session, source_id):
+    source = db_get_sftp_backup_source(session, source_id)
+    if not source:
         raise HTTPException(
             status_code=404,
             detail=f"Backup source {source_id} does not exist",
         )
+    sftp_pool = get_sftp_pool()
+    if sftp_pool:
+        # the pooled connection would otherwise stay open until it's idle
+        sftp_pool.close(str(source.id))
     db_delete_sftp_backup_source(session, source_id)
     return f"Backup source {source_id} deleted"
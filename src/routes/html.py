@@ -7,15 +7,25 @@ from apscheduler.jobstores.base import ConflictingIdError, JobLookupError
 from fastapi import APIRouter, Depends, Form, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from pydantic import ValidationError
 from sqlmodel import Session
 
 from src.apschedule import schedule
 from src.db import get_session
 from src.docker import get_volume, is_volume_attached
-from src.models import BackUpStatus, CreateBackupSchedule, RestoreVolumeHtmlRequest
-from src.routes.impl.volumes.backups import db_list_backups
+from src.models import (
+    BackupCodec,
+    BackupOptions,
+    BackUpStatus,
+    CreateBackupSchedule,
+    HelperLimits,
+    RestoreVolumeHtmlRequest,
+)
+from src.routes.impl.volumes.backup_index import db_has_backup_index, db_list_backup_files
+from src.routes.impl.volumes.backups import db_get_archive_backup, db_get_backup, db_list_backups
+from src.routes.impl.volumes.db import db_list_sftp_backup_sources
 from src.routes.impl.volumes.resored_backups import db_list_restored_backups
-from src.routes.impl.volumes.volumes import list_volumes
+from src.routes.impl.volumes.volumes import find_unavailable_volumes, list_volumes
 
 router = APIRouter(tags=["html"])
 
@@ -23,6 +33,9 @@ templates = Jinja2Templates(directory="src/templates")
 
 logger = logging.getLogger(__name__)
 
+# entries loaded at a time when browsing a backup
+BROWSE_PAGE_SIZE = 100
+
 
 @router.get("/", description="home page", response_class=HTMLResponse)
 def root(request: Request) -> HTMLResponse:
@@ -58,6 +71,45 @@ def backup_volumes_tab(request: Request) -> HTMLResponse:
     )
 
 
+@router.post(
+    "/volumes/backup",
+    description="create backups of the selected volumes",
+    response_class=HTMLResponse,
+)
+def backup_volumes(request: Request, volume_names: Annotated[list[str], Form()]) -> HTMLResponse:
+    volume_names = list(dict.fromkeys(volume_names))
+    logger.info("backing up volumes: %s", volume_names)
+    missing, attached = find_unavailable_volumes(volume_names)
+    if missing or attached:
+        message = (
+            f"Volumes {', '.join(missing)} do not exist"
+            if missing
+            else f"Volumes {', '.join(attached)} are attached to a container"
+        )
+        return templates.TemplateResponse(
+            request,
+            "notification.html",
+            {"message": message, "swap_out_of_band": False},
+        )
+
+    for volume_name in volume_names:
+        job = schedule.add_backup_job(f"backup-{volume_name}-{uuid.uuid4()!s}", volume_name)
+        logger.info(
+            "backup %s started task id: %s",
+            volume_name,
+            job.id,
+            extra={"task_id": job.id},
+        )
+    return templates.TemplateResponse(
+        request,
+        "notification.html",
+        {
+            "message": f"{len(volume_names)} backups created",
+            "swap_out_of_band": False,
+        },
+    )
+
+
 @router.post(
     "/volumes/backup/{volume_name}",
     description="create backup",
@@ -138,13 +190,17 @@ def backup_schedules(request: Request) -> HTMLResponse:
     description="create backup schedule",
     response_class=HTMLResponse,
 )
-def create_backup_schedule_form(request: Request, volume_name: str) -> HTMLResponse:
+def create_backup_schedule_form(
+    request: Request,
+    volume_name: str,
+    session: Session = Depends(get_session),
+) -> HTMLResponse:
     if request.headers.get("HX-Target") == "create-schedule-window":
         return ""
     return templates.TemplateResponse(
         request,
         "tabs/backup_volumes/components/create_backup_schedule.html",
-        {"volume_name": volume_name},
+        {"volume_name": volume_name, "backup_sources": db_list_sftp_backup_sources(session)},
     )
 
 
@@ -163,7 +219,41 @@ async def create_backup_schedule(
     day: Annotated[str, Form()],
     month: Annotated[str, Form()],
     day_of_week: Annotated[str, Form()],
+    incremental: Annotated[bool, Form()] = False,
+    skip_unchanged: Annotated[bool, Form()] = False,
+    codec: Annotated[BackupCodec, Form()] = BackupCodec.GZIP,
+    codec_level: Annotated[int | None, Form()] = None,
+    cpus: Annotated[float | None, Form()] = None,
+    memory: Annotated[str | None, Form()] = None,
+    ionice_class: Annotated[int | None, Form()] = None,
+    include: Annotated[str, Form()] = "",
+    exclude: Annotated[str, Form()] = "",
+    upload_to: Annotated[list[str], Form()] = [],  # noqa: B006
 ) -> HTMLResponse:
+    try:
+        limits = {
+            name: value
+            for name, value in {"cpus": cpus, "memory": memory, "ionice_class": ionice_class}.items()
+            if value
+        }
+        options = BackupOptions(
+            incremental=incremental,
+            skip_unchanged=skip_unchanged,
+            codec=codec,
+            codec_level=codec_level,
+            limits=HelperLimits(**limits) if limits else None,
+            # comma separated in the form
+            include=[pattern.strip() for pattern in include.split(",") if pattern.strip()],
+            exclude=[pattern.strip() for pattern in exclude.split(",") if pattern.strip()],
+            upload_to=upload_to,
+        )
+    except ValidationError as e:
+        return templates.TemplateResponse(
+            request,
+            "notification.html",
+            {"message": e.errors()[0]["msg"]},
+        )
+
     new_schedule = CreateBackupSchedule(
         schedule_name=schedule_name,
         volume_name=volume_name,
@@ -175,6 +265,7 @@ async def create_backup_schedule(
             "month": month,
             "day_of_week": day_of_week,
         },
+        options=options,
     )
 
     logger.info("create_backup_schedule: %s", new_schedule)
@@ -192,6 +283,7 @@ async def create_backup_schedule(
             new_schedule.volume_name,
             new_schedule.crontab,
             is_schedule=True,
+            options=new_schedule.options,
         )
         logger.info("create_backup_schedule: job_id: %s", job.id)
 
@@ -296,3 +388,33 @@ def restores(request: Request, session: Session = Depends(get_session)) -> HTMLR
         "tabs/restore_volumes/components/restore_rows.html",
         {"restored_backups": restores},
     )
+
+
+@router.get(
+    "/volumes/backup/{backup_id}/files",
+    description="files in a directory of a backup",
+    response_class=HTMLResponse,
+)
+def backup_files(
+    request: Request,
+    backup_id: str,
+    path: str = "",
+    after: str | None = None,
+    session: Session = Depends(get_session),
+) -> HTMLResponse:
+    backup = db_get_backup(session, backup_id)
+    # unchanged backups are browsed in the index of the backup holding their archive
+    index_id = db_get_archive_backup(session, backup).backup_id if backup else backup_id
+    if not db_has_backup_index(session, index_id):
+        return templates.TemplateResponse(
+            request,
+            "tabs/restore_volumes/components/backup_files.html",
+            {"backup_id": backup_id, "page": None, "message": "This backup has no file index"},
+        )
+
+    page = db_list_backup_files(session, index_id, path, after=after, limit=BROWSE_PAGE_SIZE)
+    return templates.TemplateResponse(
+        request,
+        "tabs/restore_volumes/components/backup_files.html",
+        {"backup_id": backup_id, "page": page},
+    )
@@ -0,0 +1,242 @@
+from sqlalchemy import and_, case, literal, union_all
+from sqlalchemy.orm import aliased
+from sqlmodel import Session, func, insert, or_, select
+
+from src.models import (
+    BackupDiff,
+    BackupDiffEntry,
+    BackupFileEntry,
+    BackupFilesPage,
+    BackupFrames,
+    BackupMembers,
+    Backups,
+)
+from src.tar_index import ArchiveFrame, ArchiveMember, escape_path, normalize_path, unescape_path
+
+
+def db_add_backup_index(
+    session: Session,
+    backup_id: str,
+    members: list[ArchiveMember],
+    frames: list[ArchiveFrame],
+) -> None:
+    # a path can be in a tar stream more than once, the last one is what tar extracts
+    rows = {
+        member.path: {
+            "backup_id": backup_id,
+            "path": escape_path(member.path),
+            "member_type": member.member_type,
+            "size": member.size,
+            "mtime": member.mtime,
+            "offset": member.offset,
+            "data_offset": member.data_offset,
+            "part": member.part,
+        }
+        for member in members
+    }
+    if rows:
+        session.exec(insert(BackupMembers), params=list(rows.values()))
+    if frames:
+        session.exec(
+            insert(BackupFrames),
+            params=[
+                {
+                    "backup_id": backup_id,
+                    "frame": index,
+                    "source_offset": frame.source_offset,
+                    "offset": frame.offset,
+                    "size": frame.size,
+                    "part": frame.part,
+                }
+                for index, frame in enumerate(frames)
+            ],
+        )
+
+
+def db_has_backup_index(session: Session, backup_id: str) -> bool:
+    query = select(BackupMembers.path).where(BackupMembers.backup_id == backup_id).limit(1)
+    return session.exec(query).first() is not None
+
+
+def db_get_backup_members(session: Session, backup_id: str, path: str) -> list[ArchiveMember]:
+    """
+    the member at path and everything under it, in the order they are in the archive. path is in
+    the escaped form the index and api use, the members get their real names
+    """
+    path = normalize_path(path)
+    query = select(BackupMembers).where(BackupMembers.backup_id == backup_id)
+    if path:
+        query = query.where(
+            or_(
+                BackupMembers.path == path,
+                BackupMembers.path.startswith(f"{path}/", autoescape=True),
+            )
+        )
+    return [
+        ArchiveMember(
+            path=unescape_path(member.path),
+            member_type=member.member_type,
+            size=member.size,
+            mtime=member.mtime,
+            offset=member.offset,
+            data_offset=member.data_offset,
+            part=member.part,
+        )
+        for member in session.exec(query.order_by(BackupMembers.part, BackupMembers.offset)).all()
+    ]
+
+
+def db_list_backup_files(
+    session: Session,
+    backup_id: str,
+    path: str = "",
+    prefix: str = "",
+    after: str | None = None,
+    limit: int = 100,
+) -> BackupFilesPage:
+    """
+    a page of the entries directly in a directory of a backup, ordered by name. Directories are
+    summed from the members under them so they show up even when the archive has no entry for
+    them. Pages are keyed on the name of the last entry
+    """
+    path = normalize_path(path)
+    base = f"{path}/" if path else ""
+    # the part of the path below the directory and the name of the entry it's under
+    rest = func.substr(BackupMembers.path, len(base) + 1)
+    slash = func.instr(rest, "/")
+    name = case((slash > 0, func.substr(rest, 1, slash - 1)), else_=rest).label("name")
+    is_entry = rest == name
+    is_file = BackupMembers.member_type == "file"
+
+    # range on the primary key instead of a like so the index is used
+    start = f"{base}{prefix}"
+    if after is not None and f"{base}{after}" > start:
+        start = f"{base}{after}"
+    query = (
+        select(
+            name,
+            func.max(case((is_entry, BackupMembers.member_type))).label("member_type"),
+            func.sum(case((is_file, 1), else_=0)).label("file_count"),
+            func.sum(case((is_file, BackupMembers.size), else_=0)).label("size"),
+            func.max(case((is_entry, BackupMembers.mtime))).label("mtime"),
+        )
+        .where(BackupMembers.backup_id == backup_id)
+        .where(BackupMembers.path >= start)
+        .where(BackupMembers.path < f"{base}{prefix}\U0010ffff")
+        .group_by(name)
+        .order_by(name)
+        # one more than the page to know if there's a next one
+        .limit(limit + 1)
+    )
+    if after is not None:
+        query = query.having(name > literal(after))
+
+    entries = [
+        BackupFileEntry(
+            name=row.name,
+            path=f"{base}{row.name}",
+            member_type=row.member_type or "dir",
+            file_count=row.file_count,
+            size=row.size,
+            mtime=row.mtime,
+        )
+        for row in session.exec(query).all()
+    ]
+    return BackupFilesPage(
+        path=path,
+        entries=entries[:limit],
+        next_after=entries[limit - 1].name if len(entries) > limit else None,
+    )
+
+
+def db_diff_backups(session: Session, base: Backups, backup: Backups, limit: int = 1000) -> BackupDiff:
+    """
+    paths added, removed or modified between two indexed backups, compared on the type, size and
+    mtime stored in the index. Directories only count as modified when their type changes as
+    their mtime changes with anything added to them
+    """
+    old, new = aliased(BackupMembers), aliased(BackupMembers)
+    modified = or_(
+        old.member_type != new.member_type,
+        old.size != new.size,
+        and_(new.member_type != "dir", old.mtime != new.mtime),
+    )
+    # both indexes are walked in path order on their primary key and joined on it
+    removed_or_modified = (
+        select(
+            old.path.label("path"),
+            case((new.path.is_(None), "removed"), else_="modified").label("change"),
+            func.coalesce(new.member_type, old.member_type).label("member_type"),
+            old.size.label("old_size"),
+            new.size.label("new_size"),
+            (func.coalesce(new.size, 0) - old.size).label("size_delta"),
+        )
+        .outerjoin(new, and_(new.backup_id == backup.backup_id, new.path == old.path))
+        .where(old.backup_id == base.backup_id)
+        .where(or_(new.path.is_(None), modified))
+    )
+    added = (
+        select(
+            new.path.label("path"),
+            literal("added").label("change"),
+            new.member_type.label("member_type"),
+            literal(None).label("old_size"),
+            new.size.label("new_size"),
+            new.size.label("size_delta"),
+        )
+        .outerjoin(old, and_(old.backup_id == base.backup_id, old.path == new.path))
+        .where(new.backup_id == backup.backup_id)
+        .where(old.path.is_(None))
+    )
+    changes = union_all(removed_or_modified, added).subquery()
+
+    totals = session.exec(
+        select(
+            func.sum(case((changes.c.change == "added", 1), else_=0)),
+            func.sum(case((changes.c.change == "removed", 1), else_=0)),
+            func.sum(case((changes.c.change == "modified", 1), else_=0)),
+            func.sum(changes.c.size_delta),
+        )
+    ).one()
+    rows = session.exec(
+        select(
+            changes.c.path,
+            changes.c.change,
+            changes.c.member_type,
+            changes.c.old_size,
+            changes.c.new_size,
+            changes.c.size_delta,
+        )
+        .order_by(func.abs(changes.c.size_delta).desc(), changes.c.path)
+        .limit(limit)
+    ).all()
+    return BackupDiff(
+        volume_name=backup.volume_name,
+        base_backup_id=base.backup_id,
+        backup_id=backup.backup_id,
+        added=totals[0] or 0,
+        removed=totals[1] or 0,
+        modified=totals[2] or 0,
+        size_delta=totals[3] or 0,
+        entries=[
+            BackupDiffEntry(
+                path=row.path,
+                change=row.change,
+                member_type=row.member_type,
+                old_size=row.old_size,
+                new_size=row.new_size,
+                size_delta=row.size_delta,
+            )
+            for row in rows
+        ],
+    )
+
+
+def db_get_backup_frames(session: Session, backup_id: str) -> list[ArchiveFrame]:
+    query = select(BackupFrames).where(BackupFrames.backup_id == backup_id).order_by(BackupFrames.frame)
+    return [
+        ArchiveFrame(
+            source_offset=frame.source_offset, offset=frame.offset, size=frame.size, part=frame.part
+        )
+        for frame in session.exec(query).all()
+    ]
@@ -1,6 +1,8 @@
+from pathlib import Path
+
 from sqlmodel import Session, or_, select
 
-from src.models import Backups, BackUpStatus
+from src.models import BackupFilenames, Backups, BackUpStatus, BackupStorageFormat, ContainerDowntime
 
 
 def db_list_backups(
@@ -22,3 +24,87 @@ def db_list_backups(
 
 def db_get_backup(session: Session, backup_id: str) -> Backups | None:
     return session.exec(select(Backups).where(Backups.backup_id == backup_id)).first()
+
+
+def db_get_archive_backup(session: Session, backup: Backups) -> Backups:
+    """
+    the backup holding the archive of a backup, itself unless it was recorded as unchanged
+    """
+    if not backup.unchanged_backup_id:
+        return backup
+    archive_backup = db_get_backup(session, backup.unchanged_backup_id)
+    if not archive_backup:
+        msg = f"Backup {backup.unchanged_backup_id} of unchanged backup {backup.backup_id} does not exist"
+        raise ValueError(msg)
+    return archive_backup
+
+
+def db_get_backup_by_filename(session: Session, backup_filename: str) -> Backups | None:
+    return session.exec(select(Backups).where(Backups.backup_filename == backup_filename)).first()
+
+
+def db_get_latest_incremental_backup(session: Session, volume_name: str) -> Backups | None:
+    query = (
+        select(Backups)
+        .where(Backups.volume_name == volume_name)
+        .where(Backups.status == BackUpStatus.Processed)
+        .where(Backups.backup_level.is_not(None))
+        .order_by(Backups.created_at.desc())
+    )
+    return session.exec(query).first()
+
+
+def db_get_latest_backup(
+    session: Session,
+    volume_name: str,
+    storage_format: BackupStorageFormat,
+) -> Backups | None:
+    query = (
+        select(Backups)
+        .where(Backups.volume_name == volume_name)
+        .where(Backups.status == BackUpStatus.Processed)
+        .where(Backups.storage_format == storage_format)
+        .order_by(Backups.created_at.desc())
+    )
+    return session.exec(query).first()
+
+
+def db_get_backup_chain(session: Session, backup: Backups) -> list[Backups]:
+    """
+    get the backups needed to restore an incremental backup, starting with the full backup
+    """
+    chain = [backup]
+    while chain[-1].parent_backup_id:
+        parent = db_get_backup(session, chain[-1].parent_backup_id)
+        if not parent:
+            msg = f"Backup {chain[-1].parent_backup_id} in the chain of {backup.backup_id} does not exist"
+            raise ValueError(msg)
+        chain.append(parent)
+    return list(reversed(chain))
+
+
+def db_list_backup_parts(session: Session, backup_id: str) -> list[BackupFilenames]:
+    """
+    the parts of a backup split into parts in order, empty for other backups
+    """
+    query = (
+        select(BackupFilenames)
+        .where(BackupFilenames.backup_id == backup_id, BackupFilenames.part.is_not(None))
+        .order_by(BackupFilenames.part)
+    )
+    return list(session.exec(query).all())
+
+
+def db_list_backup_paths(session: Session, backup: Backups) -> list[str]:
+    """
+    paths of the archives of a backup, one per part
+    """
+    parts = db_list_backup_parts(session, backup.backup_id)
+    if not parts:
+        return [backup.backup_path]
+    return [str(Path(backup.backup_path).with_name(part.backup_filename)) for part in parts]
+
+
+def db_list_container_downtime(session: Session, backup_id: str) -> list[ContainerDowntime]:
+    query = select(ContainerDowntime).where(ContainerDowntime.backup_id == backup_id)
+    return list(session.exec(query).all())
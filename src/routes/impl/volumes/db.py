@@ -1,3 +1,5 @@
+import uuid
+
 from sqlmodel import Session, select
 
 from src.models import SftpBackupSource, SftpBackupSourceCreate
@@ -21,7 +23,12 @@ def db_delete_sftp_backup_source(session: Session, id: str) -> None:
 
 
 def db_get_sftp_backup_source(session: Session, id: str) -> SftpBackupSource | None:
-    return session.get(SftpBackupSource, id)
+    try:
+        source_id = uuid.UUID(str(id))
+    except ValueError:
+        # ids given to the api or in backup options that aren't a uuid don't exist
+        return None
+    return session.get(SftpBackupSource, source_id)
 
 
 def db_list_sftp_backup_sources(session: Session) -> list[SftpBackupSource]:
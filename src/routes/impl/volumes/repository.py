@@ -0,0 +1,16 @@
+from sqlalchemy.dialects.sqlite import insert
+from sqlmodel import Session
+
+from src.models import RepositoryChunks
+
+
+def db_get_repository_chunk(session: Session, chunk_hash: str) -> RepositoryChunks | None:
+    return session.get(RepositoryChunks, chunk_hash)
+
+
+def db_add_repository_chunks(session: Session, chunks: list[RepositoryChunks]) -> None:
+    # a concurrent backup can index the same chunk first, the row it wrote is just as good
+    session.exec(
+        insert(RepositoryChunks).on_conflict_do_nothing(index_elements=["chunk_hash"]),
+        params=[chunk.model_dump() for chunk in chunks],
+    )
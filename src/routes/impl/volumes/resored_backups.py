@@ -31,3 +31,7 @@ def db_list_restored_backups(
     if where_clauses:
         query = query.where(*where_clauses)
     return session.exec(query).all()
+
+
+def db_get_restored_backup(session: Session, restore_id: str) -> RestoredBackups | None:
+    return session.exec(select(RestoredBackups).where(RestoredBackups.restore_id == restore_id)).first()
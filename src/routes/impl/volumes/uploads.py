@@ -0,0 +1,38 @@
+from sqlmodel import Session, select
+
+from src.models import BackupUploads, UploadStatus
+
+
+def db_list_backup_uploads(session: Session, backup_id: str) -> list[BackupUploads]:
+    query = (
+        select(BackupUploads)
+        .where(BackupUploads.backup_id == backup_id)
+        .order_by(BackupUploads.source_id, BackupUploads.backup_filename)
+    )
+    return list(session.exec(query).all())
+
+
+def db_get_backup_upload(
+    session: Session, backup_id: str, source_id: str, backup_filename: str
+) -> BackupUploads | None:
+    return session.get(BackupUploads, (backup_id, source_id, backup_filename))
+
+
+def db_list_uploaded_archives(
+    session: Session,
+    backup_ids: list[str] | None = None,
+    source_ids: list[str] | None = None,
+) -> list[BackupUploads]:
+    """
+    the archives that were uploaded completely, ordered by backup source
+    """
+    query = select(BackupUploads).where(BackupUploads.status == UploadStatus.Uploaded)
+    if backup_ids:
+        query = query.where(BackupUploads.backup_id.in_(backup_ids))
+    if source_ids:
+        query = query.where(BackupUploads.source_id.in_(source_ids))
+    return list(
+        session.exec(
+            query.order_by(BackupUploads.source_id, BackupUploads.backup_id, BackupUploads.backup_filename)
+        ).all()
+    )
@@ -1,4 +1,4 @@
-from src.docker import get_volumes
+from src.docker import get_volume, get_volumes, is_volume_attached
 from src.models import VolumeItem
 
 
@@ -15,3 +15,17 @@ def list_volumes() -> list[VolumeItem]:
         }
         for volume in volumes
     ]
+
+
+def find_unavailable_volumes(volume_names: list[str]) -> tuple[list[str], list[str]]:
+    """
+    volumes that can't be backed up, returns the ones that don't exist and the ones attached to
+    a container
+    """
+    missing = [volume_name for volume_name in volume_names if not get_volume(volume_name)]
+    attached = [
+        volume_name
+        for volume_name in volume_names
+        if volume_name not in missing and not is_volume_attached(volume_name)
+    ]
+    return missing, attached
@@ -0,0 +1,882 @@
+import io
+import logging
+import os
+import posixpath
+import re
+import secrets
+import shlex
+import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager, suppress
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Any
+
+from src.models import SftpBackupSource, SshKeyTypes, UploadVerifyMethod
+from src.parts import run_concurrently
+from src.progress import expect_progress, report_progress
+
+logger = logging.getLogger(__name__)
+
+# concurrent sftp write streams per uploaded file, each on its own sftp channel
+SFTP_UPLOAD_STREAMS = int(os.getenv("SFTP_UPLOAD_STREAMS", "4"))
+# MiB a stream writes before the remote confirms it, an interrupted upload resumes at a chunk
+SFTP_UPLOAD_CHUNK_SIZE = int(os.getenv("SFTP_UPLOAD_CHUNK_SIZE", "32")) * 1024 * 1024
+# known_hosts file the host keys of the backup sources are checked against
+SFTP_KNOWN_HOSTS = os.getenv("SFTP_KNOWN_HOSTS", str(Path.home() / ".ssh" / "known_hosts"))
+# connect to backup sources that aren't in the known_hosts file without checking their key
+SFTP_TRUST_UNKNOWN_HOSTS = os.getenv("SFTP_TRUST_UNKNOWN_HOSTS", "false").lower() == "true"
+# times an upload reconnects and resumes after its connection dropped, and seconds in between
+SFTP_UPLOAD_RETRIES = int(os.getenv("SFTP_UPLOAD_RETRIES", "3"))
+SFTP_UPLOAD_RETRY_DELAY = int(os.getenv("SFTP_UPLOAD_RETRY_DELAY", "30"))
+# seconds between keepalives sent on the ssh connections, so firewalls and the remote keep them open
+SFTP_KEEPALIVE_INTERVAL = int(os.getenv("SFTP_KEEPALIVE_INTERVAL", "30"))
+# seconds a pooled connection to a backup source stays open after it was last used
+SFTP_POOL_IDLE_TIMEOUT = int(os.getenv("SFTP_POOL_IDLE_TIMEOUT", "300"))
+# max sftp channels open at once on a host, openssh allows 10 sessions per connection by default
+SFTP_MAX_CHANNELS = int(os.getenv("SFTP_MAX_CHANNELS", "8"))
+# MiB of an archive queued for a backup source it's teed to while the backup writes it, and
+# seconds a backup waits for a source with a full queue before it continues without it
+SFTP_TEE_BUFFER = int(os.getenv("SFTP_TEE_BUFFER", "64")) * 1024 * 1024
+SFTP_TEE_STALL_TIMEOUT = int(os.getenv("SFTP_TEE_STALL_TIMEOUT", "60"))
+# concurrent range reads of an archive restored from a backup source, the MiB each reads at a
+# time and the MiB read ahead of the extraction
+SFTP_RESTORE_STREAMS = int(os.getenv("SFTP_RESTORE_STREAMS", "4"))
+SFTP_RESTORE_CHUNK_SIZE = int(os.getenv("SFTP_RESTORE_CHUNK_SIZE", "8")) * 1024 * 1024
+SFTP_RESTORE_READ_AHEAD = int(os.getenv("SFTP_RESTORE_READ_AHEAD", "64")) * 1024 * 1024
+# ranges of an uploaded archive read and compared with the local archive when the server doesn't
+# hash it, and the KiB of each
+SFTP_VERIFY_SAMPLES = int(os.getenv("SFTP_VERIFY_SAMPLES", "16"))
+SFTP_VERIFY_SAMPLE_SIZE = int(os.getenv("SFTP_VERIFY_SAMPLE_SIZE", "1024")) * 1024
+# commands tried to hash an uploaded archive on the server
+REMOTE_HASH_COMMANDS = ["sha256sum", "shasum -a 256", "sha256 -r"]
+# seconds a command run on a backup source gets, e.g. to hash an uploaded archive, before the
+# archive is verified by sampling instead
+SFTP_COMMAND_TIMEOUT = int(os.getenv("SFTP_COMMAND_TIMEOUT", "600"))
+# seconds between checks of the pooled connections for idle and dropped ones
+SFTP_POOL_CHECK_INTERVAL = 30
+SFTP_CONNECT_TIMEOUT = 30
+# biggest write a single sftp request carries
+SFTP_WRITE_SIZE = 32 * 1024
+PARTIAL_SUFFIX = ".partial"
+
+KEY_CLASSES = {
+    SshKeyTypes.RSA: "RSAKey",
+    SshKeyTypes.ED25519: "Ed25519Key",
+    SshKeyTypes.ECDSA: "ECDSAKey",
+    SshKeyTypes.DSA: "DSSKey",
+}
+
+
+def _import_paramiko():  # noqa: ANN202
+    try:
+        import paramiko
+    except ImportError as e:
+        raise RuntimeError("sftp backup sources need the paramiko package installed") from e
+    return paramiko
+
+
+def _connection_errors() -> tuple[type[Exception], ...]:
+    """
+    errors of a dropped or refused connection, which are worth retrying
+    """
+    try:
+        import paramiko
+    except ImportError:
+        return (OSError, EOFError)
+    return (OSError, EOFError, paramiko.SSHException)
+
+
+def load_private_key(key_type: SshKeyTypes, key: str) -> Any:  # noqa: ANN401
+    paramiko = _import_paramiko()
+    key_class = getattr(paramiko, KEY_CLASSES[key_type], None)
+    if not key_class:
+        msg = f"ssh keys of type {key_type.value} aren't supported by the installed paramiko"
+        raise RuntimeError(msg)
+    return key_class.from_private_key(io.StringIO(key))
+
+
+def known_host_key(hostname: str, port: int) -> Any | None:  # noqa: ANN401
+    """
+    the key of a host in the known_hosts file, None when it's not in it
+    """
+    paramiko = _import_paramiko()
+    if not Path(SFTP_KNOWN_HOSTS).exists():
+        return None
+    host_keys = paramiko.HostKeys(SFTP_KNOWN_HOSTS)
+    keys = host_keys.lookup(hostname if port == 22 else f"[{hostname}]:{port}")  # noqa: PLR2004
+    return next(iter(keys.values()), None) if keys else None
+
+
+class SftpConnection:
+    """
+    authenticated ssh connection to a backup source, every sftp session opened on it is its own
+    channel so transfers in different sessions run concurrently. channels caps the sessions open
+    at once, it's shared by the connections to a host
+    """
+
+    def __init__(self, transport: Any, channels: threading.Semaphore | None = None) -> None:  # noqa: ANN401
+        self.transport = transport
+        self.channels = channels or threading.BoundedSemaphore(SFTP_MAX_CHANNELS)
+
+    def open_sftp(self) -> Any:  # noqa: ANN401
+        return _import_paramiko().SFTPClient.from_transport(self.transport)
+
+    @contextmanager
+    def sftp(self) -> Iterator[Any]:
+        """
+        a sftp session on a channel of its own, waits while the host has max channels open
+        """
+        with self.channels:
+            sftp = self.open_sftp()
+            try:
+                yield sftp
+            finally:
+                sftp.close()
+
+    def run(self, command: str, timeout: float = SFTP_COMMAND_TIMEOUT) -> tuple[int, bytes]:
+        """
+        run a command on the remote, returns its exit status and output. Raises TimeoutError when
+        it doesn't finish in timeout seconds
+        """
+        with self.channels:
+            channel = self.transport.open_session()
+            try:
+                channel.settimeout(timeout)
+                channel.exec_command(command)
+                # nothing is sent to the command, what the server runs instead of it (an sftp
+                # server for ForceCommand internal-sftp) ends on the eof rather than wait for input
+                channel.shutdown_write()
+                output = channel.makefile("rb").read()
+                if not channel.status_event.wait(timeout):
+                    msg = f"{command} didn't exit in {timeout}s"
+                    raise TimeoutError(msg)
+                return channel.recv_exit_status(), output
+            finally:
+                channel.close()
+
+    def is_active(self) -> bool:
+        return self.transport.is_active()
+
+    def close(self) -> None:
+        self.transport.close()
+
+    def __enter__(self) -> "SftpConnection":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+def connect(source: SftpBackupSource, channels: threading.Semaphore | None = None) -> SftpConnection:
+    paramiko = _import_paramiko()
+    host_key = known_host_key(source.hostname, source.port)
+    if not host_key and not SFTP_TRUST_UNKNOWN_HOSTS:
+        msg = f"{source.hostname} isn't in {SFTP_KNOWN_HOSTS}, add its host key to connect to it"
+        raise RuntimeError(msg)
+
+    transport = paramiko.Transport((source.hostname, source.port))
+    transport.banner_timeout = SFTP_CONNECT_TIMEOUT
+    try:
+        # the host key is checked by connect when it's given
+        transport.connect(
+            hostkey=host_key,
+            username=source.username,
+            password=source.password,
+            pkey=load_private_key(source.ssh_key_type, source.ssh_key) if source.ssh_key else None,
+        )
+    except Exception:
+        transport.close()
+        raise
+    transport.set_keepalive(SFTP_KEEPALIVE_INTERVAL)
+    return SftpConnection(transport, channels)
+
+
+@dataclass
+class PooledConnection:
+    connection: SftpConnection
+    users: int = 0
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class SftpConnectionPool:
+    """
+    authenticated ssh connections to the backup sources shared by every transfer to a source,
+    which skips the handshake, key exchange and auth of a connection per file and keeps the
+    connections a host sees at once under its MaxStartups. The connections send keepalives,
+    the ones unused for idle_timeout seconds are closed and the sftp channels open at once on a
+    host are capped at max_channels
+    """
+
+    def __init__(
+        self,
+        idle_timeout: int = SFTP_POOL_IDLE_TIMEOUT,
+        max_channels: int = SFTP_MAX_CHANNELS,
+    ) -> None:
+        self.idle_timeout = idle_timeout
+        self.max_channels = max_channels
+        self._connections: dict[str, PooledConnection] = {}
+        self._connecting: dict[str, threading.Lock] = {}
+        self._channels: dict[tuple[str, int], threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _host_channels(self, source: SftpBackupSource) -> threading.BoundedSemaphore:
+        with self._lock:
+            return self._channels.setdefault(
+                (source.hostname, source.port), threading.BoundedSemaphore(self.max_channels)
+            )
+
+    def _pop(self, key: str, pooled: PooledConnection) -> PooledConnection | None:
+        """
+        take a connection out of the pool, returns it when nobody uses it and it can be closed
+        right away, otherwise the last user closes it
+        """
+        if self._connections.get(key) is pooled:
+            del self._connections[key]
+        return None if pooled.users else pooled
+
+    def _acquire(self, source: SftpBackupSource) -> PooledConnection:
+        key = str(source.id)
+        with self._lock:
+            connecting = self._connecting.setdefault(key, threading.Lock())
+        # a source is connected to once, transfers started meanwhile wait and share the connection
+        with connecting:
+            with self._lock:
+                pooled = self._connections.get(key)
+                if pooled and pooled.connection.is_active():
+                    pooled.users += 1
+                    return pooled
+                dropped = self._pop(key, pooled) if pooled else None
+            if dropped:
+                dropped.connection.close()
+            pooled = PooledConnection(connect(source, channels=self._host_channels(source)), users=1)
+            with self._lock:
+                self._connections[key] = pooled
+            return pooled
+
+    @contextmanager
+    def connection(self, source: SftpBackupSource) -> Iterator[SftpConnection]:
+        """
+        the pooled connection to a backup source, connected when there is none. A connection that
+        dropped is closed once the block exits and the next block connects again
+        """
+        key = str(source.id)
+        pooled = self._acquire(source)
+        try:
+            yield pooled.connection
+        finally:
+            with self._lock:
+                pooled.users -= 1
+                pooled.last_used = time.monotonic()
+                if not pooled.connection.is_active() or self._stop.is_set():
+                    self._pop(key, pooled)
+                closed = self._connections.get(key) is not pooled and not pooled.users
+            if closed:
+                pooled.connection.close()
+
+    def evict_idle(self) -> None:
+        """
+        close the connections unused for idle_timeout seconds and the ones that dropped
+        """
+        now = time.monotonic()
+        with self._lock:
+            evicted = [
+                self._pop(key, pooled)
+                for key, pooled in list(self._connections.items())
+                if not pooled.connection.is_active() or now - pooled.last_used >= self.idle_timeout
+            ]
+        for pooled in evicted:
+            if pooled:
+                pooled.connection.close()
+
+    def close(self, source_id: str) -> None:
+        """
+        close the connection to a backup source, e.g. once the source is deleted
+        """
+        with self._lock:
+            pooled = self._connections.get(source_id)
+            closed = self._pop(source_id, pooled) if pooled else None
+        if closed:
+            closed.connection.close()
+
+    def maintain(self) -> None:
+        while not self._stop.wait(SFTP_POOL_CHECK_INTERVAL):
+            self.evict_idle()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.maintain, name="sftp-pool", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._lock:
+            closed = [self._pop(key, pooled) for key, pooled in list(self._connections.items())]
+        for pooled in closed:
+            if pooled:
+                pooled.connection.close()
+
+
+_pool: SftpConnectionPool | None = None
+
+
+def start_sftp_pool() -> SftpConnectionPool:
+    global _pool  # noqa: PLW0603
+    _pool = SftpConnectionPool()
+    _pool.start()
+    return _pool
+
+
+def get_sftp_pool() -> SftpConnectionPool | None:
+    return _pool
+
+
+@contextmanager
+def sftp_connection(source: SftpBackupSource) -> Iterator[SftpConnection]:
+    """
+    the pooled connection to a backup source, a connection of its own that is closed after the
+    block when the pool isn't started
+    """
+    if _pool:
+        with _pool.connection(source) as connection:
+            yield connection
+    else:
+        with connect(source) as connection:
+            yield connection
+
+
+def remote_file_path(source: SftpBackupSource, filename: str) -> str:
+    return posixpath.join(source.remote_path, filename)
+
+
+class ChunkTracker:
+    """
+    hands out the offsets of the chunks still to upload to the streams and tracks the offset up
+    to which every chunk was confirmed, chunks complete out of order
+    """
+
+    def __init__(
+        self,
+        start: int,
+        size: int,
+        chunk_size: int,
+        on_confirmed: Callable[[int], None] | None = None,
+    ) -> None:
+        self.size = size
+        self.chunk_size = chunk_size
+        self.confirmed = start
+        self._on_confirmed = on_confirmed
+        self._pending: Iterator[int] = iter(range(start, size, chunk_size))
+        self._done: set[int] = set()
+        self._failed = False
+        self._lock = threading.Lock()
+
+    def next(self) -> int | None:
+        """
+        offset of the next chunk to upload, None once every chunk is handed out or a stream failed
+        """
+        with self._lock:
+            return None if self._failed else next(self._pending, None)
+
+    def fail(self) -> None:
+        with self._lock:
+            self._failed = True
+
+    def confirm(self, offset: int) -> None:
+        with self._lock:
+            self._done.add(offset)
+            advanced = False
+            while self.confirmed in self._done:
+                self._done.remove(self.confirmed)
+                self.confirmed = min(self.confirmed + self.chunk_size, self.size)
+                advanced = True
+            if advanced and self._on_confirmed:
+                self._on_confirmed(self.confirmed)
+
+
+def resume_offset(sftp: Any, partial_path: str, confirmed: int, chunk_size: int) -> int:  # noqa: ANN401
+    """
+    offset an upload resumes from, the confirmed offset of the last attempt as long as the
+    partial file still holds it
+    """
+    try:
+        remote_size = sftp.stat(partial_path).st_size
+    except OSError:
+        return 0
+    return min(confirmed, remote_size) // chunk_size * chunk_size
+
+
+def _write_chunks(
+    connection: SftpConnection,
+    local_path: Path,
+    partial_path: str,
+    tracker: ChunkTracker,
+) -> int:
+    """
+    upload chunks until none are left in a sftp session of its own, returns the bytes written
+    """
+    written = 0
+    try:
+        with connection.sftp() as sftp, local_path.open("rb") as source:
+            while (offset := tracker.next()) is not None:
+                source.seek(offset)
+                remote = sftp.open(partial_path, "r+")
+                try:
+                    # writes don't wait for their ack, close waits for all of them
+                    remote.set_pipelined(True)
+                    remote.seek(offset)
+                    remaining = min(tracker.chunk_size, tracker.size - offset)
+                    while remaining:
+                        data = source.read(min(SFTP_WRITE_SIZE, remaining))
+                        if not data:
+                            msg = f"{local_path} is shorter than {tracker.size} bytes"
+                            raise RuntimeError(msg)
+                        remote.write(data)
+                        remaining -= len(data)
+                        written += len(data)
+                        report_progress(bytes=len(data))
+                finally:
+                    remote.close()
+                tracker.confirm(offset)
+    except BaseException:
+        tracker.fail()
+        raise
+    return written
+
+
+def _replace(sftp: Any, source: str, dest: str) -> None:  # noqa: ANN401
+    try:
+        sftp.posix_rename(source, dest)
+    except OSError:
+        # servers without the posix-rename extension don't rename over an existing file
+        with suppress(OSError):
+            sftp.remove(dest)
+        sftp.rename(source, dest)
+
+
+def upload_file(
+    connection: SftpConnection,
+    local_path: Path,
+    remote_path: str,
+    confirmed: int = 0,
+    on_confirmed: Callable[[int], None] | None = None,
+    streams: int = SFTP_UPLOAD_STREAMS,
+    chunk_size: int = SFTP_UPLOAD_CHUNK_SIZE,
+) -> int:
+    """
+    upload a file with concurrent streams each writing whole chunks at their offset into a
+    .partial file that is renamed to remote_path once every chunk is written. confirmed is the
+    offset a previous attempt got to, the upload resumes from there. on_confirmed is called with
+    the new offset every time it advances. Returns the bytes sent
+    """
+    size = local_path.stat().st_size
+    partial_path = f"{remote_path}{PARTIAL_SUFFIX}"
+    # the channel is given back while the streams write so they don't wait for it
+    with connection.sftp() as sftp:
+        start = resume_offset(sftp, partial_path, confirmed, chunk_size)
+        if start:
+            logger.info("resuming upload of %s to %s at %s bytes", local_path, remote_path, start)
+        else:
+            sftp.open(partial_path, "w").close()
+
+    tracker = ChunkTracker(start, size, chunk_size, on_confirmed)
+    expect_progress(size - start)
+    written = sum(
+        run_concurrently(
+            [
+                partial(_write_chunks, connection, local_path, partial_path, tracker)
+                for _ in range(max(1, min(streams, len(range(start, size, chunk_size)))))
+            ],
+            max_workers=streams,
+        )
+    )
+    with connection.sftp() as sftp:
+        _replace(sftp, partial_path, remote_path)
+    return written
+
+
+class RangeReader:
+    """
+    reads a remote file with concurrent range reads and hands the chunks out in order. Chunks
+    are only read up to read_ahead bytes past the one handed out, so a slow consumer doesn't
+    buffer the whole file in memory
+    """
+
+    def __init__(self, remote_path: str, size: int, chunk_size: int, read_ahead: int) -> None:
+        self.remote_path = remote_path
+        self.size = size
+        self.chunk_size = chunk_size
+        self.read_ahead = max(read_ahead, chunk_size)
+        # offset of the next chunk to read and of the next one to hand out
+        self._next = 0
+        self._position = 0
+        self._read: dict[int, bytes] = {}
+        self._error: Exception | None = None
+        self._stopped = False
+        self._condition = threading.Condition()
+
+    def _take(self) -> int | None:
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self._stopped
+                or self._next >= self.size
+                or self._next < self._position + self.read_ahead
+            )
+            if self._stopped or self._next >= self.size:
+                return None
+            offset = self._next
+            self._next += self.chunk_size
+            return offset
+
+    def read(self, connection: SftpConnection) -> None:
+        """
+        read chunks until none are left in a sftp session of its own
+        """
+        try:
+            with connection.sftp() as sftp:
+                remote = sftp.open(self.remote_path, "r")
+                try:
+                    while (offset := self._take()) is not None:
+                        length = min(self.chunk_size, self.size - offset)
+                        # readv pipelines the requests for the range
+                        data = b"".join(remote.readv([(offset, length)]))
+                        if len(data) != length:
+                            msg = f"{self.remote_path} is shorter than {self.size} bytes"
+                            raise RuntimeError(msg)
+                        with self._condition:
+                            self._read[offset] = data
+                            self._condition.notify_all()
+                finally:
+                    remote.close()
+        except Exception as e:
+            logger.exception("reading %s failed", self.remote_path)
+            with self._condition:
+                self._error = self._error or e
+                self._condition.notify_all()
+
+    def chunks(self) -> Iterator[bytes]:
+        while self._position < self.size:
+            with self._condition:
+                self._condition.wait_for(lambda: self._position in self._read or self._error)
+                if self._error:
+                    raise self._error
+                data = self._read.pop(self._position)
+                self._position += len(data)
+                self._condition.notify_all()
+            report_progress(bytes=len(data))
+            yield data
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._read.clear()
+            self._condition.notify_all()
+
+
+def read_remote_file(
+    connection: SftpConnection,
+    remote_path: str,
+    size: int,
+    streams: int = SFTP_RESTORE_STREAMS,
+    chunk_size: int = SFTP_RESTORE_CHUNK_SIZE,
+    read_ahead: int = SFTP_RESTORE_READ_AHEAD,
+) -> Iterator[bytes]:
+    """
+    stream a remote file in order, read by streams concurrent range reads each on its own sftp
+    channel and at most read_ahead bytes ahead of the consumer
+    """
+    reader = RangeReader(remote_path, size, chunk_size, read_ahead)
+    expect_progress(size)
+    threads = [
+        threading.Thread(target=reader.read, args=(connection,), name=f"sftp-read-{stream}", daemon=True)
+        for stream in range(max(1, min(streams, len(range(0, size, chunk_size)))))
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        yield from reader.chunks()
+    finally:
+        reader.stop()
+        for thread in threads:
+            thread.join()
+
+
+def upload_with_retries(
+    connect_source: Callable[[], AbstractContextManager[SftpConnection]],
+    upload: Callable[[SftpConnection], int],
+    retries: int,
+    delay: float,
+) -> int:
+    """
+    run an upload on a connection to the source, reconnecting and resuming up to retries times
+    when the connection drops
+    """
+    attempt = 0
+    while True:
+        try:
+            with connect_source() as connection:
+                return upload(connection)
+        except _connection_errors() as e:  # noqa: PERF203
+            attempt += 1
+            if attempt > retries:
+                raise
+            logger.warning("upload failed (%s), retry %s of %s in %ss", e, attempt, retries, delay)
+            time.sleep(delay)
+
+
+class SftpSink:
+    """
+    archive sink that tees an archive to a backup source while the backup writes it. Data is
+    queued for a thread writing it into a .partial file that is renamed once the archive is
+    complete. When the queue stays full for stall_timeout seconds or the connection fails the
+    sink is detached and the backup continues without it, the upload then resumes from the
+    offset the remote confirmed
+    """
+
+    def __init__(
+        self,
+        source: SftpBackupSource,
+        filename: str,
+        buffer_size: int = SFTP_TEE_BUFFER,
+        stall_timeout: float = SFTP_TEE_STALL_TIMEOUT,
+        chunk_size: int = SFTP_UPLOAD_CHUNK_SIZE,
+    ) -> None:
+        self.source = source
+        self.filename = filename
+        self.remote_path = remote_file_path(source, filename)
+        self.buffer_size = buffer_size
+        self.stall_timeout = stall_timeout
+        self.chunk_size = chunk_size
+        # bytes of the archive written to the sink and the offset the remote confirmed
+        self.size = 0
+        self.confirmed = 0
+        self.complete = False
+        self.detached = False
+        self.error: str | None = None
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+        self._queue: deque[bytes] = deque()
+        self._queued = 0
+        self._closing = False
+        self._aborted = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=f"sftp-tee-{source.id}", daemon=True)
+        self._thread.start()
+
+    def write(self, data: bytes) -> None:
+        with self._condition:
+            if self.detached:
+                return
+            self.size += len(data)
+            # a write bigger than the buffer waits for the queue to empty
+            if not self._condition.wait_for(
+                lambda: self.detached or not self._queued or self._queued + len(data) <= self.buffer_size,
+                timeout=self.stall_timeout,
+            ):
+                logger.warning("%s fell behind the backup, continuing without it", self.remote_path)
+                self._detach(f"fell behind the backup for {self.stall_timeout}s")
+            if self.detached:
+                return
+            self._queue.append(data)
+            self._queued += len(data)
+            self._condition.notify_all()
+
+    def close(self) -> None:
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def abort(self) -> None:
+        with self._condition:
+            self._aborted = True
+            self._detach("the backup failed")
+        self._thread.join()
+
+    def _detach(self, error: str) -> None:
+        # the queued data is dropped, the upload resumes from the confirmed offset
+        if not self.detached:
+            self.detached, self.error = True, error
+        self._queue.clear()
+        self._queued = 0
+        self._condition.notify_all()
+
+    def _take(self) -> bytes | None:
+        """
+        the next queued data, None once the archive is complete or the sink detached
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._queue or self._closing or self.detached)
+            if self.detached or not self._queue:
+                return None
+            data = self._queue.popleft()
+            self._queued -= len(data)
+            self._condition.notify_all()
+            return data
+
+    def _run(self) -> None:
+        partial_path = f"{self.remote_path}{PARTIAL_SUFFIX}"
+        try:
+            with sftp_connection(self.source) as connection, connection.sftp() as sftp:
+                remote = sftp.open(partial_path, "w")
+                offset = 0
+                try:
+                    remote.set_pipelined(True)
+                    while (data := self._take()) is not None:
+                        remote.write(data)
+                        offset += len(data)
+                        if offset - self.confirmed >= self.chunk_size:
+                            # close waits for the acks of the pipelined writes
+                            remote.close()
+                            self.confirmed = offset
+                            remote = sftp.open(partial_path, "r+")
+                            remote.set_pipelined(True)
+                            remote.seek(offset)
+                finally:
+                    remote.close()
+                self.confirmed = offset
+                if self._aborted:
+                    sftp.remove(partial_path)
+                elif not self.detached:
+                    _replace(sftp, partial_path, self.remote_path)
+                    self.complete = True
+        except Exception as e:
+            logger.exception("teeing %s to %s failed", self.filename, self.remote_path)
+            with self._condition:
+                self._detach(str(e))
+        self.elapsed = time.monotonic() - self.started
+
+
+class SftpTee:
+    """
+    makes the sinks that tee the archives of a backup to backup sources, called with the
+    filename of every archive the backup writes. Keeps the sinks so their state can be recorded
+    """
+
+    def __init__(self, sources: list[SftpBackupSource], **options: Any) -> None:  # noqa: ANN401
+        self.sources = sources
+        self.options = options
+        self.sinks: list[SftpSink] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, filename: str) -> list[SftpSink]:
+        sinks = [SftpSink(source, filename, **self.options) for source in self.sources]
+        with self._lock:
+            self.sinks.extend(sinks)
+        return sinks
+
+    def discard(self) -> None:
+        """
+        remove the archives teed completely of a backup that failed, e.g. the other parts of it
+        """
+        for sink in self.sinks:
+            if not sink.complete:
+                continue
+            try:
+                with sftp_connection(sink.source) as connection, connection.sftp() as sftp:
+                    sftp.remove(sink.remote_path)
+            except Exception:
+                logger.exception("removing %s of the failed backup failed", sink.remote_path)
+
+
+@dataclass
+class RemoteVerification:
+    verified: bool
+    # None when the size of the remote copy already differs
+    method: UploadVerifyMethod | None = None
+    checksum: str | None = None
+
+
+def remote_sha256(connection: SftpConnection, remote_path: str) -> str | None:
+    """
+    sha256 of a remote file computed by the server, None when it doesn't run any hash command.
+    A command that fails is followed by the next one, one that exits cleanly without printing a
+    hash means the server runs something else for commands, e.g. an sftp server with
+    ForceCommand internal-sftp
+    """
+    for command in REMOTE_HASH_COMMANDS:
+        try:
+            status, output = connection.run(f"{command} {shlex.quote(remote_path)}")
+        except _connection_errors() as e:
+            # a server refusing exec channels or a command that timed out
+            logger.info("%s can't be hashed on the server: %s", remote_path, e)
+            return None
+        words = output.split()
+        if status == 0 and words and re.fullmatch(rb"[0-9a-f]{64}", words[0]):
+            return words[0].decode()
+        if status == 0:
+            logger.info("%s printed no hash for %s, the server doesn't run commands", command, remote_path)
+            return None
+    return None
+
+
+def sampled_ranges(size: int, samples: int, sample_size: int) -> list[tuple[int, int]]:
+    """
+    ranges spread over a file, the first and the last and random ones in between so every
+    verification reads other parts of it. Files smaller than all samples are read whole
+    """
+    if size <= samples * sample_size:
+        return [(0, size)] if size else []
+    offsets = {0, size - sample_size}
+    offsets.update(secrets.randbelow(size - sample_size) for _ in range(max(0, samples - 2)))
+    return [(offset, sample_size) for offset in sorted(offsets)]
+
+
+def sampled_match(
+    connection: SftpConnection,
+    remote_path: str,
+    local_path: Path,
+    samples: int = SFTP_VERIFY_SAMPLES,
+    sample_size: int = SFTP_VERIFY_SAMPLE_SIZE,
+) -> bool:
+    """
+    read ranges of a remote file and compare them with the same ranges of the local file
+    """
+    ranges = sampled_ranges(local_path.stat().st_size, samples, sample_size)
+    with connection.sftp() as sftp, local_path.open("rb") as local:
+        remote = sftp.open(remote_path, "r")
+        try:
+            for offset, length in ranges:
+                local.seek(offset)
+                if b"".join(remote.readv([(offset, length)])) != local.read(length):
+                    logger.error("%s differs from %s at %s", remote_path, local_path, offset)
+                    return False
+        finally:
+            remote.close()
+    return True
+
+
+def verify_remote_file(
+    connection: SftpConnection,
+    remote_path: str,
+    size: int,
+    checksum: str | None,
+    local_path: Path | None,
+) -> RemoteVerification:
+    """
+    check an uploaded archive without downloading it. The server hashes it when it runs a hash
+    command over ssh and the hash is compared with checksum, otherwise ranges of it are read
+    and compared with the local archive
+    """
+    with connection.sftp() as sftp:
+        remote_size = sftp.stat(remote_path).st_size
+    if remote_size != size:
+        logger.error("%s has %s bytes instead of %s", remote_path, remote_size, size)
+        return RemoteVerification(verified=False)
+
+    remote_checksum = remote_sha256(connection, remote_path) if checksum else None
+    if remote_checksum:
+        if remote_checksum != checksum:
+            logger.error("%s has sha256 %s instead of %s", remote_path, remote_checksum, checksum)
+        return RemoteVerification(remote_checksum == checksum, UploadVerifyMethod.Hash, remote_checksum)
+
+    if not local_path or not local_path.exists():
+        msg = f"{remote_path} can't be verified, the server doesn't hash it and the local archive is gone"
+        raise RuntimeError(msg)
+    return RemoteVerification(
+        sampled_match(connection, remote_path, local_path), UploadVerifyMethod.Sampled
+    )
@@ -47,6 +47,41 @@ document.addEventListener('alpine:init', () => {
             this.selected = []
         }
     }))
+    Alpine.data('jobProgress', () => ({
+        jobs: [],
+        events: null,
+        init() {
+            this.events = new EventSource("/api/progress")
+            this.events.addEventListener("progress", (event) => {
+                const jobs = JSON.parse(event.data)
+                const finished = jobs.some((job) => job.status !== "running" && !this.jobs.some(
+                    (previous) => previous.job_id === job.job_id && previous.status === job.status
+                ))
+                this.jobs = jobs
+                if (finished) {
+                    htmx.trigger(document.body, "reload-job-rows")
+                }
+            })
+        },
+        destroy() {
+            this.events.close()
+        },
+        formatBytes(bytes) {
+            const units = ["B", "KB", "MB", "GB", "TB"]
+            let index = 0
+            while (bytes >= 1024 && index < units.length - 1) {
+                bytes /= 1024
+                index++
+            }
+            return `${bytes.toFixed(1)} ${units[index]}`
+        },
+        formatEta(seconds) {
+            if (seconds === null) {
+                return ""
+            }
+            return new Date(seconds * 1000).toISOString().substring(11, 19)
+        }
+    }))
     Alpine.data('draggableWindow', () => ({
         dragging: false, 
         offsetX: 0, 
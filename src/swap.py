@@ -0,0 +1,96 @@
+import logging
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from python_on_whales import DockerException
+
+from src.docker import (
+    create_volume,
+    exchange_volumes,
+    get_docker_client,
+    get_volume,
+    get_volume_containers,
+    list_volume_files,
+    remove_volume,
+)
+from src.helper_pool import DOCKER_VOLUMES_ROOT, volume_path
+from src.quiesce import QUIESCE_STOP_TIMEOUT
+from src.tar_index import ArchiveMember
+
+logger = logging.getLogger(__name__)
+
+# label set on the volumes holding the files a swap restore replaced, the value is the volume
+ROLLBACK_LABEL = "docker-volume-backup.rollback"
+
+
+def rollback_volume_name(volume_name: str, restore_id: str) -> str:
+    return f"{volume_name}-rollback-{restore_id[:8]}"
+
+
+def verify_restored_volume(volume_name: str, members: list[ArchiveMember]) -> None:
+    """
+    check every file in the index of the backup is in the volume with the same size
+    """
+    files = list_volume_files(volume_name)
+    expected = {member.path: member.size for member in members if member.member_type == "file"}
+    missing = [path for path in expected if path not in files]
+    differ = [path for path, size in expected.items() if path in files and files[path] != size]
+    if missing or differ:
+        msg = (
+            f"Restored volume {volume_name} doesn't match the backup, {len(missing)} files are "
+            f"missing and {len(differ)} have another size e.g. {(missing or differ)[:5]}"
+        )
+        raise RuntimeError(msg)
+    logger.info("restored volume %s has the %s files of the backup", volume_name, len(expected))
+
+
+def swap_volumes(volume_name: str, other_volume_name: str) -> float:
+    """
+    exchange the files of two volumes, the running containers using volume_name are stopped
+    for the exchange. Returns how long they were down
+    """
+    containers = get_volume_containers(volume_name)
+    client = get_docker_client()
+    started = time.monotonic()
+    if containers:
+        client.container.stop(containers, time=QUIESCE_STOP_TIMEOUT)
+    try:
+        exchange_volumes(volume_name, other_volume_name)
+    finally:
+        if containers:
+            client.container.start(containers)
+    downtime = time.monotonic() - started
+    logger.info(
+        "swapped volumes %s and %s, containers %s were down for %.1fs",
+        volume_name,
+        other_volume_name,
+        [container.name for container in containers],
+        downtime,
+    )
+    return downtime
+
+
+@contextmanager
+def swap_restore(volume_name: str, restore_id: str) -> Iterator[str]:
+    """
+    name of a new volume to restore into while volume_name stays untouched. Once the block
+    succeeds the files of the two volumes are swapped, the new volume then holds the files that
+    were replaced so the restore can be rolled back. The new volume is removed when the block
+    fails
+    """
+    if not volume_path(get_volume(volume_name)):
+        msg = f"Volume {volume_name} isn't a local volume in {DOCKER_VOLUMES_ROOT}, it can't be swapped"
+        raise ValueError(msg)
+
+    rollback = rollback_volume_name(volume_name, restore_id)
+    create_volume(rollback, labels={ROLLBACK_LABEL: volume_name})
+    try:
+        yield rollback
+    except BaseException:
+        try:
+            remove_volume(rollback)
+        except DockerException:
+            logger.exception("removing volume %s of the failed restore failed", rollback)
+        raise
+    swap_volumes(volume_name, rollback)
@@ -0,0 +1,280 @@
+import re
+import tarfile
+from bisect import bisect_right
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+
+from src.compression import READ_CHUNK_SIZE, decompress_stream
+from src.models import BackupCodec
+
+TAR_BLOCK_SIZE = 512
+# two zero blocks mark the end of a tar archive
+TAR_END = b"\0" * TAR_BLOCK_SIZE * 2
+# headers that hold the name or attributes of the member that follows them
+EXTENSION_TYPES = {tarfile.GNUTYPE_LONGNAME, tarfile.GNUTYPE_LONGLINK, tarfile.XHDTYPE}
+MEMBER_TYPES = {
+    tarfile.REGTYPE: "file",
+    tarfile.AREGTYPE: "file",
+    tarfile.CONTTYPE: "file",
+    tarfile.DIRTYPE: "dir",
+    # gnu tar incremental dump dir
+    b"D": "dir",
+    tarfile.SYMTYPE: "symlink",
+    tarfile.LNKTYPE: "hardlink",
+}
+# ranges closer than this are read in one pass instead of seeking to a new frame
+RANGE_GAP = 4 * 1024 * 1024
+# escapes of escape_path, a doubled backslash or a byte of a name that isn't utf-8
+PATH_ESCAPE = re.compile(r"\\(\\|x[89a-f][0-9a-f])")
+
+
+def padded(size: int) -> int:
+    return -(-size // TAR_BLOCK_SIZE) * TAR_BLOCK_SIZE
+
+
+def normalize_path(name: str) -> str:
+    """
+    paths in the index are relative to the volume root without the ./ tar adds
+    """
+    return name.removeprefix("./").strip("/")
+
+
+def escape_path(path: str) -> str:
+    """
+    text form of a member path stored in the index and used by the api. Names that aren't utf-8
+    are decoded with surrogateescape, which sqlite and json can't hold, their bytes become \\xNN
+    and backslashes are doubled so unescape_path gets the name back
+    """
+    return path.replace("\\", "\\\\").encode("utf-8", "surrogateescape").decode("utf-8", "backslashreplace")
+
+
+def unescape_path(path: str) -> str:
+    return PATH_ESCAPE.sub(
+        lambda match: "\\" if match[1] == "\\" else chr(0xDC00 + int(match[1][1:], 16)), path
+    )
+
+
+@dataclass
+class ArchiveMember:
+    path: str
+    member_type: str
+    size: int
+    mtime: int
+    # offset in the uncompressed tar stream of the first header of the member, including the
+    # extension headers in front of it
+    offset: int
+    # offset of the member's data
+    data_offset: int
+    # part of a backup split into parts the member is in
+    part: int = 0
+
+    @property
+    def end(self) -> int:
+        return self.data_offset + padded(self.size)
+
+
+@dataclass
+class ArchiveFrame:
+    """
+    independently compressed part of an archive, decompression can start at any frame
+    """
+
+    # offset of the frame in the uncompressed tar stream
+    source_offset: int
+    # offset and size of the frame in the archive file
+    offset: int
+    size: int
+    part: int = 0
+
+
+def _parse_pax_path(data: bytes) -> str | None:
+    path = None
+    while data:
+        length, _, rest = data.partition(b" ")
+        record = rest[: int(length) - len(length) - 1]
+        key, _, value = record.rstrip(b"\n").partition(b"=")
+        if key == b"path":
+            path = value.decode("utf-8", "surrogateescape")
+        data = data[int(length) :]
+    return path
+
+
+class TarIndexer:
+    """
+    builds the member index of a tar stream as it passes through, only the header blocks are
+    parsed and member data is skipped
+    """
+
+    def __init__(self) -> None:
+        self.members: list[ArchiveMember] = []
+        self._buffer = bytearray()
+        # offset in the tar stream of the start of the buffer
+        self._offset = 0
+        # bytes of member data still to skip
+        self._skip = 0
+        # extension header being read and the data it needs
+        self._extension: tarfile.TarInfo | None = None
+        self._long_name: str | None = None
+        self._member_start: int | None = None
+        self._done = False
+
+    def observe(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            self.feed(chunk)
+            yield chunk
+
+    def feed(self, data: bytes) -> None:
+        if self._done:
+            return
+        self._buffer += data
+        while not self._done:
+            if self._skip:
+                skipped = min(self._skip, len(self._buffer))
+                del self._buffer[:skipped]
+                self._offset += skipped
+                self._skip -= skipped
+                if self._skip:
+                    return
+            elif self._extension:
+                size = padded(self._extension.size)
+                if len(self._buffer) < size:
+                    return
+                self._read_extension(bytes(self._buffer[: self._extension.size]))
+                del self._buffer[:size]
+                self._offset += size
+            else:
+                if len(self._buffer) < TAR_BLOCK_SIZE:
+                    return
+                self._read_header(bytes(self._buffer[:TAR_BLOCK_SIZE]))
+
+    def _read_header(self, block: bytes) -> None:
+        try:
+            info = tarfile.TarInfo.frombuf(block, "utf-8", "surrogateescape")
+        except tarfile.EOFHeaderError:
+            self._done = True
+            return
+        except tarfile.HeaderError:
+            # not a tar stream the index can follow, keep the members found so far
+            self._done = True
+            return
+
+        header_offset = self._offset
+        del self._buffer[:TAR_BLOCK_SIZE]
+        self._offset += TAR_BLOCK_SIZE
+        if self._member_start is None:
+            self._member_start = header_offset
+
+        if info.type in EXTENSION_TYPES:
+            self._extension = info
+            return
+
+        name = self._long_name or info.name
+        path = normalize_path(name)
+        if path:
+            self.members.append(
+                ArchiveMember(
+                    path=path,
+                    member_type=MEMBER_TYPES.get(info.type, "other"),
+                    size=info.size,
+                    mtime=int(info.mtime),
+                    offset=self._member_start,
+                    data_offset=self._offset,
+                )
+            )
+        self._long_name = None
+        self._member_start = None
+        self._skip = padded(info.size)
+
+    def _read_extension(self, data: bytes) -> None:
+        if self._extension.type == tarfile.GNUTYPE_LONGNAME:
+            self._long_name = data.rstrip(b"\0").decode("utf-8", "surrogateescape")
+        elif self._extension.type == tarfile.XHDTYPE:
+            self._long_name = _parse_pax_path(data) or self._long_name
+        self._extension = None
+
+
+def _read_from(path: Path, offset: int) -> Iterator[bytes]:
+    with path.open("rb") as f:
+        f.seek(offset)
+        while chunk := f.read(READ_CHUNK_SIZE):
+            yield chunk
+
+
+def _read_uncompressed(
+    path: Path,
+    codec: BackupCodec,
+    frames: list[ArchiveFrame],
+    start: int,
+) -> tuple[int, Iterator[bytes]]:
+    """
+    uncompressed tar stream from the frame holding start, returns the offset it starts at
+    """
+    if codec == BackupCodec.NONE:
+        return start, _read_from(path, start)
+    frame = frames[max(bisect_right([frame.source_offset for frame in frames], start) - 1, 0)]
+    return frame.source_offset, decompress_stream(codec, _read_from(path, frame.offset))
+
+
+def _coalesce(ranges: list[tuple[int, int]]) -> list[list[tuple[int, int]]]:
+    spans: list[list[tuple[int, int]]] = []
+    for start, end in sorted(ranges):
+        if spans and start - spans[-1][-1][1] <= RANGE_GAP:
+            spans[-1].append((start, end))
+        else:
+            spans.append([(start, end)])
+    return spans
+
+
+def read_archive_ranges(
+    path: str | Path,
+    codec: BackupCodec,
+    frames: list[ArchiveFrame],
+    ranges: list[tuple[int, int]],
+) -> Iterator[bytes]:
+    """
+    yield the bytes of the ranges of the uncompressed tar stream of an archive, decompression
+    starts at the frame holding each range instead of the start of the archive
+    """
+    for span in _coalesce(ranges):
+        position, stream = _read_uncompressed(Path(path), codec, frames, span[0][0])
+        remaining = iter(span)
+        start, end = next(remaining)
+        try:
+            for data in stream:
+                data_end = position + len(data)
+                while start < data_end:
+                    if end > position:
+                        yield data[max(start - position, 0) : end - position]
+                    if end > data_end:
+                        start = data_end
+                        break
+                    next_range = next(remaining, None)
+                    if next_range is None:
+                        start = end = None
+                        break
+                    start, end = next_range
+                if start is None:
+                    break
+                position = data_end
+        finally:
+            stream.close()
+
+
+def read_archive_members(
+    paths: list[str | Path],
+    codec: BackupCodec,
+    frames: list[ArchiveFrame],
+    members: list[ArchiveMember],
+) -> Iterator[bytes]:
+    """
+    tar stream of just the members, cut out of the archive with their headers. paths are the
+    archive files of each part
+    """
+    for part, path in enumerate(paths):
+        ranges = [(member.offset, member.end) for member in members if member.part == part]
+        if ranges:
+            yield from read_archive_ranges(
+                path, codec, [frame for frame in frames if frame.part == part], ranges
+            )
+    yield TAR_END
@@ -0,0 +1,123 @@
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from src.compression import READ_CHUNK_SIZE
+from src.models import BackupFilenames, Backups, BackupStorageFormat
+from src.repository import ChunkStore
+
+logger = logging.getLogger(__name__)
+
+# max MiB per second read from the backup dir by the verify job, 0 doesn't limit it
+VERIFY_MAX_RATE = float(os.getenv("VERIFY_MAX_RATE", "50"))
+
+
+class Throttle:
+    """
+    sleeps when more than rate bytes per second have been read, so verifying doesn't starve
+    backups and the apps using the disk
+    """
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self.started = time.monotonic()
+        self.consumed = 0
+
+    def consume(self, size: int) -> None:
+        if not self.rate:
+            return
+        self.consumed += size
+        ahead = self.consumed / self.rate - (time.monotonic() - self.started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+
+def hash_file(path: Path, throttle: Throttle) -> tuple[str, int]:
+    file_hash = hashlib.sha256()
+    size = 0
+    with path.open("rb") as f:
+        while chunk := f.read(READ_CHUNK_SIZE):
+            file_hash.update(chunk)
+            size += len(chunk)
+            throttle.consume(len(chunk))
+    return file_hash.hexdigest(), size
+
+
+def _verify_repository_chunks(backup_dir: str, manifest_filename: str, throttle: Throttle) -> None:
+    store = ChunkStore(backup_dir)
+    for chunk_hash in store.read_manifest(manifest_filename)["chunks"]:
+        # get checks the chunk against its hash
+        throttle.consume(len(store.get(chunk_hash)))
+
+
+def _matches(name: str, expected: tuple[str | None, int | None], actual: tuple[str, int]) -> bool | None:
+    """
+    whether a file matches the checksum and size recorded when it was written, None when there's
+    no checksum to compare with
+    """
+    checksum, size = expected
+    if size in (None, actual[1]) and checksum in (None, actual[0]):
+        if checksum is None:
+            logger.warning("%s has no checksum to verify it against", name)
+            return None
+        return True
+    logger.error(
+        "%s doesn't match, expected %s (%s bytes) got %s (%s bytes)",
+        name,
+        checksum,
+        size,
+        actual[0],
+        actual[1],
+    )
+    return False
+
+
+def _verify_archive(backup: Backups, backup_dir: str, throttle: Throttle) -> bool | None:
+    checksum, size = hash_file(Path(backup.backup_path), throttle)
+    if backup.storage_format == BackupStorageFormat.Repository:
+        _verify_repository_chunks(backup_dir, backup.backup_filename, throttle)
+    return _matches(f"backup {backup.backup_id}", (backup.checksum, backup.size), (checksum, size))
+
+
+def _verify_parts(backup: Backups, parts: list[BackupFilenames], throttle: Throttle) -> bool | None:
+    results = [
+        _matches(
+            f"part {part.backup_filename}",
+            (part.checksum, part.size),
+            hash_file(Path(backup.backup_path).with_name(part.backup_filename), throttle),
+        )
+        for part in parts
+    ]
+    if False in results:
+        return False
+    return None if None in results else True
+
+
+def verify_backup(
+    backup: Backups,
+    backup_dir: str,
+    throttle: Throttle,
+    parts: list[BackupFilenames] | None = None,
+) -> bool | None:
+    """
+    re-hash a backup and compare it with the checksum and size stored when it was created, the
+    result is set on the backup. Backups without a checksum can't be verified, they stay None.
+    Backups split into parts are checked part by part
+    """
+    try:
+        verified = (
+            _verify_parts(backup, parts, throttle)
+            if parts
+            else _verify_archive(backup, backup_dir, throttle)
+        )
+    except (OSError, RuntimeError, ValueError):
+        logger.exception("verifying backup %s failed", backup.backup_id)
+        verified = False
+
+    if verified is not None:
+        backup.verified = verified
+        backup.verified_at = datetime.now(tz=timezone.utc).isoformat()
+    return verified
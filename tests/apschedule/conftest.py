@@ -0,0 +1,10 @@
+import pytest
+
+from tests.fixtures import MockVolume
+
+
+@pytest.fixture(autouse=True)
+def mock_get_volume(mocker):
+    # the backup limiter looks up the volume to find its storage device
+    return mocker.patch("src.apschedule.tasks.get_volume", return_value=MockVolume())
+
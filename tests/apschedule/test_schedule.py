@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+from apscheduler.executors.pool import ThreadPoolExecutor
+from apscheduler.schedulers.background import BackgroundScheduler
+
+from src.apschedule import schedule
+from src.apschedule.tasks import task_create_backup, task_verify_backups
+from src.limiter import BackupLimiter
+from src.models import BackupOptions, ScheduleCrontab
+
+
+@pytest.fixture
+def scheduler(mocker):
+    scheduler = BackgroundScheduler(executors={schedule.BACKUP_EXECUTOR: ThreadPoolExecutor(1)})
+    scheduler.start(paused=True)
+    mocker.patch("src.apschedule.schedule.SCHEDULER", scheduler)
+    yield scheduler
+    scheduler.shutdown(wait=False)
+
+
+def test_add_backup_job_executor(scheduler):
+    job = schedule.add_backup_job("backup", "test-volume")
+    scheduled = schedule.add_backup_job(
+        "nightly", "test-volume", ScheduleCrontab(minute="0", hour="3"), is_schedule=True
+    )
+    verify = schedule.add_verify_job("verify")
+
+    assert job.executor == schedule.BACKUP_EXECUTOR
+    assert scheduled.executor == schedule.BACKUP_EXECUTOR
+    assert verify.executor == "default"
+
+
+def test_move_backup_jobs(scheduler):
+    # saved before backups had their own executor
+    backup = scheduler.add_job(task_create_backup, args=["test-volume", "job-1"], id="job-1")
+    verify = scheduler.add_job(task_verify_backups, args=["job-2"], id="job-2")
+
+    schedule.move_backup_jobs(scheduler)
+
+    assert scheduler.get_job(backup.id).executor == schedule.BACKUP_EXECUTOR
+    assert scheduler.get_job(verify.id).executor == "default"
+
+
+
+def test_has_incremental_schedules(scheduler):
+    crontab = ScheduleCrontab(minute="0", hour="3")
+    schedule.add_backup_job("nightly", "test-volume", crontab, is_schedule=True)
+    schedule.add_verify_job("verify")
+
+    assert not schedule.has_incremental_schedules(scheduler)
+
+    schedule.add_backup_job(
+        "hourly", "test-volume", crontab, is_schedule=True, options=BackupOptions(incremental=True)
+    )
+
+    assert schedule.has_incremental_schedules(scheduler)
+
+def test_backup_executor_devices_dont_block_each_other():
+    limiter = BackupLimiter(4, 1)
+    release = threading.Event()
+    started = []
+
+    def backup(device):
+        with limiter.acquire(device):
+            started.append(device)
+            release.wait(5)
+
+    scheduler = BackgroundScheduler(
+        executors={schedule.BACKUP_EXECUTOR: ThreadPoolExecutor(schedule.BACKUP_EXECUTOR_THREADS)}
+    )
+    scheduler.start()
+    # more backups queued for device a than the global cap
+    for index, device in enumerate(["a"] * 6 + ["b"] * 2):
+        scheduler.add_job(backup, args=[device], id=f"job-{index}", executor=schedule.BACKUP_EXECUTOR)
+    deadline = time.monotonic() + 2
+    while len(started) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    try:
+        assert sorted(started) == ["a", "b"]
+    finally:
+        release.set()
+        scheduler.shutdown()
+    assert sorted(started) == ["a"] * 6 + ["b"] * 2
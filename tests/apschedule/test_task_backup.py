@@ -1,10 +1,31 @@
 from datetime import datetime, timezone
+from pathlib import Path
 
 import pytest
 from freezegun import freeze_time
 from sqlmodel import select
 
-from src.models import BackupFilenames, Backups
+from src.archive import ArchiveResult
+from src.docker import EXCLUDE_LABEL, TarFilter
+from src.helper_limits import current_limits
+from src.models import (
+    BackupCodec,
+    BackupFilenames,
+    Backups,
+    BackUpStatus,
+    BackupStorageFormat,
+    ContainerDowntime,
+    HelperLimits,
+    QuiesceMode,
+)
+from src.routes.impl.volumes.backup_index import db_get_backup_frames, db_get_backup_members
+from src.tar_index import ArchiveFrame, ArchiveMember
+from tests.fixtures import MockContainer, MockVolume
+
+
+def write_snapshot(volume_name, backup_dir, filename, snapshot_file=None, tar_filter=None):
+    # tar writes the snapshot file as part of an incremental backup
+    (Path(backup_dir) / snapshot_file).write_text(f"snapshot {filename}")
 
 
 @freeze_time(lambda: datetime.now(timezone.utc), tick=False)
@@ -13,7 +34,7 @@ def test_task_backup_volume(mocker, session):
         "src.apschedule.tasks.Session",
         **{"return_value.__enter__.return_value": session},
     )
-    mock_backup_volume = mocker.patch("src.apschedule.tasks.backup_volume")
+    mock_backup_volume = mocker.patch("src.apschedule.tasks.backup_volume", return_value="tar-checksum")
     mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
     from src.apschedule.tasks import task_create_backup
 
@@ -23,6 +44,8 @@ def test_task_backup_volume(mocker, session):
         "test-volume",
         "/backup",
         f"test-volume-{datetime.now(timezone.utc).isoformat()}.tar.gz",
+        snapshot_file=None,
+        tar_filter=TarFilter(),
     )
     backup_db = session.exec(
         select(Backups).where(Backups.backup_id == "job_id_1"),
@@ -38,6 +61,8 @@ def test_task_backup_volume(mocker, session):
     assert backup_db.backup_path == f"/backup/test-volume-{dt_now.isoformat()}.tar.gz"
     assert backup_db.volume_name == "test-volume"
     assert backup_db.schedule_id is None
+    # hashed once tar wrote it, so verifying has a checksum to compare with
+    assert backup_db.checksum == "tar-checksum"
 
     db_backup_filenames = session.exec(
         select(BackupFilenames).where(BackupFilenames.backup_id == "job_id_1"),
@@ -71,6 +96,8 @@ def test_task_backup_volume_error(mocker, session):
         "test-volume",
         "/backup",
         f"test-volume-{datetime.now(timezone.utc).isoformat()}.tar.gz",
+        snapshot_file=None,
+        tar_filter=TarFilter(),
     )
     backup_db = session.exec(
         select(Backups).where(Backups.backup_id == "job_id_1")
@@ -107,6 +134,8 @@ def test_task_backup_volume_error_schedule(mocker, session):
         "test-volume",
         "/backup",
         f"test-volume-{datetime.now(timezone.utc).isoformat()}.tar.gz",
+        snapshot_file=None,
+        tar_filter=TarFilter(),
     )
     backup_db = session.exec(
         select(Backups).where(Backups.backup_id == "test-uuid")
@@ -124,7 +153,7 @@ def test_task_backup_volume_schedule(mocker, session):
         "src.apschedule.tasks.Session",
         **{"return_value.__enter__.return_value": session},
     )
-    mock_backup_volume = mocker.patch("src.apschedule.tasks.backup_volume")
+    mock_backup_volume = mocker.patch("src.apschedule.tasks.backup_volume", return_value="tar-checksum")
     mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
     mocker.patch("src.apschedule.tasks.uuid", **{"uuid4.return_value": "test-uuid"})
     from src.apschedule.tasks import task_create_backup
@@ -135,6 +164,8 @@ def test_task_backup_volume_schedule(mocker, session):
         "test-volume",
         "/backup",
         f"test-volume-{datetime.now(timezone.utc).isoformat()}.tar.gz",
+        snapshot_file=None,
+        tar_filter=TarFilter(),
     )
     backup_db = session.exec(
         select(Backups).where(Backups.backup_id == "test-uuid")
@@ -161,3 +192,484 @@ def test_task_backup_volume_schedule(mocker, session):
         == f"test-volume-{dt_now.isoformat()}.tar.gz"
     )
     assert db_backup_filenames.backup_id == "test-uuid"
+
+
+@freeze_time(lambda: datetime.now(timezone.utc), tick=False)
+def test_task_backup_volume_streaming(mocker, session):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mock_backup_volume = mocker.patch("src.apschedule.tasks.backup_volume", return_value="tar-checksum")
+    mock_stream_backup_volume = mocker.patch(
+        "src.apschedule.tasks.stream_backup_volume",
+        return_value=ArchiveResult(size=10, source_size=1024, checksum="abc123"),
+    )
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
+    mocker.patch("src.apschedule.tasks.BACKUP_STREAMING", True)
+    from src.apschedule.tasks import task_create_backup
+
+    task_create_backup("test-volume", "job_id_1", "job_name_1")
+
+    mock_backup_volume.assert_not_called()
+    mock_stream_backup_volume.assert_called_once_with(
+        "test-volume",
+        "/backup",
+        f"test-volume-{datetime.now(timezone.utc).isoformat()}.tar.gz",
+        snapshot_file=None,
+        codec=BackupCodec.GZIP,
+        codec_level=None,
+        tar_filter=TarFilter(),
+        tee=None,
+    )
+    backup_db = session.exec(
+        select(Backups).where(Backups.backup_id == "job_id_1"),
+    ).first()
+
+    assert backup_db
+    assert backup_db.status == BackUpStatus.Processed
+    assert backup_db.checksum == "abc123"
+
+
+def test_task_backup_volume_streaming_index(mocker, session):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mocker.patch(
+        "src.apschedule.tasks.stream_backup_volume",
+        return_value=ArchiveResult(
+            size=10,
+            source_size=3072,
+            checksum="abc123",
+            frames=[ArchiveFrame(source_offset=0, offset=0, size=10)],
+            members=[
+                ArchiveMember("data", "dir", 0, 1, 0, 512),
+                ArchiveMember("data/file.txt", "file", 100, 1, 512, 1024),
+            ],
+        ),
+    )
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
+    mocker.patch("src.apschedule.tasks.BACKUP_STREAMING", True)
+    from src.apschedule.tasks import task_create_backup
+
+    task_create_backup("test-volume", "job_id_1", "job_name_1")
+
+    members = db_get_backup_members(session, "job_id_1", "data")
+    assert [member.path for member in members] == ["data", "data/file.txt"]
+    assert members[1].data_offset == 1024
+    assert db_get_backup_frames(session, "job_id_1") == [
+        ArchiveFrame(source_offset=0, offset=0, size=10)
+    ]
+
+
+@freeze_time(lambda: datetime.now(timezone.utc), tick=False)
+def test_task_backup_volume_include_exclude(mocker, session, mock_get_volume):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mock_get_volume.return_value = MockVolume(labels={EXCLUDE_LABEL: "cache"})
+    mock_select_entries = mocker.patch("src.apschedule.tasks.select_entries", return_value=["data"])
+    mock_backup_volume = mocker.patch("src.apschedule.tasks.backup_volume", return_value="tar-checksum")
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
+    from src.apschedule.tasks import task_create_backup
+
+    task_create_backup(
+        "test-volume",
+        "job_id_1",
+        "job_name_1",
+        options={"include": ["data*"], "exclude": ["*.log"]},
+    )
+
+    mock_select_entries.assert_called_once_with("test-volume", ["data*"])
+    assert mock_backup_volume.call_args.kwargs["tar_filter"] == TarFilter(["data"], ["cache", "*.log"])
+    backup = session.exec(select(Backups).where(Backups.backup_id == "job_id_1")).one()
+    assert backup.include == ["data*"]
+    assert backup.exclude == ["cache", "*.log"]
+
+
+def test_task_backup_volume_skip_unchanged(mocker, session):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mock_backup_fingerprint = mocker.patch(
+        "src.apschedule.tasks.backup_fingerprint", side_effect=["hash-1", "hash-1", "hash-2"]
+    )
+    mock_backup_volume = mocker.patch("src.apschedule.tasks.backup_volume", return_value="tar-checksum")
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
+    from src.apschedule.tasks import task_create_backup
+
+    options = {"skip_unchanged": True}
+    with freeze_time("2024-01-01T00:00:00+00:00"):
+        task_create_backup("test-volume", "job_id_1", "job_name_1", options=options)
+    with freeze_time("2024-01-02T00:00:00+00:00"):
+        task_create_backup("test-volume", "job_id_2", "job_name_2", options=options)
+    with freeze_time("2024-01-03T00:00:00+00:00"):
+        task_create_backup("test-volume", "job_id_3", "job_name_3", options=options)
+
+    assert mock_backup_fingerprint.call_count == 3
+    assert mock_backup_volume.call_count == 2
+    backups = {backup.backup_id: backup for backup in session.exec(select(Backups)).all()}
+    assert backups["job_id_1"].fingerprint == "hash-1"
+    assert backups["job_id_1"].unchanged_backup_id is None
+    assert backups["job_id_2"].unchanged_backup_id == "job_id_1"
+    assert backups["job_id_2"].backup_filename == backups["job_id_1"].backup_filename
+    assert backups["job_id_2"].backup_name == "job_name_2"
+    assert backups["job_id_2"].status == BackUpStatus.Processed
+    assert backups["job_id_3"].fingerprint == "hash-2"
+    assert backups["job_id_3"].unchanged_backup_id is None
+
+
+def test_task_backup_volume_upload(mocker, session):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mocker.patch(
+        "src.apschedule.tasks.stream_backup_volume",
+        return_value=ArchiveResult(size=10, source_size=1024, checksum="abc123"),
+    )
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
+    mock_task_upload_backup = mocker.patch("src.apschedule.tasks.task_upload_backup")
+    mock_add_upload_job = mocker.patch("src.apschedule.schedule.add_upload_job")
+    from src.apschedule.tasks import task_create_backup
+
+    task_create_backup(
+        "test-volume", "job_id_1", "job_name_1", options={"upload_to": ["source-1", "source-2"]}
+    )
+
+    # the uploads are jobs of their own
+    mock_task_upload_backup.assert_not_called()
+    assert [call.args[1:] for call in mock_add_upload_job.call_args_list] == [
+        ("job_id_1", "source-1"),
+        ("job_id_1", "source-2"),
+    ]
+    backup = session.exec(select(Backups).where(Backups.backup_id == "job_id_1")).one()
+    assert backup.status == BackUpStatus.Processed
+
+
+@freeze_time(lambda: datetime.now(timezone.utc), tick=False)
+def test_task_backup_volume_parts(mocker, session):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mock_stream_backup_parts = mocker.patch(
+        "src.apschedule.tasks.stream_backup_parts",
+        return_value=[
+            (
+                f"test-volume.part00{part}.tar.gz",
+                ArchiveResult(
+                    size=10 + part,
+                    source_size=2048,
+                    checksum=f"hash-{part}",
+                    frames=[ArchiveFrame(source_offset=0, offset=0, size=10, part=part)],
+                    members=[ArchiveMember(name, "file", 1, 1, 0, 512, part)],
+                ),
+            )
+            for part, name in enumerate(["data.db", "logs.txt"])
+        ],
+    )
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
+    from src.apschedule.tasks import task_create_backup
+
+    task_create_backup("test-volume", "job_id_1", "job_name_1", options={"parts": 2})
+
+    dt_now = datetime.now(timezone.utc)
+    mock_stream_backup_parts.assert_called_once_with(
+        "test-volume",
+        "/backup",
+        f"test-volume-{dt_now.isoformat()}.tar.gz",
+        2,
+        codec=BackupCodec.GZIP,
+        codec_level=None,
+        tar_filter=TarFilter(),
+        tee=None,
+    )
+    backup = session.exec(select(Backups).where(Backups.backup_id == "job_id_1")).one()
+    assert backup.backup_filename == "test-volume.part000.tar.gz"
+    assert backup.backup_path == "/backup/test-volume.part000.tar.gz"
+    assert backup.checksum is None
+    assert backup.size == 21
+    parts = session.exec(select(BackupFilenames).order_by(BackupFilenames.part)).all()
+    assert [(part.backup_filename, part.part, part.checksum, part.size) for part in parts] == [
+        ("test-volume.part000.tar.gz", 0, "hash-0", 10),
+        ("test-volume.part001.tar.gz", 1, "hash-1", 11),
+    ]
+    assert [(member.path, member.part) for member in db_get_backup_members(session, "job_id_1", "")] == [
+        ("data.db", 0),
+        ("logs.txt", 1),
+    ]
+
+
+@freeze_time(lambda: datetime.now(timezone.utc), tick=False)
+def test_task_backup_volume_incremental_full(mocker, session, tmp_path):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mock_backup_volume = mocker.patch(
+        "src.apschedule.tasks.backup_volume", side_effect=write_snapshot
+    )
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", str(tmp_path))
+    from src.apschedule.tasks import task_create_backup
+
+    task_create_backup(
+        "test-volume", "job_id_1", "job_name_1", options={"incremental": True}
+    )
+
+    mock_backup_volume.assert_called_once_with(
+        "test-volume",
+        str(tmp_path),
+        f"test-volume-{datetime.now(timezone.utc).isoformat()}.tar.gz",
+        snapshot_file=".snapshots/test-volume.snar.new",
+        tar_filter=TarFilter(),
+    )
+    backup_db = session.exec(
+        select(Backups).where(Backups.backup_id == "job_id_1")
+    ).first()
+
+    assert backup_db.backup_level == 0
+    assert backup_db.parent_backup_id is None
+
+
+@freeze_time(lambda: datetime.now(timezone.utc), tick=False)
+def test_task_backup_volume_incremental_chain(mocker, session, tmp_path):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mocker.patch("src.apschedule.tasks.backup_volume", side_effect=write_snapshot)
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", str(tmp_path))
+    (tmp_path / ".snapshots").mkdir()
+    (tmp_path / ".snapshots" / "test-volume.snar").write_text("level-0")
+    session.add(
+        Backups(
+            backup_id="full-backup",
+            volume_name="test-volume",
+            created_at="2021-01-01T00:00:00+00:00",
+            backup_filename="test-volume-full.tar.gz",
+            status=BackUpStatus.Processed,
+            backup_level=0,
+        )
+    )
+    session.commit()
+    from src.apschedule.tasks import task_create_backup
+
+    task_create_backup(
+        "test-volume", "job_id_1", "job_name_1", options={"incremental": True}
+    )
+
+    backup_db = session.exec(
+        select(Backups).where(Backups.backup_id == "job_id_1")
+    ).first()
+
+    assert backup_db.backup_level == 1
+    assert backup_db.parent_backup_id == "full-backup"
+    assert (tmp_path / ".snapshots" / "test-volume.snar").exists()
+    assert not (tmp_path / ".snapshots" / "test-volume.snar.new").exists()
+
+
+@freeze_time(lambda: datetime.now(timezone.utc), tick=False)
+def test_task_backup_volume_incremental_max_level(mocker, session, tmp_path):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mocker.patch("src.apschedule.tasks.backup_volume", side_effect=write_snapshot)
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", str(tmp_path))
+    mocker.patch("src.apschedule.tasks.INCREMENTAL_MAX_LEVEL", 1)
+    (tmp_path / ".snapshots").mkdir()
+    (tmp_path / ".snapshots" / "test-volume.snar").write_text("level-1")
+    session.add(
+        Backups(
+            backup_id="level-1-backup",
+            volume_name="test-volume",
+            created_at="2021-01-01T00:00:00+00:00",
+            backup_filename="test-volume-level-1.tar.gz",
+            status=BackUpStatus.Processed,
+            parent_backup_id="full-backup",
+            backup_level=1,
+        )
+    )
+    session.commit()
+    from src.apschedule.tasks import task_create_backup
+
+    task_create_backup(
+        "test-volume", "job_id_1", "job_name_1", options={"incremental": True}
+    )
+
+    backup_db = session.exec(
+        select(Backups).where(Backups.backup_id == "job_id_1")
+    ).first()
+
+    assert backup_db.backup_level == 0
+    assert backup_db.parent_backup_id is None
+
+
+@freeze_time(lambda: datetime.now(timezone.utc), tick=False)
+def test_task_backup_volume_incremental_error(mocker, session, tmp_path):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mocker.patch(
+        "src.apschedule.tasks.backup_volume", side_effect=Exception("test error")
+    )
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", str(tmp_path))
+    (tmp_path / ".snapshots").mkdir()
+    (tmp_path / ".snapshots" / "test-volume.snar").write_text("level-0")
+    session.add(
+        Backups(
+            backup_id="full-backup",
+            volume_name="test-volume",
+            created_at="2021-01-01T00:00:00+00:00",
+            backup_filename="test-volume-full.tar.gz",
+            status=BackUpStatus.Processed,
+            backup_level=0,
+        )
+    )
+    session.commit()
+    from src.apschedule.tasks import task_create_backup
+
+    with pytest.raises(Exception, match="test error"):
+        task_create_backup(
+            "test-volume", "job_id_1", "job_name_1", options={"incremental": True}
+        )
+
+    assert (tmp_path / ".snapshots" / "test-volume.snar").read_text() == "level-0"
+    assert not (tmp_path / ".snapshots" / "test-volume.snar.new").exists()
+
+
+@freeze_time(lambda: datetime.now(timezone.utc), tick=False)
+def test_task_backup_volume_repository(mocker, session, tmp_path):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mock_backup_volume = mocker.patch("src.apschedule.tasks.backup_volume", return_value="tar-checksum")
+    mock_backup_volume_to_repository = mocker.patch(
+        "src.apschedule.tasks.backup_volume_to_repository",
+        **{
+            "return_value.manifest_path": Path("/backup/repository/manifests/test.json"),
+            "return_value.manifest_checksum": "abc123",
+        },
+    )
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
+    from src.apschedule.tasks import task_create_backup
+
+    task_create_backup(
+        "test-volume",
+        "job_id_1",
+        "job_name_1",
+        options={"storage_format": "Repository"},
+    )
+
+    dt_now = datetime.now(timezone.utc)
+    mock_backup_volume.assert_not_called()
+    mock_backup_volume_to_repository.assert_called_once_with(
+        session,
+        "test-volume",
+        "/backup",
+        f"test-volume-{dt_now.isoformat()}.manifest.json",
+        TarFilter(),
+    )
+    backup_db = session.exec(
+        select(Backups).where(Backups.backup_id == "job_id_1")
+    ).first()
+
+    assert backup_db.storage_format == BackupStorageFormat.Repository
+    assert backup_db.backup_filename == f"test-volume-{dt_now.isoformat()}.manifest.json"
+    assert backup_db.backup_path == "/backup/repository/manifests/test.json"
+
+
+@freeze_time(lambda: datetime.now(timezone.utc), tick=False)
+def test_task_backup_volume_codec(mocker, session):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mock_backup_volume = mocker.patch("src.apschedule.tasks.backup_volume", return_value="tar-checksum")
+    mock_stream_backup_volume = mocker.patch(
+        "src.apschedule.tasks.stream_backup_volume",
+        return_value=ArchiveResult(size=10, source_size=1024, checksum="abc123"),
+    )
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
+    from src.apschedule.tasks import task_create_backup
+
+    task_create_backup(
+        "test-volume",
+        "job_id_1",
+        "job_name_1",
+        options={"codec": "zstd", "codec_level": 10},
+    )
+
+    backup_file = f"test-volume-{datetime.now(timezone.utc).isoformat()}.tar.zst"
+    mock_backup_volume.assert_not_called()
+    mock_stream_backup_volume.assert_called_once_with(
+        "test-volume",
+        "/backup",
+        backup_file,
+        snapshot_file=None,
+        codec=BackupCodec.ZSTD,
+        codec_level=10,
+        tar_filter=TarFilter(),
+        tee=None,
+    )
+    backup_db = session.exec(
+        select(Backups).where(Backups.backup_id == "job_id_1")
+    ).first()
+
+    assert backup_db.backup_filename == backup_file
+    assert backup_db.codec == BackupCodec.ZSTD
+    assert backup_db.codec_level == 10
+
+
+def test_task_backup_volume_quiesce(mocker, session):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mock_backup_volume = mocker.patch("src.apschedule.tasks.backup_volume", return_value="tar-checksum")
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
+    mocker.patch("src.quiesce.get_volume_containers", return_value=[MockContainer()])
+    mocker.patch("src.quiesce.get_docker_client")
+    mocker.patch("src.quiesce.create_volume")
+    mocker.patch("src.quiesce.copy_volume")
+    mock_remove_volume = mocker.patch("src.quiesce.remove_volume")
+    from src.apschedule.tasks import task_create_backup
+
+    task_create_backup("test-volume", "job_id_1", "job_name_1", options={"quiesce": "pause"})
+
+    # the staging copy is archived under the name of the volume
+    assert mock_backup_volume.call_args.args[0] == "test-volume-staging-job_id_1"
+    assert mock_backup_volume.call_args.args[2].startswith("test-volume-")
+    mock_remove_volume.assert_called_once_with("test-volume-staging-job_id_1")
+    downtime = session.exec(select(ContainerDowntime)).one()
+    assert downtime.backup_id == "job_id_1"
+    assert downtime.container_name == "test-container"
+    assert downtime.quiesce == QuiesceMode.PAUSE
+    assert downtime.downtime is not None
+
+
+def test_task_backup_volume_limits(mocker, session):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    applied = []
+    mocker.patch(
+        "src.apschedule.tasks.backup_volume",
+        side_effect=lambda *args, **kwargs: applied.append(current_limits()),
+    )
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
+    mocker.patch("src.apschedule.tasks.DEFAULT_LIMITS", HelperLimits(memory="512m", nice=10))
+    from src.apschedule.tasks import task_create_backup
+
+    task_create_backup("test-volume", "job_id_1", options={"limits": {"nice": 19, "cpus": 1}})
+
+    assert applied == [HelperLimits(memory="512m", nice=19, cpus=1)]
+    backup_db = session.exec(select(Backups).where(Backups.backup_id == "job_id_1")).one()
+    assert backup_db.limits == {"memory": "512m", "nice": 19, "cpus": 1.0}
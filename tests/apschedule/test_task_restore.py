@@ -1,10 +1,26 @@
+import gzip
+import io
+import tarfile
 from datetime import datetime, timezone
 
 import pytest
 from freezegun import freeze_time
 from sqlmodel import select
 
-from src.models import Backups, RestoredBackups
+from src.models import (
+    BackupCodec,
+    BackupFilenames,
+    Backups,
+    BackupStorageFormat,
+    BackupUploads,
+    RestoredBackups,
+    SftpBackupSource,
+    UploadStatus,
+)
+from src.routes.impl.volumes.backup_index import db_add_backup_index
+from src.archive import FileSink, write_archive
+from src.tar_index import TAR_END, ArchiveMember, TarIndexer
+from tests.fixtures import MockSftpServer
 
 
 @freeze_time(lambda: datetime.now(timezone.utc), tick=False)
@@ -94,3 +110,324 @@ def test_task_restore_backup_error(mocker, session):
     assert restore_db.restore_id == "job_id_2"
     assert restore_db.error_message == "test error"
     assert restore_db.restore_name == "restore-test-volume-uuid-2"
+
+
+@freeze_time(lambda: datetime.now(timezone.utc), tick=False)
+def test_task_restore_backup_incremental_chain(mocker, session):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mock_restore_volume = mocker.patch("src.apschedule.tasks.restore_volume")
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
+    session.add_all(
+        [
+            Backups(
+                backup_id="backup-0",
+                backup_filename="test-volume-0.tar.gz",
+                volume_name="test-volume",
+                backup_level=0,
+            ),
+            Backups(
+                backup_id="backup-1",
+                backup_filename="test-volume-1.tar.gz",
+                volume_name="test-volume",
+                parent_backup_id="backup-0",
+                backup_level=1,
+            ),
+            Backups(
+                backup_id="backup-2",
+                backup_filename="test-volume-2.tar.gz",
+                volume_name="test-volume",
+                parent_backup_id="backup-1",
+                backup_level=2,
+            ),
+        ]
+    )
+    session.commit()
+
+    from src.apschedule.tasks import task_restore_backup
+
+    task_restore_backup("test-volume", "test-volume-2.tar.gz", "job_id_2")
+
+    assert mock_restore_volume.call_args_list == [
+        mocker.call("test-volume", "/backup", "test-volume-0.tar.gz", incremental=True),
+        mocker.call("test-volume", "/backup", "test-volume-1.tar.gz", incremental=True),
+        mocker.call("test-volume", "/backup", "test-volume-2.tar.gz", incremental=True),
+    ]
+    restore_db = session.exec(
+        select(RestoredBackups).where(RestoredBackups.restore_id == "job_id_2")
+    ).first()
+    assert restore_db.successful
+
+
+@freeze_time(lambda: datetime.now(timezone.utc), tick=False)
+def test_task_restore_backup_repository(mocker, session):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mock_restore_volume = mocker.patch("src.apschedule.tasks.restore_volume")
+    mock_restore_volume_from_repository = mocker.patch(
+        "src.apschedule.tasks.restore_volume_from_repository"
+    )
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
+    session.add(
+        Backups(
+            backup_id="backup-1",
+            backup_filename="test-volume.manifest.json",
+            volume_name="test-volume",
+            storage_format=BackupStorageFormat.Repository,
+        )
+    )
+    session.commit()
+
+    from src.apschedule.tasks import task_restore_backup
+
+    task_restore_backup("test-volume", "test-volume.manifest.json", "job_id_2")
+
+    mock_restore_volume.assert_not_called()
+    mock_restore_volume_from_repository.assert_called_once_with(
+        "test-volume", "/backup", "test-volume.manifest.json"
+    )
+
+
+@freeze_time(lambda: datetime.now(timezone.utc), tick=False)
+def test_task_restore_backup_codec(mocker, session):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mock_restore_volume = mocker.patch("src.apschedule.tasks.restore_volume")
+    mock_restore_volume_from_archive = mocker.patch(
+        "src.apschedule.tasks.restore_volume_from_archive"
+    )
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
+    session.add(
+        Backups(
+            backup_id="job_id_1",
+            backup_filename="test-volume.tar.zst",
+            volume_name="test-volume",
+            codec=BackupCodec.ZSTD,
+        )
+    )
+    session.commit()
+    from src.apschedule.tasks import task_restore_backup
+
+    task_restore_backup("test-volume", "test-volume.tar.zst", "job_id_2")
+
+    mock_restore_volume.assert_not_called()
+    mock_restore_volume_from_archive.assert_called_once_with(
+        "test-volume",
+        "/backup",
+        "test-volume.tar.zst",
+        BackupCodec.ZSTD,
+        incremental=False,
+    )
+
+
+def test_task_restore_backup_parts(mocker, session):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mock_restore_volume = mocker.patch("src.apschedule.tasks.restore_volume")
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
+    session.add(
+        Backups(
+            backup_id="job_id_1",
+            backup_filename="test-volume.part000.tar.gz",
+            volume_name="test-volume",
+            codec=BackupCodec.GZIP,
+        )
+    )
+    for part in range(3):
+        session.add(
+            BackupFilenames(
+                backup_filename=f"test-volume.part00{part}.tar.gz", backup_id="job_id_1", part=part
+            )
+        )
+    session.commit()
+    from src.apschedule.tasks import task_restore_backup
+
+    task_restore_backup("test-volume", "test-volume.part000.tar.gz", "job_id_2")
+
+    assert sorted(call.args for call in mock_restore_volume.call_args_list) == [
+        ("test-volume", "/backup", f"test-volume.part00{part}.tar.gz") for part in range(3)
+    ]
+
+
+def test_task_restore_backup_swap(mocker, session):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mock_restore_volume = mocker.patch("src.apschedule.tasks.restore_volume")
+    mock_swap_restore = mocker.patch("src.apschedule.tasks.swap_restore")
+    mock_swap_restore.return_value.__enter__.return_value = "test-volume-rollback-job_id_2"
+    mock_verify = mocker.patch("src.apschedule.tasks.verify_restored_volume")
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
+    session.add(Backups(backup_id="job_id_1", backup_filename="test-volume.tar.gz", volume_name="test-volume"))
+    members = [ArchiveMember("file.txt", "file", 10, 1, 0, 512)]
+    db_add_backup_index(session, "job_id_1", members, [])
+    session.commit()
+    from src.apschedule.tasks import task_restore_backup
+
+    task_restore_backup("test-volume", "test-volume.tar.gz", "job_id_2", swap=True)
+
+    mock_swap_restore.assert_called_once_with("test-volume", "job_id_2")
+    mock_restore_volume.assert_called_once_with(
+        "test-volume-rollback-job_id_2", "/backup", "test-volume.tar.gz"
+    )
+    mock_verify.assert_called_once_with("test-volume-rollback-job_id_2", members)
+    restore_db = session.exec(
+        select(RestoredBackups).where(RestoredBackups.restore_id == "job_id_2")
+    ).first()
+    assert restore_db.successful
+    assert restore_db.volume_name == "test-volume"
+    assert restore_db.rollback_volume == "test-volume-rollback-job_id_2"
+
+
+def test_task_restore_path(mocker, session, tmp_path):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mock_restore_volume_from_stream = mocker.patch(
+        "src.apschedule.tasks.restore_volume_from_stream"
+    )
+    path = tmp_path / "test-volume.tar"
+    path.write_bytes(b"h" * 512 + b"d" * 512 + b"x" * 1024)
+    session.add(
+        Backups(
+            backup_id="job_id_1",
+            backup_filename="test-volume.tar",
+            backup_path=str(path),
+            volume_name="test-volume",
+            codec=BackupCodec.NONE,
+        )
+    )
+    db_add_backup_index(
+        session,
+        "job_id_1",
+        [
+            ArchiveMember("file.txt", "file", 10, 1, 0, 512),
+            ArchiveMember("other.txt", "file", 10, 1, 1024, 1536),
+        ],
+        [],
+    )
+    session.commit()
+    from src.apschedule.tasks import task_restore_path
+
+    task_restore_path("test-volume", "job_id_1", "./file.txt", "job_id_2")
+
+    volume_name, chunks = mock_restore_volume_from_stream.call_args.args
+    assert volume_name == "test-volume"
+    assert b"".join(chunks) == b"h" * 512 + b"d" * 512 + TAR_END
+    restore_db = session.exec(
+        select(RestoredBackups).where(RestoredBackups.restore_id == "job_id_2")
+    ).first()
+    assert restore_db.successful
+    assert restore_db.backup_filename == "test-volume.tar"
+
+
+def test_task_restore_path_latin1_name(mocker, session, tmp_path):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mock_restore_volume_from_stream = mocker.patch(
+        "src.apschedule.tasks.restore_volume_from_stream"
+    )
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w", format=tarfile.GNU_FORMAT, encoding="latin-1") as tar:
+        info = tarfile.TarInfo("./café.txt")
+        info.size = 5
+        tar.addfile(info, io.BytesIO(b"hello"))
+    path = tmp_path / "test-volume.tar.gz"
+    indexer = TarIndexer()
+    result = write_archive(indexer.observe([buffer.getvalue()]), [FileSink(path)], codec=BackupCodec.GZIP)
+    session.add(
+        Backups(
+            backup_id="job_id_1",
+            backup_filename="test-volume.tar.gz",
+            backup_path=str(path),
+            volume_name="test-volume",
+            codec=BackupCodec.GZIP,
+        )
+    )
+    db_add_backup_index(session, "job_id_1", indexer.members, result.frames)
+    session.commit()
+    from src.apschedule.tasks import task_restore_path
+
+    task_restore_path("test-volume", "job_id_1", "caf\\xe9.txt", "job_id_2")
+
+    _, chunks = mock_restore_volume_from_stream.call_args.args
+    with tarfile.open(fileobj=io.BytesIO(b"".join(chunks)), encoding="latin-1") as tar:
+        assert tar.getnames() == ["./café.txt"]
+        assert tar.extractfile("./café.txt").read() == b"hello"
+    restore_db = session.exec(
+        select(RestoredBackups).where(RestoredBackups.restore_id == "job_id_2")
+    ).first()
+    assert restore_db.successful
+
+
+def test_task_restore_backup_from_source(mocker, session):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mock_restore_volume = mocker.patch("src.apschedule.tasks.restore_volume")
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", "/backup")
+    restored = []
+    mocker.patch(
+        "src.apschedule.tasks.restore_volume_from_stream",
+        side_effect=lambda volume_name, chunks, incremental: restored.append(b"".join(chunks)),
+    )
+    server = MockSftpServer()
+    mocker.patch("src.sftp.connect", side_effect=server.connect)
+    data = bytes(range(256)) * 4000
+    server.files["/backups/test-volume.tar.gz"] = bytearray(gzip.compress(data))
+    source = SftpBackupSource(
+        name="nas",
+        hostname="nas.local",
+        port=22,
+        username="backup",
+        password="secret",
+        remote_path="/backups",
+    )
+    session.add(source)
+    session.add(
+        Backups(
+            backup_id="job_id_1",
+            backup_filename="test-volume.tar.gz",
+            volume_name="test-volume",
+            codec=BackupCodec.GZIP,
+        )
+    )
+    session.add(
+        BackupUploads(
+            backup_id="job_id_1",
+            source_id=str(source.id),
+            backup_filename="test-volume.tar.gz",
+            remote_path="/backups/test-volume.tar.gz",
+            status=UploadStatus.Uploaded,
+            size=len(server.files["/backups/test-volume.tar.gz"]),
+        )
+    )
+    session.commit()
+    from src.apschedule.tasks import task_restore_backup
+
+    task_restore_backup("test-volume", "test-volume.tar.gz", "job_id_2", source_id=str(source.id))
+
+    mock_restore_volume.assert_not_called()
+    assert restored == [data]
+    restore_db = session.exec(
+        select(RestoredBackups).where(RestoredBackups.restore_id == "job_id_2")
+    ).one()
+    assert restore_db.successful
+
+    session.exec(select(BackupUploads)).one().status = UploadStatus.Failed
+    session.commit()
+    with pytest.raises(ValueError, match="isn't uploaded to backup source nas"):
+        task_restore_backup("test-volume", "test-volume.tar.gz", "job_id_3", source_id=str(source.id))
@@ -0,0 +1,181 @@
+from functools import partial
+
+import hashlib
+
+import pytest
+from sqlmodel import select
+
+from src.archive import ArchiveResult
+from src.models import (
+    Backups,
+    BackUpStatus,
+    BackupUploads,
+    SftpBackupSource,
+    UploadStatus,
+    UploadVerifyMethod,
+)
+from src.sftp import upload_file
+from tests.fixtures import MockSftpServer
+
+DATA = bytes(range(256)) * 1000
+
+
+def add_backup(session, tmp_path):
+    path = tmp_path / "test-volume.tar.gz"
+    path.write_bytes(DATA)
+    session.add(
+        Backups(
+            backup_id="backup-1",
+            backup_filename="test-volume.tar.gz",
+            backup_path=str(path),
+            volume_name="test-volume",
+            status=BackUpStatus.Processed,
+        )
+    )
+    source = SftpBackupSource(
+        name="nas",
+        hostname="nas.local",
+        port=22,
+        username="backup",
+        password="secret",
+        remote_path="/backups",
+    )
+    session.add(source)
+    session.commit()
+    return str(source.id)
+
+
+def test_task_upload_backup(mocker, session, tmp_path):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    server = MockSftpServer()
+    mocker.patch("src.sftp.connect", side_effect=server.connect)
+    source_id = add_backup(session, tmp_path)
+    from src.apschedule.tasks import task_upload_backup
+
+    task_upload_backup("backup-1", source_id, "upload-1")
+
+    assert bytes(server.files["/backups/test-volume.tar.gz"]) == DATA
+    upload = session.exec(select(BackupUploads)).one()
+    assert upload.status == UploadStatus.Uploaded
+    assert upload.remote_path == "/backups/test-volume.tar.gz"
+    assert upload.confirmed_bytes == upload.size == len(DATA)
+    assert upload.throughput > 0
+    # the backup has no checksum yet so the upload is checked against the local archive
+    assert upload.verified
+    assert upload.verify_method == UploadVerifyMethod.Sampled
+
+
+def test_task_upload_backup_resumed(mocker, session, tmp_path):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mocker.patch("src.apschedule.tasks.SFTP_UPLOAD_RETRIES", 0)
+    mocker.patch(
+        "src.apschedule.tasks.upload_file",
+        partial(upload_file, streams=1, chunk_size=32 * 1024),
+    )
+    server = MockSftpServer(fail_after_writes=3)
+    mocker.patch("src.sftp.connect", side_effect=server.connect)
+    source_id = add_backup(session, tmp_path)
+    from src.apschedule.tasks import task_upload_backup
+
+    with pytest.raises(EOFError):
+        task_upload_backup("backup-1", source_id, "upload-1")
+
+    upload = session.exec(select(BackupUploads)).one()
+    assert upload.status == UploadStatus.Failed
+    assert upload.error_message == "connection dropped"
+    assert upload.confirmed_bytes == 3 * 32 * 1024
+
+    server.fail_after_writes = None
+    server.writes = 0
+    task_upload_backup("backup-1", source_id, "upload-2")
+
+    upload = session.exec(select(BackupUploads)).one()
+    assert upload.status == UploadStatus.Uploaded
+    assert server.writes == 5
+    assert bytes(server.files["/backups/test-volume.tar.gz"]) == DATA
+
+
+def test_task_create_backup_teed(mocker, session, tmp_path):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", str(tmp_path))
+    server = MockSftpServer()
+    mocker.patch("src.sftp.connect", side_effect=server.connect)
+    source = SftpBackupSource(
+        name="nas",
+        hostname="nas.local",
+        port=22,
+        username="backup",
+        password="secret",
+        remote_path="/backups",
+    )
+    session.add(source)
+    session.commit()
+
+    def stream_backup_volume(volume_name, backup_dir, filename, tee=None, **kwargs):
+        sinks = tee(filename)
+        (tmp_path / filename).write_bytes(DATA)
+        for sink in sinks:
+            sink.write(DATA)
+            sink.close()
+        return ArchiveResult(size=len(DATA), source_size=len(DATA), checksum="abc123")
+
+    mocker.patch("src.apschedule.tasks.stream_backup_volume", side_effect=stream_backup_volume)
+    mock_add_upload_job = mocker.patch("src.apschedule.schedule.add_upload_job")
+    from src.apschedule.tasks import task_create_backup, task_upload_backup
+
+    task_create_backup("test-volume", "backup-1", options={"upload_to": [str(source.id)]})
+    mock_add_upload_job.assert_called_once()
+    task_upload_backup(*mock_add_upload_job.call_args.args[1:], "upload-1")
+
+    upload = session.exec(select(BackupUploads)).one()
+    assert upload.status == UploadStatus.Uploaded
+    assert upload.confirmed_bytes == upload.size == len(DATA)
+    assert bytes(server.files[upload.remote_path]) == DATA
+    # the upload after the backup has nothing left to send
+    assert server.writes == 1
+
+
+def test_task_verify_uploads(mocker, session, tmp_path):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    server = MockSftpServer()
+    mocker.patch("src.sftp.connect", side_effect=server.connect)
+    source_id = add_backup(session, tmp_path)
+    session.exec(select(Backups)).one().checksum = hashlib.sha256(DATA).hexdigest()
+    session.add(
+        BackupUploads(
+            backup_id="backup-1",
+            source_id=source_id,
+            backup_filename="test-volume.tar.gz",
+            remote_path="/backups/test-volume.tar.gz",
+            status=UploadStatus.Uploaded,
+            size=len(DATA),
+        )
+    )
+    session.commit()
+    server.files["/backups/test-volume.tar.gz"] = bytearray(DATA)
+    from src.apschedule.tasks import task_verify_uploads
+
+    task_verify_uploads("verify-1", ["backup-1"])
+
+    upload = session.exec(select(BackupUploads)).one()
+    assert upload.verified
+    assert upload.verify_method == UploadVerifyMethod.Hash
+    assert upload.remote_checksum == hashlib.sha256(DATA).hexdigest()
+    assert upload.verified_at
+
+    del server.files["/backups/test-volume.tar.gz"]
+    task_verify_uploads("verify-2", source_ids=[source_id])
+
+    assert session.exec(select(BackupUploads)).one().verified is False
@@ -0,0 +1,83 @@
+import hashlib
+
+from sqlmodel import select
+
+from src.models import Backups, BackUpStatus
+from src.verify import verify_backup
+
+
+def test_task_verify_backups(mocker, session, tmp_path):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", str(tmp_path))
+    mocker.patch("src.apschedule.tasks.VERIFY_MAX_RATE", 0)
+    for backup_id, data in [("backup-1", b"a" * 1024), ("backup-2", b"b" * 1024)]:
+        path = tmp_path / f"{backup_id}.tar.gz"
+        path.write_bytes(data)
+        session.add(
+            Backups(
+                backup_id=backup_id,
+                backup_path=str(path),
+                checksum=hashlib.sha256(b"a" * 1024).hexdigest(),
+                size=1024,
+                status=BackUpStatus.Processed,
+            )
+        )
+    (tmp_path / "backup-3.tar.gz").write_bytes(b"c" * 1024)
+    session.add(
+        Backups(
+            backup_id="backup-3",
+            backup_path=str(tmp_path / "backup-3.tar.gz"),
+            status=BackUpStatus.Processed,
+        )
+    )
+    session.commit()
+    from src.apschedule.tasks import task_verify_backups
+
+    task_verify_backups("verify-1")
+
+    backups = {
+        backup.backup_id: backup for backup in session.exec(select(Backups)).all()
+    }
+    assert backups["backup-1"].verified is True
+    assert backups["backup-2"].verified is False
+    # no checksum to compare with
+    assert backups["backup-3"].verified is None
+    assert backups["backup-3"].checksum is None
+
+
+def test_task_verify_unchanged_backup(mocker, session, tmp_path):
+    mocker.patch(
+        "src.apschedule.tasks.Session",
+        **{"return_value.__enter__.return_value": session},
+    )
+    mocker.patch("src.apschedule.tasks.BACKUP_DIR", str(tmp_path))
+    mocker.patch("src.apschedule.tasks.VERIFY_MAX_RATE", 0)
+    mock_verify_backup = mocker.patch("src.apschedule.tasks.verify_backup", wraps=verify_backup)
+    path = tmp_path / "backup-1.tar.gz"
+    path.write_bytes(b"a" * 1024)
+    for backup_id, unchanged_backup_id in [("backup-1", None), ("backup-2", "backup-1")]:
+        session.add(
+            Backups(
+                backup_id=backup_id,
+                backup_path=str(path),
+                checksum=None if unchanged_backup_id else hashlib.sha256(b"a" * 1024).hexdigest(),
+                size=1024,
+                status=BackUpStatus.Processed,
+                unchanged_backup_id=unchanged_backup_id,
+            )
+        )
+    session.commit()
+    from src.apschedule.tasks import task_verify_backups
+
+    task_verify_backups("verify-1", ["backup-2"])
+
+    mock_verify_backup.assert_called_once()
+    backups = {
+        backup.backup_id: backup for backup in session.exec(select(Backups)).all()
+    }
+    assert backups["backup-1"].verified is True
+    assert backups["backup-2"].verified is True
+    assert backups["backup-2"].checksum == hashlib.sha256(b"a" * 1024).hexdigest()
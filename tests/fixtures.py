@@ -1,4 +1,10 @@
+import hashlib
+import shlex
+import threading
 from datetime import datetime
+from types import SimpleNamespace
+
+from src.sftp import SftpConnection
 
 
 class MockVolume:
@@ -6,6 +12,7 @@ class MockVolume:
         self, name="test-volume", labels=None, mountpoint="/test-volume", options=None
     ) -> None:
         self.name = name
+        self.driver = "local"
         self.labels = labels or {}
         self.mountpoint = mountpoint
         self.options = options or {}
@@ -17,3 +24,131 @@ class MockAsyncResult:
     def __init__(self, result="", id="test-task-id") -> None:
         self.result = result
         self.id = id
+
+
+class MockContainer:
+    def __init__(self, id="test-container-id", name="test-container") -> None:
+        self.id = id
+        self.name = name
+
+
+class MockSftpServer:
+    """
+    in process stand-in for a sftp server, fail_after_writes drops the connection after that
+    many writes
+    """
+
+    def __init__(self, fail_after_writes=None) -> None:
+        self.files = {}
+        # writes wait while it's cleared, like a remote that stopped taking data
+        self.accepting = threading.Event()
+        self.accepting.set()
+        self.writes = 0
+        self.connections = 0
+        # accept commands over ssh but run an sftp server for them, like ForceCommand internal-sftp
+        self.sftp_only = False
+        self.commands = []
+        self.open_channels = 0
+        self.max_open_channels = 0
+        self.fail_after_writes = fail_after_writes
+        self.lock = threading.Lock()
+
+    def connect(self, *args, channels=None):
+        self.connections += 1
+        return MockSftpConnection(self, channels)
+
+
+class MockTransport:
+    def __init__(self) -> None:
+        self.active = True
+
+    def is_active(self):
+        return self.active
+
+    def close(self):
+        self.active = False
+
+
+class MockSftpConnection(SftpConnection):
+    def __init__(self, server, channels=None) -> None:
+        super().__init__(MockTransport(), channels)
+        self.server = server
+
+    def open_sftp(self):
+        with self.server.lock:
+            self.server.open_channels += 1
+            self.server.max_open_channels = max(self.server.max_open_channels, self.server.open_channels)
+        return MockSftpClient(self.server)
+
+    def run(self, command):
+        self.server.commands.append(command)
+        if self.server.sftp_only:
+            # the sftp server ends on the eof of its input without printing anything
+            return 0, b""
+        path = shlex.split(command)[-1]
+        if not command.startswith("sha256sum ") or path not in self.server.files:
+            return 1, b""
+        return 0, f"{hashlib.sha256(self.server.files[path]).hexdigest()}  {path}\n".encode()
+
+
+class MockSftpFile:
+    def __init__(self, server, path) -> None:
+        self.server = server
+        self.path = path
+        self.offset = 0
+
+    def set_pipelined(self, pipelined):
+        pass
+
+    def seek(self, offset):
+        self.offset = offset
+
+    def write(self, data):
+        self.server.accepting.wait()
+        with self.server.lock:
+            if self.server.fail_after_writes is not None:
+                if self.server.writes >= self.server.fail_after_writes:
+                    raise EOFError("connection dropped")
+            self.server.writes += 1
+            content = self.server.files[self.path]
+            if len(content) < self.offset:
+                content.extend(bytes(self.offset - len(content)))
+            content[self.offset : self.offset + len(data)] = data
+        self.offset += len(data)
+
+    def readv(self, chunks):
+        for offset, size in chunks:
+            yield bytes(self.server.files[self.path][offset : offset + size])
+
+    def close(self):
+        pass
+
+
+class MockSftpClient:
+    def __init__(self, server) -> None:
+        self.server = server
+
+    def open(self, path, mode="r"):
+        with self.server.lock:
+            if "w" in mode:
+                self.server.files[path] = bytearray()
+            elif path not in self.server.files:
+                raise FileNotFoundError(path)
+        return MockSftpFile(self.server, path)
+
+    def stat(self, path):
+        if path not in self.server.files:
+            raise FileNotFoundError(path)
+        return SimpleNamespace(st_size=len(self.server.files[path]))
+
+    def posix_rename(self, source, dest):
+        with self.server.lock:
+            self.server.files[dest] = self.server.files.pop(source)
+
+    def remove(self, path):
+        with self.server.lock:
+            del self.server.files[path]
+
+    def close(self):
+        with self.server.lock:
+            self.server.open_channels -= 1
@@ -1,5 +1,5 @@
 from src.models import RestoredBackups
-from tests.fixtures import MockAsyncResult
+from tests.fixtures import MockAsyncResult, MockVolume
 
 
 def test_get_restored_volume(client, session):
@@ -25,6 +25,7 @@ def test_get_restored_volume(client, session):
             "volume_name": "test-volume",
             "successful": True,
             "error_message": None,
+            "rollback_volume": None,
             "backup_filename": "test-restore-id-1.tar.gz",
             "created_at": "2021-01-01T00:00:00+00:00",
         },
@@ -34,6 +35,7 @@ def test_get_restored_volume(client, session):
             "volume_name": "test-volume",
             "successful": True,
             "error_message": None,
+            "rollback_volume": None,
             "backup_filename": "test-restore-id-2.tar.gz",
             "created_at": "2021-01-01T00:00:00+00:00",
         },
@@ -73,6 +75,7 @@ def test_get_restored_volume_filter_created_at(client, session):
             "volume_name": "test-volume",
             "restore_name": "test-restore-name",
             "error_message": None,
+            "rollback_volume": None,
             "created_at": "2021-01-01T00:00:00+00:00",
             "restore_id": "test-restore-id-1",
             "successful": True,
@@ -250,5 +253,31 @@ def test_restore_backup(mocker, client):
         "restore_id": "test-task-id",
     }
     mock_create_volume_backup.assert_called_once_with(
-        "restore-test-volume-test-uuid", "test-volume", "test-backup-name.tar.gz"
+        "restore-test-volume-test-uuid",
+        "test-volume",
+        "test-backup-name.tar.gz",
+        swap=False,
+        source_id=None,
     )
+
+
+def test_rollback_restore(mocker, client, session):
+    session.add(
+        RestoredBackups(
+            restore_id="restore-id-1",
+            volume_name="test-volume",
+            rollback_volume="test-volume-rollback-restore-",
+        )
+    )
+    session.add(RestoredBackups(restore_id="restore-id-2", volume_name="test-volume"))
+    session.commit()
+    mocker.patch("src.routes.api.get_volume", return_value=MockVolume())
+    mock_swap_volumes = mocker.patch("src.routes.api.swap_volumes")
+
+    response = client.post("/api/volumes/restore/restore-id-1/rollback")
+
+    assert response.status_code == 200
+    assert response.json()["rollback_volume"] == "test-volume-rollback-restore-"
+    mock_swap_volumes.assert_called_once_with("test-volume", "test-volume-rollback-restore-")
+    assert client.post("/api/volumes/restore/restore-id-2/rollback").status_code == 409
+    assert client.post("/api/volumes/restore/restore-id-3/rollback").status_code == 404
@@ -1,7 +1,21 @@
+import pytest
 from apscheduler.jobstores.base import JobLookupError
 
 from src.db import Backups
-from src.models import BackupSchedule, ScheduleCrontab
+from src.models import (
+    BackupCodec,
+    BackupOptions,
+    BackupSchedule,
+    BackUpStatus,
+    BackupUploads,
+    ContainerDowntime,
+    QuiesceMode,
+    ScheduleCrontab,
+    SftpBackupSource,
+    UploadStatus,
+)
+from src.routes.impl.volumes.backup_index import db_add_backup_index
+from src.tar_index import TAR_END, ArchiveMember
 from tests.fixtures import MockAsyncResult, MockVolume
 
 
@@ -120,6 +134,7 @@ def test_create_backup(mocker, client):
     mock_create_volume_backup.assert_called_once_with(
         "backup-test-volume-test-uuid",
         "test-volume",
+        options=None,
     )
 
 
@@ -183,6 +198,7 @@ def test_create_schedule(mocker, client):
             "seconds": "*",
             "day_of_week": "*",
         },
+        "options": None,
     }
     mock_get_volume.assert_called_once_with("test-volume")
     mock_create_volume_backup.assert_called_once_with(
@@ -190,6 +206,7 @@ def test_create_schedule(mocker, client):
         "test-volume",
         ScheduleCrontab(minute="1", hour="2", day="*", month="*", day_of_week="*"),
         is_schedule=True,
+        options=None,
     )
 
 
@@ -219,6 +236,7 @@ def test_get_schedule(mocker, client):
             "seconds": "*",
             "day_of_week": "*",
         },
+        "options": None,
     }
     mock_get_schedule.assert_called_once_with("test-schedule")
 
@@ -263,6 +281,7 @@ def test_list_schedule(mocker, client):
                 "seconds": "*",
                 "day_of_week": "*",
             },
+            "options": None,
         }
     ]
     mock_list_schedule.assert_called_once_with()
@@ -287,3 +306,543 @@ def test_remove_schedule_not_found(mocker, client):
     assert response.status_code == 404
     assert response.json() == {"detail": "Schedule job test-schedule does not exist"}
     mock_remove_schedule.assert_called_once_with("test-schedule")
+
+
+def test_create_backup_incremental(mocker, client):
+    mocker.patch("src.routes.api.uuid", **{"uuid4.return_value": "test-uuid"})
+    mocker.patch("src.routes.api.get_volume", return_value=MockVolume())
+    mocker.patch("src.routes.api.is_volume_attached", return_value=True)
+    mock_create_volume_backup = mocker.patch(
+        "src.routes.api.add_backup_job",
+        return_value=MockAsyncResult(),
+    )
+
+    response = client.post(
+        "/api/volumes/backup/test-volume", json={"incremental": True}
+    )
+    assert response.status_code == 200
+    mock_create_volume_backup.assert_called_once_with(
+        "backup-test-volume-test-uuid",
+        "test-volume",
+        options=BackupOptions(incremental=True),
+    )
+
+
+def test_create_backup_incremental_repository(mocker, client):
+    mocker.patch("src.routes.api.get_volume", return_value=MockVolume())
+    mocker.patch("src.routes.api.is_volume_attached", return_value=True)
+    mock_create_volume_backup = mocker.patch("src.routes.api.add_backup_job")
+
+    response = client.post(
+        "/api/volumes/backup/test-volume",
+        json={"incremental": True, "storage_format": "Repository"},
+    )
+    assert response.status_code == 422
+    assert (
+        response.json()["detail"][0]["msg"]
+        == "Value error, incremental backups can only be stored as an archive"
+    )
+    mock_create_volume_backup.assert_not_called()
+
+
+def test_create_backup_upload_to_repository(mocker, client):
+    mocker.patch("src.routes.api.get_volume", return_value=MockVolume())
+    mocker.patch("src.routes.api.is_volume_attached", return_value=True)
+    mock_create_volume_backup = mocker.patch("src.routes.api.add_backup_job")
+
+    response = client.post(
+        "/api/volumes/backup/test-volume",
+        json={"upload_to": ["source-1"], "storage_format": "Repository"},
+    )
+    assert response.status_code == 422
+    assert (
+        response.json()["detail"][0]["msg"]
+        == "Value error, only backups stored as an archive can be uploaded to backup sources"
+    )
+    mock_create_volume_backup.assert_not_called()
+
+
+def test_create_backup_codec_level_out_of_range(mocker, client):
+    mocker.patch("src.routes.api.get_volume", return_value=MockVolume())
+    mocker.patch("src.routes.api.is_volume_attached", return_value=True)
+    mock_create_volume_backup = mocker.patch("src.routes.api.add_backup_job")
+
+    response = client.post(
+        "/api/volumes/backup/test-volume",
+        json={"codec": "zstd", "codec_level": 23},
+    )
+    assert response.status_code == 422
+    assert (
+        response.json()["detail"][0]["msg"]
+        == "Value error, compression level for zstd must be between 1 and 22"
+    )
+    mock_create_volume_backup.assert_not_called()
+
+
+def test_create_batch_backup(mocker, client):
+    mocker.patch("src.routes.api.uuid", **{"uuid4.return_value": "test-uuid"})
+    mocker.patch(
+        "src.routes.impl.volumes.volumes.get_volume", return_value=MockVolume()
+    )
+    mocker.patch(
+        "src.routes.impl.volumes.volumes.is_volume_attached", return_value=True
+    )
+    mock_create_volume_backup = mocker.patch(
+        "src.routes.api.add_backup_job",
+        side_effect=[MockAsyncResult(id="task-1"), MockAsyncResult(id="task-2")],
+    )
+
+    response = client.post(
+        "/api/volumes/backup",
+        json={"volume_names": ["volume-1", "volume-2", "volume-1"]},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {"backup_id": "task-1", "volume_name": "volume-1"},
+        {"backup_id": "task-2", "volume_name": "volume-2"},
+    ]
+    assert mock_create_volume_backup.call_args_list == [
+        mocker.call("backup-volume-1-test-uuid", "volume-1", options=None),
+        mocker.call("backup-volume-2-test-uuid", "volume-2", options=None),
+    ]
+
+
+def test_create_batch_backup_volume_not_found(mocker, client):
+    mocker.patch(
+        "src.routes.impl.volumes.volumes.get_volume",
+        side_effect=lambda name: MockVolume(name) if name == "volume-1" else None,
+    )
+    mocker.patch(
+        "src.routes.impl.volumes.volumes.is_volume_attached", return_value=True
+    )
+    mock_create_volume_backup = mocker.patch("src.routes.api.add_backup_job")
+
+    response = client.post(
+        "/api/volumes/backup", json={"volume_names": ["volume-1", "volume-2"]}
+    )
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Volumes volume-2 do not exist"}
+    mock_create_volume_backup.assert_not_called()
+
+
+def test_create_batch_backup_volume_attached(mocker, client):
+    mocker.patch(
+        "src.routes.impl.volumes.volumes.get_volume", return_value=MockVolume()
+    )
+    mocker.patch(
+        "src.routes.impl.volumes.volumes.is_volume_attached",
+        side_effect=lambda name: name != "volume-2",
+    )
+    mock_create_volume_backup = mocker.patch("src.routes.api.add_backup_job")
+
+    response = client.post(
+        "/api/volumes/backup", json={"volume_names": ["volume-1", "volume-2"]}
+    )
+
+    assert response.status_code == 409
+    assert response.json() == {
+        "detail": "Volumes volume-2 are attached to a container"
+    }
+    mock_create_volume_backup.assert_not_called()
+
+
+def test_verify_backups(mocker, client):
+    mock_add_verify_job = mocker.patch(
+        "src.routes.api.add_verify_job", return_value=MockAsyncResult(id="verify-1")
+    )
+    mocker.patch("src.routes.api.uuid", **{"uuid4.return_value": "test-uuid"})
+
+    response = client.post("/api/volumes/verify", json={"backup_ids": ["backup-1"]})
+
+    assert response.status_code == 200
+    assert response.json() == {"verify_id": "verify-1"}
+    mock_add_verify_job.assert_called_once_with("verify-test-uuid", ["backup-1"])
+
+
+def test_verify_uploads(mocker, client):
+    mock_add_verify_uploads_job = mocker.patch(
+        "src.routes.api.add_verify_uploads_job", return_value=MockAsyncResult(id="verify-1")
+    )
+    mocker.patch("src.routes.api.uuid", **{"uuid4.return_value": "test-uuid"})
+
+    response = client.post("/api/volumes/verify/uploads", json={"source_ids": ["source-1"]})
+
+    assert response.status_code == 200
+    assert response.json() == {"verify_id": "verify-1"}
+    mock_add_verify_uploads_job.assert_called_once_with("verify-uploads-test-uuid", None, ["source-1"])
+
+
+def test_upload_backup(mocker, client, session):
+    mock_add_upload_job = mocker.patch(
+        "src.routes.api.add_upload_job", return_value=MockAsyncResult(id="upload-1")
+    )
+    mocker.patch("src.routes.api.uuid", **{"uuid4.return_value": "test-uuid"})
+    source = SftpBackupSource(
+        name="nas", hostname="nas.local", port=22, username="backup", password="secret", remote_path="/b"
+    )
+    session.add(source)
+    session.add(
+        Backups(backup_id="backup-1", backup_filename="test-volume.tar.gz", status=BackUpStatus.Processed)
+    )
+    session.commit()
+
+    response = client.post(f"/api/volumes/backup/backup-1/upload/{source.id}")
+
+    assert response.status_code == 200
+    assert response.json() == {"upload_id": "upload-1"}
+    mock_add_upload_job.assert_called_once_with("upload-test-uuid", "backup-1", str(source.id))
+
+    response = client.post("/api/volumes/backup/backup-1/upload/unknown-source")
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Backup source unknown-source does not exist"}
+
+
+@pytest.mark.parametrize("status", [BackUpStatus.InProgress, BackUpStatus.Errored])
+def test_upload_backup_not_processed(mocker, client, session, status):
+    mock_add_upload_job = mocker.patch("src.routes.api.add_upload_job")
+    source = SftpBackupSource(
+        name="nas", hostname="nas.local", port=22, username="backup", password="secret", remote_path="/b"
+    )
+    session.add(source)
+    session.add(Backups(backup_id="backup-1", status=status))
+    session.commit()
+
+    response = client.post(f"/api/volumes/backup/backup-1/upload/{source.id}")
+
+    assert response.status_code == 409
+    assert response.json() == {
+        "detail": "Backup backup-1 isn't processed, only finished backups can be uploaded"
+    }
+    mock_add_upload_job.assert_not_called()
+
+
+def test_list_backup_uploads(client, session):
+    session.add(Backups(backup_id="backup-1", backup_filename="test-volume.tar.gz"))
+    session.add(
+        BackupUploads(
+            backup_id="backup-1",
+            source_id="source-1",
+            backup_filename="test-volume.tar.gz",
+            remote_path="/b/test-volume.tar.gz",
+            status=UploadStatus.Failed,
+            size=100,
+            confirmed_bytes=40,
+        )
+    )
+    session.commit()
+
+    response = client.get("/api/volumes/backup/backup-1/uploads")
+
+    assert response.status_code == 200
+    assert [(upload["status"], upload["confirmed_bytes"]) for upload in response.json()] == [
+        ("Failed", 40)
+    ]
+
+
+def test_download_backup_files(client, session, tmp_path):
+    path = tmp_path / "test-volume.tar"
+    path.write_bytes(b"h" * 512 + b"hello" + b"\0" * 507)
+    session.add(
+        Backups(
+            backup_id="backup-1",
+            backup_filename="test-volume.tar",
+            backup_path=str(path),
+            codec=BackupCodec.NONE,
+        )
+    )
+    db_add_backup_index(session, "backup-1", [ArchiveMember("dir/file.txt", "file", 5, 1, 0, 512)], [])
+    session.commit()
+
+    response = client.get("/api/volumes/backup/backup-1/files/download", params={"path": "dir/file.txt"})
+    assert response.status_code == 200
+    assert response.content == b"hello"
+
+    response = client.get("/api/volumes/backup/backup-1/files/download", params={"path": "dir"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-tar"
+    assert response.content == path.read_bytes() + TAR_END
+
+    response = client.get("/api/volumes/backup/backup-1/files/download", params={"path": "missing"})
+    assert response.status_code == 404
+
+
+def test_download_backup_file_name(client, session, tmp_path):
+    path = tmp_path / "test-volume.tar"
+    path.write_bytes(b"h" * 512 + b"hello" + b"\0" * 507)
+    session.add(
+        Backups(
+            backup_id="backup-1",
+            backup_filename="test-volume.tar",
+            backup_path=str(path),
+            codec=BackupCodec.NONE,
+        )
+    )
+    name = 'Grüße "a";b 日本.txt'
+    db_add_backup_index(session, "backup-1", [ArchiveMember(f"dir/{name}", "file", 5, 1, 0, 512)], [])
+    session.commit()
+
+    response = client.get("/api/volumes/backup/backup-1/files/download", params={"path": f"dir/{name}"})
+
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == (
+        'attachment; filename="Gr__e _a__b __.txt"; '
+        "filename*=UTF-8''Gr%C3%BC%C3%9Fe%20%22a%22%3Bb%20%E6%97%A5%E6%9C%AC.txt"
+    )
+
+
+def test_download_backup_file_latin1_name(client, session, tmp_path):
+    path = tmp_path / "test-volume.tar"
+    path.write_bytes(b"h" * 512 + b"hello" + b"\0" * 507)
+    session.add(
+        Backups(
+            backup_id="backup-1",
+            backup_filename="test-volume.tar",
+            backup_path=str(path),
+            codec=BackupCodec.NONE,
+        )
+    )
+    # what the tar indexer makes of the latin-1 name b"dir/caf\xe9.txt"
+    name = b"dir/caf\xe9.txt".decode("utf-8", "surrogateescape")
+    db_add_backup_index(session, "backup-1", [ArchiveMember(name, "file", 5, 1, 0, 512)], [])
+    session.commit()
+
+    response = client.get("/api/volumes/backup/backup-1/files", params={"path": "dir"})
+    assert [entry["path"] for entry in response.json()["entries"]] == ["dir/caf\\xe9.txt"]
+
+    response = client.get(
+        "/api/volumes/backup/backup-1/files/download", params={"path": "dir/caf\\xe9.txt"}
+    )
+    assert response.status_code == 200
+    assert response.content == b"hello"
+    assert response.headers["content-disposition"] == (
+        "attachment; filename=\"caf_.txt\"; filename*=UTF-8''caf%E9.txt"
+    )
+
+
+def test_restore_backup_path(mocker, client, session):
+    session.add(Backups(backup_id="backup-1", backup_filename="test-volume.tar.gz"))
+    db_add_backup_index(session, "backup-1", [ArchiveMember("file.txt", "file", 5, 1, 0, 512)], [])
+    session.commit()
+    mock_add_restore_path_job = mocker.patch(
+        "src.routes.api.add_restore_path_job", return_value=MockAsyncResult(id="restore-1")
+    )
+    mocker.patch("src.routes.api.uuid", **{"uuid4.return_value": "test-uuid"})
+
+    response = client.post(
+        "/api/volumes/backup/backup-1/restore-path",
+        json={"path": "file.txt", "volume_name": "test-volume"},
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"restore_id": "restore-1", "volume_name": "test-volume"}
+    mock_add_restore_path_job.assert_called_once_with(
+        "restore-test-volume-test-uuid", "test-volume", "backup-1", "file.txt"
+    )
+
+
+def test_list_backup_files(client, session):
+    session.add(Backups(backup_id="backup-1", backup_filename="test-volume.tar.gz"))
+    db_add_backup_index(
+        session,
+        "backup-1",
+        [
+            ArchiveMember("app", "dir", 0, 1, 0, 512),
+            ArchiveMember("app/config.yml", "file", 100, 2, 512, 1024),
+            ArchiveMember("app/data/db.sqlite", "file", 1000, 3, 1536, 2048),
+            ArchiveMember("app/data-old/db.sqlite", "file", 10, 3, 3072, 3584),
+            ArchiveMember("readme.md", "file", 5, 4, 4096, 4608),
+        ],
+        [],
+    )
+    session.commit()
+
+    response = client.get("/api/volumes/backup/backup-1/files")
+    assert response.status_code == 200
+    assert response.json() == {
+        "path": "",
+        "entries": [
+            {
+                "name": "app",
+                "path": "app",
+                "member_type": "dir",
+                "file_count": 3,
+                "size": 1110,
+                "mtime": 1,
+            },
+            {
+                "name": "readme.md",
+                "path": "readme.md",
+                "member_type": "file",
+                "file_count": 1,
+                "size": 5,
+                "mtime": 4,
+            },
+        ],
+        "next_after": None,
+    }
+
+    response = client.get("/api/volumes/backup/backup-1/files", params={"path": "app", "limit": 2})
+    page = response.json()
+    # data only exists as a parent of other members
+    assert [(entry["name"], entry["member_type"]) for entry in page["entries"]] == [
+        ("config.yml", "file"),
+        ("data", "dir"),
+    ]
+    assert page["next_after"] == "data"
+
+    response = client.get(
+        "/api/volumes/backup/backup-1/files",
+        params={"path": "app", "limit": 2, "after": page["next_after"]},
+    )
+    page = response.json()
+    assert [entry["path"] for entry in page["entries"]] == ["app/data-old"]
+    assert page["next_after"] is None
+
+    response = client.get("/api/volumes/backup/backup-1/files", params={"path": "app", "prefix": "data"})
+    assert [entry["name"] for entry in response.json()["entries"]] == ["data", "data-old"]
+
+
+def test_list_backup_files_unchanged_backup(client, session):
+    session.add(Backups(backup_id="backup-1", backup_filename="test-volume.tar.gz"))
+    session.add(
+        Backups(
+            backup_id="backup-2",
+            backup_filename="test-volume.tar.gz",
+            unchanged_backup_id="backup-1",
+        )
+    )
+    db_add_backup_index(session, "backup-1", [ArchiveMember("readme.md", "file", 5, 4, 0, 512)], [])
+    session.commit()
+
+    response = client.get("/api/volumes/backup/backup-2/files")
+
+    assert response.status_code == 200
+    assert [entry["path"] for entry in response.json()["entries"]] == ["readme.md"]
+
+
+def test_list_backup_files_no_index(client, session):
+    session.add(Backups(backup_id="backup-1", backup_filename="test-volume.tar.gz"))
+    session.commit()
+
+    response = client.get("/api/volumes/backup/backup-1/files")
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "Backup backup-1 has no file index"}
+
+
+def test_diff_backups(client, session):
+    indexes = {
+        "backup-1": [
+            ArchiveMember("app", "dir", 0, 1, 0, 512),
+            ArchiveMember("app/db.sqlite", "file", 1000, 1, 512, 1024),
+            ArchiveMember("app/config.yml", "file", 100, 1, 2048, 2560),
+            ArchiveMember("old.log", "file", 50, 1, 3072, 3584),
+        ],
+        "backup-2": [
+            ArchiveMember("app", "dir", 0, 2, 0, 512),
+            ArchiveMember("app/db.sqlite", "file", 3000, 2, 512, 1024),
+            ArchiveMember("app/config.yml", "file", 100, 1, 4096, 4608),
+            ArchiveMember("app/cache.bin", "file", 500, 2, 5120, 5632),
+        ],
+    }
+    for backup_id, members in indexes.items():
+        session.add(Backups(backup_id=backup_id, volume_name="test-volume"))
+        db_add_backup_index(session, backup_id, members, [])
+    session.commit()
+
+    response = client.get("/api/volumes/backup/backup-2/diff", params={"base": "backup-1"})
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "volume_name": "test-volume",
+        "base_backup_id": "backup-1",
+        "backup_id": "backup-2",
+        "added": 1,
+        "removed": 1,
+        "modified": 1,
+        "size_delta": 2450,
+        "entries": [
+            {
+                "path": "app/db.sqlite",
+                "change": "modified",
+                "member_type": "file",
+                "old_size": 1000,
+                "new_size": 3000,
+                "size_delta": 2000,
+            },
+            {
+                "path": "app/cache.bin",
+                "change": "added",
+                "member_type": "file",
+                "old_size": None,
+                "new_size": 500,
+                "size_delta": 500,
+            },
+            {
+                "path": "old.log",
+                "change": "removed",
+                "member_type": "file",
+                "old_size": 50,
+                "new_size": None,
+                "size_delta": -50,
+            },
+        ],
+    }
+
+
+def test_diff_backups_different_volumes(client, session):
+    for backup_id, volume_name in [("backup-1", "volume-1"), ("backup-2", "volume-2")]:
+        session.add(Backups(backup_id=backup_id, volume_name=volume_name))
+        db_add_backup_index(session, backup_id, [ArchiveMember("file", "file", 1, 1, 0, 512)], [])
+    session.commit()
+
+    response = client.get("/api/volumes/backup/backup-2/diff", params={"base": "backup-1"})
+
+    assert response.status_code == 409
+    assert response.json() == {"detail": "Backups backup-1 and backup-2 are of different volumes"}
+
+
+def test_get_backup_downtime(client, session):
+    session.add(Backups(backup_id="backup-1", volume_name="test-volume"))
+    session.add(
+        ContainerDowntime(
+            backup_id="backup-1",
+            container_id="id-1",
+            container_name="app",
+            quiesce=QuiesceMode.STOP,
+            stopped_at="2021-01-01T00:00:00+00:00",
+            restarted_at="2021-01-01T00:00:04+00:00",
+            downtime=4.2,
+        )
+    )
+    session.commit()
+
+    response = client.get("/api/volumes/backup/backup-1/downtime")
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {
+            "backup_id": "backup-1",
+            "container_id": "id-1",
+            "container_name": "app",
+            "quiesce": "stop",
+            "stopped_at": "2021-01-01T00:00:00+00:00",
+            "restarted_at": "2021-01-01T00:00:04+00:00",
+            "downtime": 4.2,
+        }
+    ]
+
+
+def test_list_helper_images(mocker, client):
+    from src.helper_image import HelperImages
+
+    images = HelperImages(mocker.MagicMock(), ["busybox"])
+    mocker.patch("src.routes.api.get_helper_images", return_value=images)
+
+    response = client.get("/api/helper/images")
+
+    assert response.status_code == 200
+    assert response.json() == [{"name": "busybox", "reference": None, "ready": False, "error": None}]
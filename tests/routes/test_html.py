@@ -1,4 +1,6 @@
-from src.models import Backups, RestoredBackups, ScheduleCrontab
+from src.models import BackupCodec, BackupOptions, Backups, RestoredBackups, ScheduleCrontab
+from src.routes.impl.volumes.backup_index import db_add_backup_index
+from src.tar_index import ArchiveMember
 from tests.fixtures import MockAsyncResult, MockVolume
 
 
@@ -82,6 +84,26 @@ def test_backup_volume_error_attached(client, snapshot, mocker):
     snapshot.assert_match(response.text.strip(), "notification.html")
 
 
+def test_backup_volumes(client, mocker):
+    mocker.patch(
+        "src.routes.impl.volumes.volumes.get_volume", return_value=MockVolume()
+    )
+    mocker.patch(
+        "src.routes.impl.volumes.volumes.is_volume_attached", return_value=True
+    )
+    mock_create_backup = mocker.patch(
+        "src.routes.html.schedule.add_backup_job", return_value=MockAsyncResult()
+    )
+
+    response = client.post(
+        "/volumes/backup", data={"volume_names": ["volume-1", "volume-2"]}
+    )
+
+    assert response.status_code == 200
+    assert "2 backups created" in response.text
+    assert mock_create_backup.call_count == 2
+
+
 def test_backups(client, snapshot, session):
     for backup_id in ["test-backup-id-1", "test-backup-id-2"]:
         session.add(
@@ -168,9 +190,44 @@ def test_create_schedule(client, snapshot, mocker):
             day_of_week="*",
         ),
         is_schedule=True,
+        options=BackupOptions(incremental=False),
     )
 
 
+def test_create_schedule_codec(client, mocker):
+    mocker.patch("src.routes.html.get_volume", return_value=MockVolume())
+    mock_create_schedule = mocker.patch(
+        "src.routes.html.schedule.add_backup_job",
+        return_value=MockAsyncResult(),
+    )
+    data = {
+        "schedule_name": "test-schedule-id",
+        "second": "*",
+        "minute": "*",
+        "hour": "1",
+        "day": "*",
+        "month": "*",
+        "day_of_week": "*",
+        "codec": "zstd",
+        "codec_level": "",
+    }
+
+    response = client.post("/volumes/backup/schedule/test-volume", data=data)
+
+    assert response.status_code == 200
+    assert mock_create_schedule.call_args.kwargs["options"] == BackupOptions(
+        codec=BackupCodec.ZSTD
+    )
+
+    response = client.post(
+        "/volumes/backup/schedule/test-volume", data={**data, "codec_level": "30"}
+    )
+
+    assert response.status_code == 200
+    assert "must be between 1 and 22" in response.text
+    mock_create_schedule.assert_called_once()
+
+
 def test_restore_volume(client, snapshot, mocker, session):
     mocker.patch("src.routes.html.uuid", **{"uuid4.return_value": "test-uuid"})
     for backup_id in ["test-backup-id-1", "test-backup-id-2"]:
@@ -228,3 +285,83 @@ def test_list_restored_volumes(client, snapshot, mocker, session):
 
     assert response.headers["content-type"] == "text/html; charset=utf-8"
     snapshot.assert_match(response.text.strip(), "restore_rows.html")
+
+
+def test_backup_files(client, snapshot, session):
+    session.add(Backups(backup_id="backup-1", backup_filename="test-volume.tar.gz"))
+    db_add_backup_index(
+        session,
+        "backup-1",
+        [
+            ArchiveMember("app/config.yml", "file", 100, 1, 0, 512),
+            ArchiveMember("readme.md", "file", 5, 1, 1024, 1536),
+        ],
+        [],
+    )
+    session.commit()
+
+    response = client.get("/volumes/backup/backup-1/files")
+
+    assert response.status_code == 200
+    snapshot.assert_match(response.text.strip(), "backup_files.html")
+
+
+def test_create_schedule_patterns(client, mocker):
+    mocker.patch("src.routes.html.get_volume", return_value=MockVolume())
+    mock_create_schedule = mocker.patch(
+        "src.routes.html.schedule.add_backup_job",
+        return_value=MockAsyncResult(),
+    )
+    data = {
+        "schedule_name": "test-schedule-id",
+        "second": "*",
+        "minute": "*",
+        "hour": "1",
+        "day": "*",
+        "month": "*",
+        "day_of_week": "*",
+        "include": "data, ./config/",
+        "exclude": "cache,*.log",
+    }
+
+    response = client.post("/volumes/backup/schedule/test-volume", data=data)
+
+    assert response.status_code == 200
+    assert mock_create_schedule.call_args.kwargs["options"] == BackupOptions(
+        include=["data", "config"], exclude=["cache", "*.log"]
+    )
+
+    response = client.post(
+        "/volumes/backup/schedule/test-volume", data={**data, "include": "data/uploads"}
+    )
+
+    assert response.status_code == 200
+    assert "include patterns must match entries in the root" in response.text
+    mock_create_schedule.assert_called_once()
+
+
+def test_create_schedule_upload_to(client, mocker):
+    mocker.patch("src.routes.html.get_volume", return_value=MockVolume())
+    mock_create_schedule = mocker.patch(
+        "src.routes.html.schedule.add_backup_job",
+        return_value=MockAsyncResult(),
+    )
+
+    response = client.post(
+        "/volumes/backup/schedule/test-volume",
+        data={
+            "schedule_name": "test-schedule-id",
+            "second": "*",
+            "minute": "*",
+            "hour": "1",
+            "day": "*",
+            "month": "*",
+            "day_of_week": "*",
+            "upload_to": ["source-1", "source-2"],
+        },
+    )
+
+    assert response.status_code == 200
+    assert mock_create_schedule.call_args.kwargs["options"] == BackupOptions(
+        upload_to=["source-1", "source-2"]
+    )
@@ -0,0 +1,80 @@
+import gzip
+import hashlib
+
+import pytest
+
+from src.archive import FileSink, write_archive
+from src.compression import decompress_stream, read_file
+from src.models import BackupCodec
+
+
+def test_write_archive(tmp_path):
+    chunks = [b"a" * 1024, b"b" * 2048, b"c" * 10]
+    path = tmp_path / "test-volume.tar.gz"
+
+    result = write_archive(iter(chunks), [FileSink(path)])
+
+    data = path.read_bytes()
+    assert gzip.decompress(data) == b"".join(chunks)
+    assert result.size == len(data)
+    assert result.source_size == 3082
+    assert result.checksum == hashlib.sha256(data).hexdigest()
+    assert not (tmp_path / "test-volume.tar.gz.part").exists()
+
+
+def test_write_archive_uncompressed(tmp_path):
+    chunks = [b"a" * 1024, b"b" * 2048]
+    path = tmp_path / "test-volume.tar"
+
+    result = write_archive(iter(chunks), [FileSink(path)], codec=BackupCodec.NONE)
+
+    assert path.read_bytes() == b"".join(chunks)
+    assert result.size == result.source_size == 3072
+
+
+def test_write_archive_multiple_sinks(tmp_path):
+    paths = [tmp_path / "one.tar.gz", tmp_path / "two.tar.gz"]
+
+    write_archive(iter([b"a" * 1024]), [FileSink(path) for path in paths])
+
+    assert paths[0].read_bytes() == paths[1].read_bytes()
+
+
+def test_write_archive_error(tmp_path):
+    def chunks():
+        yield b"a" * 1024
+        raise RuntimeError("helper died")
+
+    path = tmp_path / "test-volume.tar.gz"
+
+    with pytest.raises(RuntimeError, match="helper died"):
+        write_archive(chunks(), [FileSink(path)])
+
+    assert not path.exists()
+    assert not (tmp_path / "test-volume.tar.gz.part").exists()
+
+
+@pytest.mark.parametrize(
+    ("codec", "codec_level"),
+    [
+        (BackupCodec.GZIP, 1),
+        (BackupCodec.ZSTD, None),
+        (BackupCodec.ZSTD, 19),
+        (BackupCodec.LZ4, None),
+    ],
+)
+def test_write_archive_codec(tmp_path, codec, codec_level):
+    if codec == BackupCodec.ZSTD:
+        pytest.importorskip("zstandard")
+    if codec == BackupCodec.LZ4:
+        pytest.importorskip("lz4")
+    chunks = [b"a" * 100_000, b"b" * 2048, b"c" * 10]
+    path = tmp_path / "test-volume.tar"
+
+    result = write_archive(
+        iter(chunks), [FileSink(path)], codec=codec, codec_level=codec_level
+    )
+
+    assert result.size == path.stat().st_size
+    assert result.size < result.source_size
+    assert b"".join(decompress_stream(codec, read_file(path))) == b"".join(chunks)
@@ -0,0 +1,46 @@
+import gzip
+
+import pytest
+
+from src.compression import codec_extension, decompress_stream, get_compressor
+from src.models import BackupCodec
+
+
+def test_codec_extension():
+    assert codec_extension(BackupCodec.GZIP) == ".tar.gz"
+    assert codec_extension(BackupCodec.ZSTD) == ".tar.zst"
+    assert codec_extension(BackupCodec.NONE) == ".tar"
+
+
+def test_decompress_stream_multiple_members():
+    data = gzip.compress(b"a" * 1000) + gzip.compress(b"b" * 1000)
+    # split the stream in the middle of the second member
+    chunks = [data[:30], data[30:]]
+
+    assert b"".join(decompress_stream(BackupCodec.GZIP, chunks)) == b"a" * 1000 + b"b" * 1000
+
+
+def test_decompress_stream_truncated():
+    data = gzip.compress(b"a" * 1000)
+
+    with pytest.raises(RuntimeError, match="compressed stream is truncated"):
+        b"".join(decompress_stream(BackupCodec.GZIP, [data[:-8]]))
+
+
+@pytest.mark.parametrize(
+    ("codec", "threads"),
+    [(BackupCodec.GZIP, -1), (BackupCodec.ZSTD, 0), (BackupCodec.ZSTD, 2), (BackupCodec.LZ4, -1)],
+)
+def test_compressor_frames(codec, threads):
+    compressor = get_compressor(codec, threads=threads)
+    frames = []
+    for data in [b"a" * 100_000, b"b" * 2048, b""]:
+        frames.append(compressor.compress(data) + compressor.flush())
+
+    # every frame decompresses on its own, like from the frame index of an archive
+    assert [b"".join(decompress_stream(codec, [frame])) for frame in frames] == [
+        b"a" * 100_000,
+        b"b" * 2048,
+        b"",
+    ]
+    assert b"".join(decompress_stream(codec, frames)) == b"a" * 100_000 + b"b" * 2048
@@ -3,19 +3,30 @@ from datetime import datetime, timezone
 import pytest
 from freezegun import freeze_time
 
+from src.helper_limits import use_limits
+from src.models import HelperLimits
 from tests.fixtures import MockVolume
 
+TAR_CHECKSUM = "ab" * 32
+# tar -v lists the files on stderr when it writes the archive to stdout, sha256sum prints on stdout
+HASHED_TAR_OUTPUT = [
+    ("stderr", b"./\n"),
+    ("stderr", b"./file.txt\n"),
+    ("stdout", f"{TAR_CHECKSUM}  -\n".encode()),
+]
+
 
 @freeze_time(lambda: datetime.now(timezone.utc), tick=False)
 def test_backup_volume(mocker):
     mock_docker_client = mocker.MagicMock()
+    mock_docker_client.run.return_value = iter(HASHED_TAR_OUTPUT)
     mock_get_docker_client = mocker.patch(
         "src.docker.get_docker_client", return_value=mock_docker_client
     )
     mock_volume = mocker.MagicMock()
     mock_get_volume = mocker.patch("src.docker.get_volume", return_value=mock_volume)
     mock_exists = mocker.patch("src.docker.Path", **{"exists.return_value": True})
-    from src.docker import backup_volume
+    from src.docker import HASHED_TAR_SCRIPT, backup_volume
 
     # Set up test data
     volume_name = "test-volume"
@@ -23,7 +34,7 @@ def test_backup_volume(mocker):
     backup_file = f"{volume_name}-{dt_now.isoformat()}.tar.gz"
 
     # Run the function
-    backup_volume(volume_name, "/backup", backup_file)
+    assert backup_volume(volume_name, "/backup", backup_file) == TAR_CHECKSUM
 
     # Assert the function calls and behavior
     mock_get_docker_client.assert_called_once()
@@ -33,28 +44,71 @@ def test_backup_volume(mocker):
     mock_docker_client.run.assert_called_once_with(
         image="busybox",
         command=[
-            "tar",
-            "cvaf",
+            "sh",
+            "-c",
+            HASHED_TAR_SCRIPT,
+            "sh",
             f"/dest/{backup_file}",
+            "-czvf",
+            "-",
             "-C",
             "/source",
             ".",
         ],
         remove=True,
+        stream=True,
         volumes=[(mock_volume, "/source"), ("/backup", "/dest")],
     )
 
 
+def test_backup_volume_limits(mocker):
+    mock_docker_client = mocker.MagicMock()
+    mock_docker_client.run.return_value = iter(HASHED_TAR_OUTPUT)
+    mocker.patch("src.docker.get_docker_client", return_value=mock_docker_client)
+    mock_volume = mocker.MagicMock()
+    mocker.patch("src.docker.get_volume", return_value=mock_volume)
+    mocker.patch("src.docker.Path", **{"exists.return_value": True})
+    from src.docker import HASHED_TAR_SCRIPT, backup_volume
+
+    with use_limits(HelperLimits(cpus=0.5, blkio_weight=100, ionice_class=3)):
+        backup_volume("test-volume", "/backup", "test-volume.tar.gz")
+
+    mock_docker_client.run.assert_called_once_with(
+        image="busybox",
+        command=[
+            "ionice",
+            "-c",
+            "3",
+            "sh",
+            "-c",
+            HASHED_TAR_SCRIPT,
+            "sh",
+            "/dest/test-volume.tar.gz",
+            "-czvf",
+            "-",
+            "-C",
+            "/source",
+            ".",
+        ],
+        remove=True,
+        stream=True,
+        volumes=[(mock_volume, "/source"), ("/backup", "/dest")],
+        cpus=0.5,
+        blkio_weight=100,
+    )
+
+
 @freeze_time(lambda: datetime.now(timezone.utc), tick=False)
 def test_backup_volume_failure_backup_not_found(mocker):
     mock_docker_client = mocker.MagicMock()
+    mock_docker_client.run.return_value = iter(HASHED_TAR_OUTPUT)
     mock_get_docker_client = mocker.patch(
         "src.docker.get_docker_client", return_value=mock_docker_client
     )
     mock_volume = mocker.MagicMock()
     mock_get_volume = mocker.patch("src.docker.get_volume", return_value=mock_volume)
     mock_exists = mocker.patch("src.docker.Path", **{"exists.return_value": False})
-    from src.docker import backup_volume
+    from src.docker import HASHED_TAR_SCRIPT, backup_volume
 
     # Set up test data
     volume_name = "test-volume"
@@ -73,14 +127,19 @@ def test_backup_volume_failure_backup_not_found(mocker):
     mock_docker_client.run.assert_called_once_with(
         image="busybox",
         command=[
-            "tar",
-            "cvaf",
+            "sh",
+            "-c",
+            HASHED_TAR_SCRIPT,
+            "sh",
             f"/dest/{backup_file}",
+            "-czvf",
+            "-",
             "-C",
             "/source",
             ".",
         ],
         remove=True,
+        stream=True,
         volumes=[(mock_volume, "/source"), ("/backup", "/dest")],
     )
 
@@ -93,7 +152,7 @@ def test_backup_volume_failure_volume_not_found(mocker):
     )
     mock_get_volume = mocker.patch("src.docker.get_volume", return_value=None)
     mock_exists = mocker.patch("src.docker.Path", **{"exists.return_value": True})
-    from src.docker import backup_volume
+    from src.docker import HASHED_TAR_SCRIPT, backup_volume
 
     # Set up test data
     volume_name = "test-volume"
@@ -142,6 +201,7 @@ def test_restore_volume(mocker):
             "/dest",
         ],
         remove=True,
+        stream=True,
         volumes=[("test-volume", "/dest"), ("/backup", "/source")],
     )
 
@@ -176,6 +236,7 @@ def test_restore_volume_not_found(mocker):
             "/dest",
         ],
         remove=True,
+        stream=True,
         volumes=[("test-volume", "/dest"), ("/backup", "/source")],
     )
 
@@ -204,3 +265,459 @@ def test_get_volumes(mocker):
     assert all(vol.labels == {} for vol in volumes)
     assert all(not vol.options for vol in volumes)
     assert all(vol.status == {} for vol in volumes)
+
+
+def test_stream_helper_output(mocker):
+    mock_client = mocker.MagicMock(docker_cmd=["docker"])
+    mocker.patch("src.docker.get_docker_client", return_value=mock_client)
+    mock_process = mocker.MagicMock(
+        **{
+            "stdout.read.side_effect": [b"chunk-1", b"chunk-2", b""],
+            "stderr": [b"./file\n"],
+            "wait.return_value": 0,
+        }
+    )
+    mock_popen = mocker.patch("src.docker.subprocess.Popen", return_value=mock_process)
+    from src.docker import stream_helper_output
+
+    chunks = list(
+        stream_helper_output(["tar", "cf", "-", "."], [("test-volume", "/source")])
+    )
+
+    assert chunks == [b"chunk-1", b"chunk-2"]
+    assert mock_popen.call_args.args[0] == [
+        "docker",
+        "run",
+        "--rm",
+        "--volume",
+        "test-volume:/source",
+        "busybox",
+        "tar",
+        "cf",
+        "-",
+        ".",
+    ]
+
+
+def test_stream_helper_output_error(mocker):
+    mock_client = mocker.MagicMock(docker_cmd=["docker"])
+    mocker.patch("src.docker.get_docker_client", return_value=mock_client)
+    mock_process = mocker.MagicMock(
+        **{
+            "stdout.read.side_effect": [b"chunk-1", b""],
+            "stderr": [b"tar: error\n"],
+            "wait.return_value": 1,
+        }
+    )
+    mocker.patch("src.docker.subprocess.Popen", return_value=mock_process)
+    from python_on_whales import DockerException
+
+    from src.docker import stream_helper_output
+
+    with pytest.raises(DockerException, match="tar: error"):
+        list(stream_helper_output(["tar", "cf", "-", "."], []))
+
+
+def test_stream_backup_volume(mocker, tmp_path):
+    mocker.patch("src.docker.get_volume", return_value=MockVolume())
+    mock_stream_helper_output = mocker.patch(
+        "src.docker.stream_helper_output", return_value=iter([b"a" * 1024])
+    )
+    from src.docker import stream_backup_volume
+
+    result = stream_backup_volume("test-volume", str(tmp_path), "test-volume.tar.gz")
+
+    assert (tmp_path / "test-volume.tar.gz").stat().st_size == result.size
+    assert result.source_size == 1024
+    mock_stream_helper_output.assert_called_once_with(
+        ["tar", "cvf", "-", "-C", "/source", "."],
+        [("test-volume", "/source")],
+        list_files=True,
+    )
+
+
+def test_stream_backup_volume_codec_threads(mocker, tmp_path):
+    mocker.patch("src.docker.get_volume", return_value=MockVolume())
+    mocker.patch("src.docker.stream_helper_output", return_value=iter([b"a" * 1024]))
+    mock_get_compressor = mocker.patch("src.archive.get_compressor", return_value=None)
+    from src.docker import stream_backup_volume
+    from src.helper_limits import use_limits
+    from src.models import BackupCodec, HelperLimits
+
+    with use_limits(HelperLimits(cpus=1.5)):
+        stream_backup_volume("test-volume", str(tmp_path), "test-volume.tar.zst", codec=BackupCodec.ZSTD)
+
+    mock_get_compressor.assert_called_once_with(BackupCodec.ZSTD, None, 2)
+
+
+def test_stream_backup_volume_not_found(mocker, tmp_path):
+    mocker.patch("src.docker.get_volume", return_value=None)
+    mock_stream_helper_output = mocker.patch("src.docker.stream_helper_output")
+    from src.docker import stream_backup_volume
+
+    with pytest.raises(ValueError, match="Volume test-volume does not exist"):
+        stream_backup_volume("test-volume", str(tmp_path), "test-volume.tar.gz")
+
+    mock_stream_helper_output.assert_not_called()
+    assert not list(tmp_path.iterdir())
+
+
+def test_backup_volume_incremental(mocker):
+    mock_docker_client = mocker.MagicMock()
+    mock_docker_client.run.return_value = iter(HASHED_TAR_OUTPUT)
+    mocker.patch("src.docker.get_docker_client", return_value=mock_docker_client)
+    mock_volume = mocker.MagicMock()
+    mocker.patch("src.docker.get_volume", return_value=mock_volume)
+    mocker.patch("src.docker.Path", **{"exists.return_value": True})
+    from src.docker import HASHED_TAR_SCRIPT, INCREMENTAL_HELPER_IMAGE, backup_volume
+
+    backup_volume(
+        "test-volume",
+        "/backup",
+        "test-volume.tar.gz",
+        snapshot_file=".snapshots/test-volume.snar.new",
+    )
+
+    mock_docker_client.run.assert_called_once_with(
+        image=INCREMENTAL_HELPER_IMAGE,
+        command=[
+            "sh",
+            "-c",
+            HASHED_TAR_SCRIPT,
+            "sh",
+            "/dest/test-volume.tar.gz",
+            "--listed-incremental=/dest/.snapshots/test-volume.snar.new",
+            "--no-check-device",
+            "-czvf",
+            "-",
+            "-C",
+            "/source",
+            ".",
+        ],
+        remove=True,
+        stream=True,
+        volumes=[(mock_volume, "/source"), ("/backup", "/dest")],
+    )
+
+
+def test_restore_volume_incremental(mocker):
+    mock_docker_client = mocker.MagicMock()
+    mocker.patch("src.docker.get_docker_client", return_value=mock_docker_client)
+    mocker.patch("src.docker.Path", **{"exists.return_value": True})
+    from src.docker import INCREMENTAL_HELPER_IMAGE, restore_volume
+
+    restore_volume("test-volume", "/backup", "test-volume.tar.gz", incremental=True)
+
+    mock_docker_client.run.assert_called_once_with(
+        image=INCREMENTAL_HELPER_IMAGE,
+        command=[
+            "tar",
+            "--listed-incremental=/dev/null",
+            "-xvf",
+            "/source/test-volume.tar.gz",
+            "-C",
+            "/dest",
+        ],
+        remove=True,
+        stream=True,
+        volumes=[("test-volume", "/dest"), ("/backup", "/source")],
+    )
+
+
+def test_restore_volume_from_stream(mocker):
+    mock_client = mocker.MagicMock(docker_cmd=["docker"])
+    mocker.patch("src.docker.get_docker_client", return_value=mock_client)
+    mock_process = mocker.MagicMock(**{"stderr": [], "wait.return_value": 0})
+    mock_popen = mocker.patch("src.docker.subprocess.Popen", return_value=mock_process)
+    from src.docker import restore_volume_from_stream
+
+    restore_volume_from_stream("test-volume", iter([b"chunk-1", b"chunk-2"]))
+
+    assert mock_popen.call_args.args[0] == [
+        "docker",
+        "run",
+        "--rm",
+        "--interactive",
+        "--volume",
+        "test-volume:/dest",
+        "busybox",
+        "tar",
+        "xf",
+        "-",
+        "-C",
+        "/dest",
+    ]
+    assert mock_process.stdin.write.call_args_list == [
+        mocker.call(b"chunk-1"),
+        mocker.call(b"chunk-2"),
+    ]
+    mock_process.stdin.close.assert_called_once()
+
+
+def test_restore_volume_from_stream_error(mocker):
+    mock_client = mocker.MagicMock(docker_cmd=["docker"])
+    mocker.patch("src.docker.get_docker_client", return_value=mock_client)
+    mock_process = mocker.MagicMock(
+        **{
+            "stdin.write.side_effect": BrokenPipeError(),
+            "stderr": [b"tar: invalid tar magic\n"],
+            "wait.return_value": 1,
+        }
+    )
+    mocker.patch("src.docker.subprocess.Popen", return_value=mock_process)
+    from python_on_whales import DockerException
+
+    from src.docker import restore_volume_from_stream
+
+    with pytest.raises(DockerException, match="invalid tar magic"):
+        restore_volume_from_stream("test-volume", iter([b"chunk-1"]))
+
+
+def test_get_volume_engine_backend(mocker):
+    mock_docker_client = mocker.patch("src.docker.get_docker_client")
+    mock_engine_client = mocker.MagicMock(
+        **{"inspect_volume.return_value": MockVolume()}
+    )
+    mocker.patch("src.docker.get_engine_client", return_value=mock_engine_client)
+    mocker.patch("src.docker.DOCKER_BACKEND", "engine")
+    from src.docker import get_volume, is_volume_attached
+
+    assert get_volume("test-volume").name == "test-volume"
+
+    mock_engine_client.list_volumes.return_value = []
+    assert is_volume_attached("test-volume")
+    mock_engine_client.list_volumes.assert_called_once_with(
+        {"name": ["test-volume"], "dangling": ["0"]}
+    )
+    mock_docker_client.assert_not_called()
+
+
+def test_restore_volume_reports_files(mocker):
+    mock_docker_client = mocker.MagicMock(
+        **{"run.return_value": iter([("stdout", b"./a\n"), ("stdout", b"./b\n")])}
+    )
+    mocker.patch("src.docker.get_docker_client", return_value=mock_docker_client)
+    mocker.patch("src.docker.Path", **{"exists.return_value": True})
+    mock_report_progress = mocker.patch("src.docker.report_progress")
+    from src.docker import restore_volume
+
+    restore_volume("test-volume", "/backup", "test-volume.tar.gz")
+
+    assert mock_report_progress.call_args_list == [
+        mocker.call(bytes=0, files=1),
+        mocker.call(bytes=0, files=1),
+    ]
+
+
+def test_backup_volume_in_pool_container(mocker):
+    from src.helper_pool import HelperPool
+
+    mock_docker_client = mocker.MagicMock()
+    mock_docker_client.container.execute.return_value = iter(HASHED_TAR_OUTPUT)
+    mock_docker_client.run.return_value = mocker.MagicMock(id="helper-0")
+    mocker.patch("src.docker.get_docker_client", return_value=mock_docker_client)
+    mock_volume = MockVolume(mountpoint="/var/lib/docker/volumes/test-volume/_data")
+    mocker.patch("src.docker.get_volume", return_value=mock_volume)
+    mocker.patch("src.docker.Path", **{"exists.return_value": True})
+    pool = HelperPool(mock_docker_client, 1, "busybox", "/backup")
+    pool.fill()
+    mocker.patch("src.docker.get_helper_pool", return_value=pool)
+    from src.docker import HASHED_TAR_SCRIPT, backup_volume
+
+    backup_volume("test-volume", "/backup", "test-volume.tar.gz")
+
+    mock_docker_client.container.execute.assert_called_once_with(
+        "helper-0",
+        [
+            "sh",
+            "-c",
+            HASHED_TAR_SCRIPT,
+            "sh",
+            "/backup/test-volume.tar.gz",
+            "-czvf",
+            "-",
+            "-C",
+            "/volumes/test-volume/_data",
+            ".",
+        ],
+        stream=True,
+    )
+    # only the pool container was started
+    assert mock_docker_client.run.call_count == 1
+
+
+@pytest.mark.parametrize(
+    ("function", "script"),
+    [
+        ("list_volume_files", 'cd "$1" && find . -type f -exec stat -c "%s %n" {} +'),
+        (
+            "list_top_level_sizes",
+            'cd "$1" && for f in * .[!.]* ..?*; do if [ -e "$f" ] || [ -L "$f" ]; then du -sk "$f"; fi; done',
+        ),
+        (
+            "list_top_level_entries",
+            'cd "$1" && for f in * .[!.]* ..?*; do if [ -e "$f" ] || [ -L "$f" ]; then echo "$f"; fi; done',
+        ),
+        ("stat_volume_tree", 'cd "$1" && find . -exec stat -c "%y %z %s %a %u:%g %n" {} +'),
+    ],
+)
+def test_volume_scripts_in_pool_container(mocker, function, script):
+    from src.helper_pool import HelperPool
+
+    mock_docker_client = mocker.MagicMock(docker_cmd=["docker"])
+    mock_docker_client.run.return_value = mocker.MagicMock(id="helper-0")
+    mocker.patch("src.docker.get_docker_client", return_value=mock_docker_client)
+    mock_volume = MockVolume(mountpoint="/var/lib/docker/volumes/test-volume/_data")
+    mocker.patch("src.docker.get_volume", return_value=mock_volume)
+    pool = HelperPool(mock_docker_client, 1, "busybox", "/backup")
+    pool.fill()
+    mocker.patch("src.docker.get_helper_pool", return_value=pool)
+    mock_process = mocker.MagicMock(**{"stdout.read.side_effect": [b""], "stderr": [], "wait.return_value": 0})
+    mock_popen = mocker.patch("src.docker.subprocess.Popen", return_value=mock_process)
+    import src.docker
+
+    getattr(src.docker, function)("test-volume")
+
+    # the mount is passed as an argument so it's rewritten to where the pool container sees it
+    assert mock_popen.call_args.args[0] == [
+        "docker",
+        "exec",
+        "helper-0",
+        "sh",
+        "-c",
+        script,
+        "sh",
+        "/volumes/test-volume/_data",
+    ]
+
+
+def test_exchange_volumes(mocker):
+    mock_docker_client = mocker.MagicMock()
+    mocker.patch("src.docker.get_docker_client", return_value=mock_docker_client)
+    mocker.patch(
+        "src.docker.get_volume",
+        side_effect=lambda name: MockVolume(name, mountpoint=f"/var/lib/docker/volumes/{name}/_data"),
+    )
+    from src.docker import exchange_volumes
+
+    exchange_volumes("test-volume", "test-volume-rollback")
+
+    mock_docker_client.run.assert_called_once_with(
+        image="busybox",
+        command=[
+            "sh",
+            "-c",
+            'mv "$1" "$1.swap" || exit 1; '
+            'if ! mv "$2" "$1"; then mv "$1.swap" "$1"; exit 1; fi; '
+            'if ! mv "$1.swap" "$2"; then mv "$1" "$2" && mv "$1.swap" "$1"; exit 1; fi',
+            "sh",
+            "/volumes/test-volume/_data",
+            "/volumes/test-volume-rollback/_data",
+        ],
+        remove=True,
+        stream=True,
+        volumes=[("/var/lib/docker/volumes", "/volumes")],
+    )
+
+
+def test_exchange_volumes_failed(mocker):
+    from python_on_whales import DockerException
+
+    def run(**kwargs):
+        yield ("stderr", b"mv: can't rename")
+        raise DockerException(["docker", "run"], 1)
+
+    mock_docker_client = mocker.MagicMock(**{"run.side_effect": run})
+    mocker.patch("src.docker.get_docker_client", return_value=mock_docker_client)
+    mocker.patch(
+        "src.docker.get_volume",
+        side_effect=lambda name: MockVolume(name, mountpoint=f"/var/lib/docker/volumes/{name}/_data"),
+    )
+    from src.docker import exchange_volumes
+
+    with pytest.raises(
+        RuntimeError,
+        match="Exchanging /var/lib/docker/volumes/test-volume/_data and "
+        "/var/lib/docker/volumes/test-volume-rollback/_data failed",
+    ):
+        exchange_volumes("test-volume", "test-volume-rollback")
+
+
+def test_stream_backup_volume_tar_filter(mocker, tmp_path):
+    mocker.patch("src.docker.get_volume", return_value=MockVolume())
+    mock_stream_helper_output = mocker.patch(
+        "src.docker.stream_helper_output", return_value=iter([b"a" * 1024])
+    )
+    from src.docker import TarFilter, stream_backup_volume
+
+    stream_backup_volume(
+        "test-volume",
+        str(tmp_path),
+        "test-volume.tar.gz",
+        tar_filter=TarFilter(["data", ".env"], ["cache", "*.log"]),
+    )
+
+    mock_stream_helper_output.assert_called_once_with(
+        [
+            "tar",
+            "cvf",
+            "-",
+            "-C",
+            "/source",
+            "--exclude=cache",
+            "--exclude=*.log",
+            "./data",
+            "./.env",
+        ],
+        [("test-volume", "/source")],
+        list_files=True,
+    )
+
+
+def test_select_entries(mocker):
+    mocker.patch(
+        "src.docker.stream_helper_output",
+        side_effect=lambda *args: iter([b"data\ndata.old\n.env\ncache\n"]),
+    )
+    from src.docker import select_entries
+
+    assert select_entries("test-volume", []) is None
+    assert select_entries("test-volume", ["data*", ".env"]) == ["data", "data.old", ".env"]
+    with pytest.raises(ValueError, match="Nothing in volume test-volume matches"):
+        select_entries("test-volume", ["uploads"])
+
+
+def test_volume_exclude_patterns():
+    from src.docker import EXCLUDE_LABEL, volume_exclude_patterns
+
+    assert volume_exclude_patterns(MockVolume(labels={EXCLUDE_LABEL: "cache, *.log,"})) == [
+        "cache",
+        "*.log",
+    ]
+    assert volume_exclude_patterns(MockVolume()) == []
+    assert volume_exclude_patterns(None) == []
+
+
+def test_stat_volume_tree(mocker):
+    mock_stream_helper_output = mocker.patch(
+        "src.docker.stream_helper_output",
+        return_value=iter(
+            [
+                b"2024-05-01 10:00:00.000000000 +0000 2024-05-01 10:00:00.000000000 +0000 4096 755 0:0 .\n"
+                b"2024-05-01 10:00:01.250000000 +0000 2024-05-01 10:00:01.500000000 +0000 12 644 1000:1000"
+                b" ./data/my file.txt\n"
+            ]
+        ),
+    )
+    from src.docker import stat_volume_tree
+
+    assert stat_volume_tree("test-volume") == {
+        "": "2024-05-01 10:00:00.000000000 +0000 2024-05-01 10:00:00.000000000 +0000 4096 755 0:0",
+        "data/my file.txt": (
+            "2024-05-01 10:00:01.250000000 +0000 2024-05-01 10:00:01.500000000 +0000 12 644 1000:1000"
+        ),
+    }
+    mock_stream_helper_output.assert_called_once_with(
+        ["sh", "-c", 'cd "$1" && find . -exec stat -c "%y %z %s %a %u:%g %n" {} +', "sh", "/source"],
+        [("test-volume", "/source")],
+    )
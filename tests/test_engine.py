@@ -0,0 +1,63 @@
+import json
+from datetime import datetime, timezone
+
+import httpx
+import pytest
+
+from src.engine import EngineClient, EngineError
+
+VOLUME = {
+    "CreatedAt": "2024-05-01T10:00:00.123456789Z",
+    "Driver": "local",
+    "Labels": None,
+    "Mountpoint": "/var/lib/docker/volumes/test-volume/_data",
+    "Name": "test-volume",
+    "Options": None,
+    "Scope": "local",
+}
+
+
+def engine_client(handler):
+    return EngineClient(transport=httpx.MockTransport(handler))
+
+
+def test_list_volumes():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"Volumes": [VOLUME], "Warnings": None})
+
+    volumes = engine_client(handler).list_volumes({"name": ["test-volume"], "dangling": ["0"]})
+
+    assert requests[0].url.path == "/v1.41/volumes"
+    assert json.loads(requests[0].url.params["filters"]) == {
+        "name": ["test-volume"],
+        "dangling": ["0"],
+    }
+    assert len(volumes) == 1
+    assert volumes[0].name == "test-volume"
+    assert str(volumes[0]) == "test-volume"
+    assert volumes[0].labels == {}
+    assert volumes[0].created_at == datetime(2024, 5, 1, 10, 0, 0, 123456, tzinfo=timezone.utc)
+
+
+def test_inspect_volume():
+    client = engine_client(lambda request: httpx.Response(200, json=VOLUME))
+
+    volume = client.inspect_volume("test-volume")
+
+    assert volume.mountpoint == "/var/lib/docker/volumes/test-volume/_data"
+
+
+def test_inspect_volume_not_found():
+    client = engine_client(lambda request: httpx.Response(404, json={"message": "no such volume"}))
+
+    assert client.inspect_volume("test-volume") is None
+
+
+def test_engine_error():
+    client = engine_client(lambda request: httpx.Response(500, json={"message": "boom"}))
+
+    with pytest.raises(EngineError, match="500"):
+        client.list_volumes()
@@ -0,0 +1,35 @@
+from src.fingerprint import backup_fingerprint, merkle_root
+from src.models import BackupOptions
+
+TREE = {
+    "": "1 1 4096 755 0:0",
+    "data": "2 2 4096 755 0:0",
+    "data/a.db": "3 3 100 644 0:0",
+    "data/sub": "4 4 4096 755 0:0",
+    "data/sub/b.txt": "5 5 10 644 0:0",
+    ".env": "6 6 20 600 0:0",
+}
+
+
+def test_merkle_root():
+    root = merkle_root(TREE)
+
+    assert merkle_root(dict(reversed(TREE.items()))) == root
+    assert merkle_root({**TREE, "data/sub/b.txt": "5 7 11 644 0:0"}) != root
+    assert merkle_root({**TREE, "data/sub/c.txt": "8 8 0 644 0:0"}) != root
+    assert merkle_root({path: stat for path, stat in TREE.items() if path != ".env"}) != root
+
+
+def test_merkle_root_renamed():
+    renamed = {path.replace("a.db", "c.db"): stat for path, stat in TREE.items()}
+
+    assert merkle_root(renamed) != merkle_root(TREE)
+
+
+def test_backup_fingerprint(mocker):
+    mocker.patch("src.fingerprint.stat_volume_tree", return_value=TREE)
+    fingerprint = backup_fingerprint("test-volume", BackupOptions(), [])
+
+    assert backup_fingerprint("test-volume", BackupOptions(skip_unchanged=True), []) == fingerprint
+    assert backup_fingerprint("test-volume", BackupOptions(codec="zstd"), []) != fingerprint
+    assert backup_fingerprint("test-volume", BackupOptions(), ["cache"]) != fingerprint
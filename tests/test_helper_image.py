@@ -0,0 +1,70 @@
+from python_on_whales import DockerException
+
+from src.helper_image import HelperImages, image_repository
+
+DIGEST = "sha256:" + "a" * 64
+
+
+def test_image_repository():
+    assert image_repository("busybox") == "busybox"
+    assert image_repository("busybox:1.36") == "busybox"
+    assert image_repository("registry:5000/tools/helper") == "registry:5000/tools/helper"
+    assert image_repository("registry:5000/tools/helper:zstd") == "registry:5000/tools/helper"
+    assert image_repository(f"busybox@{DIGEST}") == "busybox"
+
+
+def test_prepare_pins_digest(mocker):
+    client = mocker.MagicMock()
+    client.image.inspect.return_value = mocker.MagicMock(repo_digests=[f"busybox@{DIGEST}"])
+    images = HelperImages(client, ["busybox:latest", "busybox:latest"])
+
+    assert images.resolve("busybox:latest") == "busybox:latest"
+    assert images.prepare("busybox:latest")
+
+    client.image.pull.assert_called_once_with("busybox:latest", quiet=True)
+    assert images.resolve("busybox:latest") == f"busybox@{DIGEST}"
+    assert [image.model_dump() for image in images.status()] == [
+        {"name": "busybox:latest", "reference": f"busybox@{DIGEST}", "ready": True, "error": None}
+    ]
+
+
+def test_prepare_uses_local_image_when_pull_fails(mocker):
+    client = mocker.MagicMock()
+    client.image.pull.side_effect = DockerException(["docker", "pull"], 1)
+    client.image.inspect.return_value = mocker.MagicMock(repo_digests=[], id="sha256:local")
+    images = HelperImages(client, ["helper"])
+
+    assert images.prepare("helper")
+    assert images.resolve("helper") == "sha256:local"
+
+
+def test_warm_up_retries(mocker):
+    mocker.patch("src.helper_image.HELPER_IMAGE_PULL_RETRY", 0)
+    client = mocker.MagicMock()
+    client.image.inspect.side_effect = [
+        DockerException(["docker", "image", "inspect"], 1),
+        mocker.MagicMock(repo_digests=[f"busybox@{DIGEST}"]),
+    ]
+    images = HelperImages(client, ["busybox"])
+
+    images.warm_up()
+
+    assert client.image.pull.call_count == 2
+    assert images.status()[0].ready
+
+
+def test_resolve_pulls_image_from_first_use(mocker):
+    client = mocker.MagicMock()
+    client.image.inspect.return_value = mocker.MagicMock(repo_digests=[f"debian@{DIGEST}"])
+    images = HelperImages(client, ["busybox"])
+    mock_start = mocker.patch.object(images, "_start")
+
+    assert images.resolve("debian:stable-slim") == "debian:stable-slim"
+    assert images.resolve("debian:stable-slim") == "debian:stable-slim"
+
+    # pulled once, in the background
+    mock_start.assert_called_once_with(["debian:stable-slim"])
+    client.image.pull.assert_not_called()
+    images.warm_up(*mock_start.call_args.args)
+    assert images.resolve("debian:stable-slim") == f"debian@{DIGEST}"
+    assert [image.name for image in images.status()] == ["busybox", "debian:stable-slim"]
@@ -0,0 +1,88 @@
+import pytest
+from pydantic import ValidationError
+
+from src.helper_limits import (
+    codec_threads,
+    current_limits,
+    limit_command,
+    run_flags,
+    run_options,
+    use_limits,
+)
+from src.models import HelperLimits
+
+
+def test_merge():
+    defaults = HelperLimits(cpus=1, memory="512m", nice=10)
+
+    limits = defaults.merge(HelperLimits(cpus=0.5, ionice_class=3))
+
+    assert limits == HelperLimits(cpus=0.5, memory="512m", nice=10, ionice_class=3)
+    assert defaults.merge(None) == defaults
+
+
+def test_run_options_and_flags():
+    limits = HelperLimits(
+        cpus=0.5,
+        memory="256m",
+        blkio_weight=100,
+        device_read_bps=["/dev/sda:50mb"],
+    )
+
+    assert run_options(limits) == {
+        "cpus": 0.5,
+        "memory": "256m",
+        "blkio_weight": 100,
+        "device_read_bps": ["/dev/sda:50mb"],
+    }
+    assert run_flags(limits) == [
+        "--cpus",
+        "0.5",
+        "--memory",
+        "256m",
+        "--blkio-weight",
+        "100",
+        "--device-read-bps",
+        "/dev/sda:50mb",
+    ]
+    assert run_options(HelperLimits()) == {}
+    assert run_flags(HelperLimits()) == []
+
+
+@pytest.mark.parametrize(
+    ("limits", "command"),
+    [
+        (HelperLimits(), ["tar", "cf", "-"]),
+        (HelperLimits(nice=19), ["nice", "-n", "19", "tar", "cf", "-"]),
+        (HelperLimits(ionice_class=3, ionice_level=4), ["ionice", "-c", "3", "tar", "cf", "-"]),
+        (
+            HelperLimits(nice=10, ionice_class=2, ionice_level=7),
+            ["nice", "-n", "10", "ionice", "-c", "2", "-n", "7", "tar", "cf", "-"],
+        ),
+    ],
+)
+def test_limit_command(limits, command):
+    assert limit_command(limits, ["tar", "cf", "-"]) == command
+
+
+def test_use_limits():
+    limits = HelperLimits(cpus=2)
+
+    with use_limits(limits):
+        assert current_limits() is limits
+        with use_limits(HelperLimits(cpus=1)):
+            assert current_limits().cpus == 1
+        assert current_limits() is limits
+
+    assert current_limits() is not limits
+
+
+def test_codec_threads():
+    assert codec_threads(HelperLimits()) == -1
+    assert codec_threads(HelperLimits(cpus=0.5)) == 1
+    assert codec_threads(HelperLimits(cpus=2.5)) == 3
+
+
+def test_limits_validation():
+    with pytest.raises(ValidationError):
+        HelperLimits(ionice_class=1)
@@ -0,0 +1,116 @@
+import pytest
+from python_on_whales import DockerException
+
+from src.engine import EngineVolume
+from src.helper_pool import HelperPool, rewrite_paths
+
+
+def engine_volume(name, driver="local", options=None):
+    return EngineVolume(
+        name=name,
+        driver=driver,
+        mountpoint=f"/var/lib/docker/volumes/{name}/_data",
+        created_at=None,
+        options=options or {},
+    )
+
+
+def helper_pool(mocker, size=2, max_jobs=100):
+    client = mocker.MagicMock()
+    client.run.side_effect = [mocker.MagicMock(id=f"helper-{i}") for i in range(10)]
+    return HelperPool(client, size, "busybox", "/backup", max_jobs=max_jobs)
+
+
+def test_container_path(mocker):
+    pool = helper_pool(mocker)
+
+    assert pool.container_path(engine_volume("vol-1")) == "/volumes/vol-1/_data"
+    assert pool.container_path("/backup/") == "/backup"
+    assert pool.container_path("/elsewhere") is None
+    assert pool.container_path(engine_volume("vol-1", driver="nfs")) is None
+    assert pool.container_path(engine_volume("vol-1", options={"device": "/dev/sdb"})) is None
+
+
+def test_rewrite_paths():
+    paths = {"/source": "/volumes/vol-1/_data", "/dest": "/backup"}
+
+    assert rewrite_paths(
+        [
+            "tar",
+            "--listed-incremental=/dest/snap",
+            "-czvf",
+            "/dest/a.tar.gz",
+            "-C",
+            "/source",
+            ".",
+            "/sourced",
+        ],
+        paths,
+    ) == [
+        "tar",
+        "--listed-incremental=/backup/snap",
+        "-czvf",
+        "/backup/a.tar.gz",
+        "-C",
+        "/volumes/vol-1/_data",
+        ".",
+        "/sourced",
+    ]
+
+
+def test_fill(mocker):
+    pool = helper_pool(mocker)
+
+    pool.fill()
+
+    assert pool.client.run.call_count == 2
+    assert pool.client.run.call_args.kwargs["volumes"] == [
+        ("/var/lib/docker/volumes", "/volumes"),
+        ("/backup", "/backup"),
+    ]
+    with pool.worker() as first, pool.worker() as second, pool.worker() as third:
+        assert {first.container_id, second.container_id} == {"helper-0", "helper-1"}
+        assert third is None
+
+
+def test_worker_recycled_after_max_jobs(mocker):
+    pool = helper_pool(mocker, size=1, max_jobs=2)
+    pool.fill()
+
+    for _ in range(2):
+        with pool.worker() as worker:
+            assert worker.container_id == "helper-0"
+
+    pool.client.container.remove.assert_called_once_with("helper-0", force=True)
+    pool.fill()
+    with pool.worker() as worker:
+        assert worker.container_id == "helper-1"
+
+
+def test_worker_replaced_when_job_fails(mocker):
+    pool = helper_pool(mocker, size=1)
+    pool.fill()
+
+    with pytest.raises(DockerException), pool.worker():
+        raise DockerException(["docker", "exec"], 1)
+
+    pool.client.container.remove.assert_called_once_with("helper-0", force=True)
+    with pool.worker() as worker:
+        assert worker is None
+
+
+def test_check_health(mocker):
+    pool = helper_pool(mocker)
+    pool.fill()
+
+    def execute(container_id, _command):
+        if container_id != "helper-0":
+            raise DockerException(["docker", "exec"], 1)
+
+    pool.client.container.execute.side_effect = execute
+
+    pool.check_health()
+
+    pool.client.container.remove.assert_called_once_with("helper-1", force=True)
+    with pool.worker() as first, pool.worker() as second:
+        assert {first.container_id, second.container_id} == {"helper-0", "helper-2"}
@@ -0,0 +1,47 @@
+from src.incremental import commit_snapshot, discard_snapshot, has_snapshot, prepare_snapshot
+
+
+def test_prepare_snapshot_full(tmp_path):
+    snapshot_dir = tmp_path / ".snapshots"
+    snapshot_dir.mkdir()
+    (snapshot_dir / "test-volume.snar.new").write_text("stale")
+
+    snapshot_file = prepare_snapshot(str(tmp_path), "test-volume", 0)
+
+    assert snapshot_file == ".snapshots/test-volume.snar.new"
+    assert not (tmp_path / snapshot_file).exists()
+
+
+def test_prepare_snapshot_incremental(tmp_path):
+    snapshot_dir = tmp_path / ".snapshots"
+    snapshot_dir.mkdir()
+    (snapshot_dir / "test-volume.snar").write_text("level-0")
+
+    snapshot_file = prepare_snapshot(str(tmp_path), "test-volume", 1)
+
+    assert (tmp_path / snapshot_file).read_text() == "level-0"
+
+
+def test_commit_snapshot(tmp_path):
+    snapshot_file = prepare_snapshot(str(tmp_path), "test-volume", 0)
+    assert not has_snapshot(str(tmp_path), "test-volume")
+    (tmp_path / snapshot_file).write_text("level-0")
+
+    commit_snapshot(str(tmp_path), "test-volume")
+
+    assert has_snapshot(str(tmp_path), "test-volume")
+    assert (tmp_path / ".snapshots" / "test-volume.snar").read_text() == "level-0"
+    assert not (tmp_path / snapshot_file).exists()
+
+
+def test_discard_snapshot(tmp_path):
+    snapshot_dir = tmp_path / ".snapshots"
+    snapshot_dir.mkdir()
+    (snapshot_dir / "test-volume.snar").write_text("level-0")
+    snapshot_file = prepare_snapshot(str(tmp_path), "test-volume", 1)
+    (tmp_path / snapshot_file).write_text("level-1")
+
+    discard_snapshot(str(tmp_path), "test-volume")
+
+    assert (snapshot_dir / "test-volume.snar").read_text() == "level-0"
+    assert not (tmp_path / snapshot_file).exists()
@@ -0,0 +1,91 @@
+import httpx
+
+from src.engine import EngineVolume
+from src.inventory import VolumeInventory
+
+
+def engine_volume(name):
+    return EngineVolume(name=name, driver="local", mountpoint=f"/{name}", created_at=None)
+
+
+def container(*volume_names):
+    return {"Mounts": [{"Type": "volume", "Name": name} for name in volume_names]}
+
+
+def test_sync(mocker):
+    client = mocker.MagicMock(
+        **{
+            "list_volumes.return_value": [engine_volume("vol-1"), engine_volume("vol-2")],
+            "list_containers.return_value": [
+                container("vol-1"),
+                {"Mounts": [{"Type": "bind", "Name": "vol-2"}]},
+            ],
+        }
+    )
+    inventory = VolumeInventory(client)
+
+    inventory.sync()
+
+    assert inventory.ready
+    assert [volume.name for volume in inventory.list_volumes()] == ["vol-1", "vol-2"]
+    assert inventory.is_in_use("vol-1")
+    assert not inventory.is_in_use("vol-2")
+
+
+def test_apply_event(mocker):
+    client = mocker.MagicMock(
+        **{
+            "list_volumes.return_value": [engine_volume("vol-1")],
+            "list_containers.return_value": [],
+            "inspect_volume.return_value": engine_volume("vol-2"),
+        }
+    )
+    inventory = VolumeInventory(client)
+    inventory.sync()
+
+    inventory.apply_event({"Type": "volume", "Action": "create", "Actor": {"ID": "vol-2"}})
+    client.list_containers.return_value = [container("vol-2")]
+    inventory.apply_event({"Type": "container", "Action": "create", "Actor": {"ID": "abc"}})
+    inventory.apply_event({"Type": "volume", "Action": "destroy", "Actor": {"ID": "vol-1"}})
+    # start and stop don't change what volumes a container references
+    inventory.apply_event({"Type": "container", "Action": "start", "Actor": {"ID": "abc"}})
+
+    assert inventory.get_volume("vol-1") is None
+    assert inventory.get_volume("vol-2").name == "vol-2"
+    assert inventory.is_in_use("vol-2")
+    client.inspect_volume.assert_called_once_with("vol-2")
+    assert client.list_containers.call_count == 2
+
+
+def test_watch_resyncs_when_idle(mocker):
+    inventory = VolumeInventory(mocker.MagicMock())
+    calls = []
+
+    def events(*args, **kwargs):
+        calls.append(kwargs)
+        if len(calls) == 1:
+            raise httpx.ReadTimeout("idle")
+        inventory.stop()
+        yield {"Type": "volume", "Action": "mount", "Actor": {"ID": "vol-1"}}
+
+    inventory.client.events.side_effect = events
+    sync = mocker.patch.object(inventory, "sync")
+
+    inventory.watch()
+
+    assert sync.call_count == 2
+    assert calls[0]["since"] <= calls[1]["since"]
+
+
+def test_get_volume_from_inventory(mocker):
+    mock_docker_client = mocker.patch("src.docker.get_docker_client")
+    inventory = VolumeInventory(mocker.MagicMock())
+    inventory._volumes = {"vol-1": engine_volume("vol-1")}
+    inventory._in_use = {"vol-1"}
+    mocker.patch("src.docker.get_volume_inventory", return_value=inventory)
+    from src.docker import get_volume, get_volumes, is_volume_attached
+
+    assert get_volume("vol-1").name == "vol-1"
+    assert [volume.name for volume in get_volumes()] == ["vol-1"]
+    assert not is_volume_attached("vol-1")
+    mock_docker_client.assert_not_called()
@@ -0,0 +1,45 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.limiter import DEFAULT_DEVICE, BackupLimiter, volume_device
+from tests.fixtures import MockVolume
+
+
+def run_backups(limiter, devices):
+    lock = threading.Lock()
+    running = {"total": 0, "max_total": 0}
+    per_device = {}
+
+    def backup(device):
+        with limiter.acquire(device):
+            with lock:
+                running["total"] += 1
+                per_device[device] = per_device.get(device, 0) + 1
+                running["max_total"] = max(running["max_total"], running["total"])
+                running[device] = max(running.get(device, 0), per_device[device])
+            time.sleep(0.02)
+            with lock:
+                running["total"] -= 1
+                per_device[device] -= 1
+
+    with ThreadPoolExecutor(max_workers=len(devices)) as executor:
+        list(executor.map(backup, devices))
+    return running
+
+
+def test_backup_limiter():
+    limiter = BackupLimiter(max_concurrency=2, max_per_device=1)
+
+    running = run_backups(limiter, ["disk-1"] * 3 + ["disk-2"] * 3 + ["disk-3"] * 3)
+
+    assert running["max_total"] == 2
+    assert running["disk-1"] == running["disk-2"] == running["disk-3"] == 1
+
+
+def test_volume_device(tmp_path):
+    assert volume_device(MockVolume(mountpoint="/does-not-exist")) == DEFAULT_DEVICE
+    assert volume_device(MockVolume(options={"device": "/dev/sdz1"})) == "/dev/sdz1"
+    assert volume_device(MockVolume(mountpoint=str(tmp_path))) == volume_device(
+        MockVolume(options={"type": "none", "o": "bind", "device": str(tmp_path)})
+    )
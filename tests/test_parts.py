@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+
+from src.archive import ArchiveResult
+from src.docker import TarFilter
+from src.helper_limits import current_limits, use_limits
+from src.models import HelperLimits
+from src.parts import part_filename, run_concurrently, split_entries, stream_backup_parts
+from src.progress import current_job, track_progress
+from src.tar_index import ArchiveFrame, ArchiveMember
+
+
+def test_part_filename():
+    assert part_filename("vol-2021-01-01T00:00:00.000+00:00.tar.gz", 3) == (
+        "vol-2021-01-01T00:00:00.000+00:00.part003.tar.gz"
+    )
+    assert part_filename("vol.tar", 0) == "vol.part000.tar"
+
+
+def test_split_entries():
+    entries = [("a", 100), ("b", 60), ("c", 50), ("d", 10), ("e", 1)]
+
+    assert split_entries(entries, 2) == [["a", "d", "e"], ["b", "c"]]
+    assert split_entries(entries[:1], 4) == [["a"]]
+    assert split_entries([], 4) == []
+
+
+def test_run_concurrently():
+    limits = HelperLimits(nice=10)
+
+    def state():
+        return threading.current_thread().name, current_job(), current_limits()
+
+    with track_progress("job-1", "backup", "test-volume") as job, use_limits(limits):
+        results = run_concurrently([state, state])
+
+    assert all(name != threading.current_thread().name for name, _, _ in results)
+    assert all(result[1:] == (job, limits) for result in results)
+
+
+def archive_result(path):
+    return ArchiveResult(
+        size=10,
+        source_size=2048,
+        checksum=f"hash-{path}",
+        frames=[ArchiveFrame(source_offset=0, offset=0, size=10)],
+        members=[ArchiveMember(path, "file", 1, 1, 0, 512)],
+    )
+
+
+def test_stream_backup_parts(mocker, tmp_path):
+    mocker.patch("src.parts.list_top_level_sizes", return_value=[("data", 100), ("logs", 40), (".env", 1)])
+    mock_stream_backup_volume = mocker.patch(
+        "src.parts.stream_backup_volume",
+        side_effect=lambda *args, tar_filter, **kwargs: archive_result(tar_filter.entries[0]),
+    )
+
+    parts = stream_backup_parts("test-volume", str(tmp_path), "test-volume.tar.zst", 2)
+
+    assert [filename for filename, _ in parts] == [
+        "test-volume.part000.tar.zst",
+        "test-volume.part001.tar.zst",
+    ]
+    assert sorted(call.kwargs["tar_filter"].entries for call in mock_stream_backup_volume.call_args_list) == [
+        [".env", "logs"],
+        ["data"],
+    ]
+    assert [(result.members[0].part, result.frames[0].part) for _, result in parts] == [(0, 0), (1, 1)]
+
+
+def test_stream_backup_parts_empty_volume(mocker, tmp_path):
+    mocker.patch("src.parts.list_top_level_sizes", return_value=[])
+    mock_stream_backup_volume = mocker.patch(
+        "src.parts.stream_backup_volume", return_value=archive_result(".")
+    )
+
+    parts = stream_backup_parts("test-volume", str(tmp_path), "test-volume.tar.gz", 4)
+
+    assert [filename for filename, _ in parts] == ["test-volume.part000.tar.gz"]
+    assert mock_stream_backup_volume.call_args.kwargs["tar_filter"] == TarFilter()
+
+
+def test_stream_backup_parts_error(mocker, tmp_path):
+    mocker.patch("src.parts.list_top_level_sizes", return_value=[("data", 100), ("logs", 40)])
+
+    def stream_backup_volume(volume_name, backup_dir, filename, tar_filter, **kwargs):
+        if tar_filter.entries == ["logs"]:
+            raise RuntimeError("tar failed")
+        (tmp_path / filename).write_bytes(b"archive")
+        return archive_result(tar_filter.entries[0])
+
+    mocker.patch("src.parts.stream_backup_volume", side_effect=stream_backup_volume)
+
+    with pytest.raises(RuntimeError, match="tar failed"):
+        stream_backup_parts("test-volume", str(tmp_path), "test-volume.tar.gz", 2)
+
+    assert list(tmp_path.iterdir()) == []
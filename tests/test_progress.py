@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+import pytest
+
+from src.progress import (
+    JobProgress,
+    ProgressRegistry,
+    ProgressSink,
+    progress_events,
+    report_progress,
+    track_progress,
+)
+
+
+def test_track_progress(mocker):
+    registry = ProgressRegistry()
+    mocker.patch("src.progress.PROGRESS", registry)
+
+    with track_progress("job-1", "backup", "test-volume", expected_bytes=4096):
+        report_progress(bytes=1024, files=2)
+        ProgressSink().write(b"a" * 1024)
+        [job] = registry.jobs()
+        assert job["status"] == "running"
+        assert job["bytes"] == 2048
+        assert job["files"] == 2
+
+    # outside of a tracked job nothing is reported
+    report_progress(bytes=1024)
+
+    [job] = registry.jobs()
+    assert job["status"] == "finished"
+    assert job["bytes"] == 2048
+
+
+def test_track_progress_error(mocker):
+    registry = ProgressRegistry()
+    mocker.patch("src.progress.PROGRESS", registry)
+
+    with pytest.raises(RuntimeError), track_progress("job-1", "restore", "test-volume"):
+        raise RuntimeError("helper died")
+
+    [job] = registry.jobs()
+    assert job["status"] == "errored"
+    assert job["error"] == "helper died"
+
+
+def test_job_progress_eta(mocker):
+    mock_time = mocker.patch("src.progress.time.monotonic", side_effect=[0.0, 2.0])
+    job = JobProgress("job-1", "backup", "test-volume", expected_bytes=5000)
+
+    job.add(1000, 1)
+    job.add(1000, 1)
+
+    assert mock_time.call_count == 2
+    assert job.throughput == 500
+    assert job.eta == 6
+
+
+def test_progress_events():
+    registry = ProgressRegistry()
+    registry.start(JobProgress("job-1", "backup", "test-volume"))
+
+    class Request:
+        calls = 0
+
+        async def is_disconnected(self):
+            self.calls += 1
+            return self.calls > 1
+
+    async def collect():
+        return [event async for event in progress_events(Request(), registry)]
+
+    [event] = asyncio.run(collect())
+
+    assert event.startswith("event: progress\ndata: ")
+    [job] = json.loads(event.split("data: ", 1)[1])
+    assert job["job_id"] == "job-1"
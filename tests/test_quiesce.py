@@ -0,0 +1,84 @@
+import pytest
+
+from src.helper_limits import DEFAULT_LIMITS, current_limits, use_limits
+from src.models import HelperLimits, QuiesceMode
+from src.quiesce import quiesced_volume
+from tests.fixtures import MockContainer
+
+
+@pytest.fixture
+def mock_docker(mocker):
+    mocks = mocker.MagicMock()
+    for name in ["get_volume_containers", "create_volume", "remove_volume", "copy_volume", "get_docker_client"]:
+        mocker.patch(f"src.quiesce.{name}", getattr(mocks, name))
+    mocks.get_volume_containers.return_value = [
+        MockContainer("id-1", "app"),
+        MockContainer("id-2", "worker"),
+    ]
+    return mocks
+
+
+def test_quiesced_volume_stop(mock_docker):
+    downtimes = []
+    container = mock_docker.get_docker_client.return_value.container
+
+    with quiesced_volume("test-volume", QuiesceMode.STOP, "backup-id-1", downtimes) as volume_name:
+        # the containers are running again before the copy is archived
+        container.start.assert_called_once()
+        mock_docker.remove_volume.assert_not_called()
+
+    assert volume_name == "test-volume-staging-backup-i"
+    lookups = {"get_volume_containers", "get_docker_client"}
+    assert [call[0] for call in mock_docker.mock_calls if call[0] not in lookups] == [
+        "create_volume",
+        "get_docker_client().container.stop",
+        "copy_volume",
+        "get_docker_client().container.start",
+        "remove_volume",
+    ]
+    mock_docker.copy_volume.assert_called_once_with("test-volume", volume_name)
+    assert [(d.container_id, d.container_name, d.quiesce) for d in downtimes] == [
+        ("id-1", "app", QuiesceMode.STOP),
+        ("id-2", "worker", QuiesceMode.STOP),
+    ]
+    assert all(d.downtime is not None and d.downtime >= 0 for d in downtimes)
+
+
+def test_quiesced_volume_copy_unlimited(mock_docker):
+    limits = HelperLimits(cpus=0.5, nice=19)
+    mock_docker.copy_volume.side_effect = lambda *args: applied.append(current_limits())
+    applied = []
+
+    with use_limits(limits), quiesced_volume("test-volume", QuiesceMode.STOP, "backup-id-1", []):
+        # the copy is archived with the limits of the backup
+        assert current_limits() is limits
+
+    assert applied == [DEFAULT_LIMITS]
+
+
+def test_quiesced_volume_pause_copy_fails(mock_docker):
+    downtimes = []
+    container = mock_docker.get_docker_client.return_value.container
+    mock_docker.copy_volume.side_effect = RuntimeError("copy failed")
+
+    with pytest.raises(RuntimeError, match="copy failed"):
+        with quiesced_volume("test-volume", QuiesceMode.PAUSE, "backup-id-1", downtimes):
+            pass
+
+    container.pause.assert_called_once()
+    container.unpause.assert_called_once()
+    mock_docker.remove_volume.assert_called_once()
+    assert len(downtimes) == 2
+
+
+@pytest.mark.parametrize("mode", [QuiesceMode.NONE, QuiesceMode.STOP])
+def test_quiesced_volume_not_needed(mock_docker, mode):
+    mock_docker.get_volume_containers.return_value = []
+    downtimes = []
+
+    with quiesced_volume("test-volume", mode, "backup-id-1", downtimes) as volume_name:
+        pass
+
+    assert volume_name == "test-volume"
+    mock_docker.create_volume.assert_not_called()
+    assert downtimes == []
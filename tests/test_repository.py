@@ -0,0 +1,147 @@
+import random
+
+import pytest
+from sqlmodel import select
+
+from src.models import RepositoryChunks
+from src.repository import (
+    CHUNK_MAX_SIZE,
+    TAR_BLOCK_SIZE,
+    ChunkStore,
+    backup_volume_to_repository,
+    chunk_tar_stream,
+    read_repository_backup,
+    write_repository_backup,
+)
+from tests.fixtures import MockVolume
+
+
+def random_blocks(count, seed):
+    rand = random.Random(seed)
+    return rand.randbytes(count * TAR_BLOCK_SIZE)
+
+
+def split(data, size):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+def test_chunk_tar_stream():
+    data = random_blocks(20000, seed=1)
+
+    chunks = list(chunk_tar_stream(split(data, 100_000)))
+
+    assert b"".join(chunks) == data
+    assert len(chunks) > 1
+    assert all(len(chunk) % TAR_BLOCK_SIZE == 0 for chunk in chunks)
+    assert all(len(chunk) <= CHUNK_MAX_SIZE for chunk in chunks)
+
+
+def test_chunk_tar_stream_input_size_independent():
+    data = random_blocks(20000, seed=2)
+
+    assert list(chunk_tar_stream(split(data, 4096))) == list(
+        chunk_tar_stream(split(data, 1024 * 1024))
+    )
+
+
+def test_chunk_tar_stream_insert_keeps_later_chunks():
+    data = random_blocks(20000, seed=3)
+    # a new file in the middle of the volume shifts the rest of the tar stream by whole blocks
+    changed = data[: 5000 * TAR_BLOCK_SIZE] + random_blocks(3, seed=4) + data[5000 * TAR_BLOCK_SIZE :]
+
+    chunks = list(chunk_tar_stream([data]))
+    changed_chunks = list(chunk_tar_stream([changed]))
+
+    assert len(set(chunks) & set(changed_chunks)) >= len(chunks) - 2
+
+
+def test_chunk_tar_stream_max_size():
+    data = bytes(CHUNK_MAX_SIZE * 2 + TAR_BLOCK_SIZE)
+
+    chunks = list(chunk_tar_stream([data], avg_size=CHUNK_MAX_SIZE * 4))
+
+    assert [len(chunk) for chunk in chunks] == [
+        CHUNK_MAX_SIZE,
+        CHUNK_MAX_SIZE,
+        TAR_BLOCK_SIZE,
+    ]
+
+
+def test_write_repository_backup_dedup(session, tmp_path):
+    data = random_blocks(20000, seed=5)
+
+    first = write_repository_backup(session, split(data, 65536), str(tmp_path), "one.manifest.json")
+    session.commit()
+    second = write_repository_backup(session, split(data, 65536), str(tmp_path), "two.manifest.json")
+    session.commit()
+
+    assert first.size == second.size == len(data)
+    assert first.new_chunk_count == first.chunk_count
+    assert second.new_chunk_count == 0
+    assert second.new_stored_size == 0
+    assert len(session.exec(select(RepositoryChunks)).all()) == first.chunk_count
+    assert b"".join(read_repository_backup(str(tmp_path), "two.manifest.json")) == data
+
+
+def test_write_repository_backup_indexes_chunks_on_its_own(session, tmp_path):
+    data = random_blocks(20000, seed=8)
+
+    result = write_repository_backup(session, [data], str(tmp_path), "one.manifest.json")
+
+    # the chunks are committed without the caller's session holding them
+    assert not session.new
+    session.rollback()
+    assert len(session.exec(select(RepositoryChunks)).all()) == result.chunk_count
+
+
+def test_write_repository_backup_chunk_indexed_concurrently(mocker, session, tmp_path):
+    data = random_blocks(20000, seed=9)
+    first = write_repository_backup(session, [data], str(tmp_path), "one.manifest.json")
+    # another backup stored the same chunks after this one looked them up
+    mocker.patch("src.repository.db_get_repository_chunk", return_value=None)
+
+    second = write_repository_backup(session, [data], str(tmp_path), "two.manifest.json")
+
+    assert second.new_chunk_count == first.chunk_count
+    assert len(session.exec(select(RepositoryChunks)).all()) == first.chunk_count
+    assert b"".join(read_repository_backup(str(tmp_path), "two.manifest.json")) == data
+    assert not list((tmp_path / "repository" / "chunks").glob("*/*.part"))
+
+
+def test_read_repository_backup_corrupt_chunk(session, tmp_path):
+    data = random_blocks(100, seed=6)
+    write_repository_backup(session, [data], str(tmp_path), "one.manifest.json")
+    store = ChunkStore(str(tmp_path))
+    chunk_hash = store.read_manifest("one.manifest.json")["chunks"][0]
+    store.put(chunk_hash, b"not the chunk")
+
+    with pytest.raises(RuntimeError, match=f"Chunk {chunk_hash} is corrupt"):
+        list(read_repository_backup(str(tmp_path), "one.manifest.json"))
+
+
+def test_backup_volume_to_repository(mocker, session, tmp_path):
+    data = random_blocks(100, seed=7)
+    mocker.patch("src.repository.get_volume", return_value=MockVolume())
+    mock_stream_volume_tar = mocker.patch(
+        "src.repository.stream_volume_tar", return_value=iter([data])
+    )
+
+    result = backup_volume_to_repository(
+        session, "test-volume", str(tmp_path), "test-volume.manifest.json"
+    )
+
+    mock_stream_volume_tar.assert_called_once_with("test-volume", tar_filter=None)
+    assert result.manifest_path == tmp_path / "repository" / "manifests" / "test-volume.manifest.json"
+    assert result.size == len(data)
+
+
+def test_backup_volume_to_repository_not_found(mocker, session, tmp_path):
+    mocker.patch("src.repository.get_volume", return_value=None)
+    mock_stream_volume_tar = mocker.patch("src.repository.stream_volume_tar")
+
+    with pytest.raises(ValueError, match="Volume test-volume does not exist"):
+        backup_volume_to_repository(
+            session, "test-volume", str(tmp_path), "test-volume.manifest.json"
+        )
+
+    mock_stream_volume_tar.assert_not_called()
@@ -0,0 +1,381 @@
+from types import SimpleNamespace
+
+import hashlib
+
+import pytest
+
+from src.models import UploadVerifyMethod
+from src.parts import run_concurrently
+from src.sftp import (
+    ChunkTracker,
+    SftpConnection,
+    SftpConnectionPool,
+    SftpSink,
+    read_remote_file,
+    remote_sha256,
+    sampled_ranges,
+    verify_remote_file,
+    resume_offset,
+    upload_file,
+    upload_with_retries,
+)
+from tests.fixtures import MockSftpClient, MockSftpServer
+
+DATA = bytes(range(256)) * 1000
+
+
+def test_chunk_tracker():
+    confirmed = []
+    tracker = ChunkTracker(0, 250, 100, confirmed.append)
+
+    assert [tracker.next(), tracker.next(), tracker.next(), tracker.next()] == [0, 100, 200, None]
+    tracker.confirm(100)
+    assert tracker.confirmed == 0
+    tracker.confirm(0)
+    tracker.confirm(200)
+    assert confirmed == [200, 250]
+
+
+def test_chunk_tracker_failed():
+    tracker = ChunkTracker(0, 250, 100)
+
+    tracker.next()
+    tracker.fail()
+
+    assert tracker.next() is None
+
+
+def test_resume_offset():
+    server = MockSftpServer()
+    sftp = MockSftpClient(server)
+
+    assert resume_offset(sftp, "/remote/a.tar.gz.partial", 300, 100) == 0
+    server.files["/remote/a.tar.gz.partial"] = bytearray(250)
+    assert resume_offset(sftp, "/remote/a.tar.gz.partial", 300, 100) == 200
+    assert resume_offset(sftp, "/remote/a.tar.gz.partial", 150, 100) == 100
+
+
+def test_upload_file(tmp_path):
+    local_path = tmp_path / "a.tar.gz"
+    local_path.write_bytes(DATA)
+    server = MockSftpServer()
+    confirmed = []
+
+    sent = upload_file(
+        server.connect(),
+        local_path,
+        "/remote/a.tar.gz",
+        on_confirmed=confirmed.append,
+        streams=4,
+        chunk_size=4096,
+    )
+
+    assert sent == len(DATA)
+    assert bytes(server.files["/remote/a.tar.gz"]) == DATA
+    assert "/remote/a.tar.gz.partial" not in server.files
+    assert confirmed == sorted(confirmed)
+    assert confirmed[-1] == len(DATA)
+
+
+def test_upload_file_resumed(tmp_path):
+    local_path = tmp_path / "a.tar.gz"
+    local_path.write_bytes(DATA)
+    server = MockSftpServer(fail_after_writes=5)
+    confirmed = [0]
+
+    with pytest.raises(EOFError):
+        upload_file(
+            server.connect(),
+            local_path,
+            "/remote/a.tar.gz",
+            on_confirmed=lambda offset: confirmed.append(offset),
+            streams=1,
+            chunk_size=32 * 1024,
+        )
+
+    # a 32KiB chunk is written in a single request
+    assert confirmed[-1] == 5 * 32 * 1024
+    server.fail_after_writes = None
+    sent = upload_file(
+        server.connect(),
+        local_path,
+        "/remote/a.tar.gz",
+        confirmed[-1],
+        streams=2,
+        chunk_size=32 * 1024,
+    )
+
+    assert sent == len(DATA) - confirmed[-1]
+    assert bytes(server.files["/remote/a.tar.gz"]) == DATA
+
+
+def test_upload_with_retries(mocker):
+    mocker.patch("src.sftp.time.sleep")
+    server = MockSftpServer()
+    upload = mocker.MagicMock(side_effect=[EOFError("connection dropped"), OSError("reset"), 10])
+
+    assert upload_with_retries(server.connect, upload, 2, 30) == 10
+    assert server.connections == 3
+
+    upload = mocker.MagicMock(side_effect=RuntimeError("host key"))
+    with pytest.raises(RuntimeError):
+        upload_with_retries(server.connect, upload, 2, 30)
+    upload.assert_called_once()
+
+    upload = mocker.MagicMock(side_effect=EOFError("connection dropped"))
+    with pytest.raises(EOFError):
+        upload_with_retries(server.connect, upload, 2, 30)
+    assert upload.call_count == 3
+
+
+def sftp_source(id="source-1", hostname="nas.local"):
+    return SimpleNamespace(id=id, hostname=hostname, port=22, remote_path="/remote")
+
+
+def test_connection_pool_reuses_connections(mocker):
+    server = MockSftpServer()
+    mocker.patch("src.sftp.connect", side_effect=server.connect)
+    pool = SftpConnectionPool()
+
+    def use_connection():
+        with pool.connection(sftp_source()) as connection:
+            return connection
+
+    connections = run_concurrently([use_connection] * 8, max_workers=8)
+    with pool.connection(sftp_source(id="source-2")):
+        pass
+
+    assert len({id(connection) for connection in connections}) == 1
+    assert server.connections == 2
+    # sources on the same host share its channels
+    assert pool._host_channels(sftp_source(id="source-2")) is connections[0].channels
+
+
+def test_connection_pool_reconnects_dropped(mocker):
+    server = MockSftpServer()
+    mocker.patch("src.sftp.connect", side_effect=server.connect)
+    pool = SftpConnectionPool()
+
+    with pool.connection(sftp_source()) as connection:
+        connection.transport.active = False
+    with pool.connection(sftp_source()) as reconnected:
+        pass
+
+    assert reconnected is not connection
+    assert server.connections == 2
+
+
+def test_connection_pool_evicts_idle(mocker):
+    server = MockSftpServer()
+    mocker.patch("src.sftp.connect", side_effect=server.connect)
+    pool = SftpConnectionPool(idle_timeout=0)
+
+    with pool.connection(sftp_source()) as busy:
+        pool.evict_idle()
+        assert busy.is_active()
+    pool.evict_idle()
+
+    assert not busy.is_active()
+    with pool.connection(sftp_source()) as connection:
+        pool.close("source-1")
+        assert connection.is_active()
+    assert not connection.is_active()
+
+
+def test_connection_pool_caps_channels(mocker, tmp_path):
+    local_path = tmp_path / "a.tar.gz"
+    local_path.write_bytes(DATA)
+    server = MockSftpServer()
+    mocker.patch("src.sftp.connect", side_effect=server.connect)
+    pool = SftpConnectionPool(max_channels=2)
+
+    def upload(name):
+        with pool.connection(sftp_source()) as connection:
+            return upload_file(connection, local_path, f"/remote/{name}", streams=4, chunk_size=4096)
+
+    uploads = [lambda: upload("a.tar.gz"), lambda: upload("b.tar.gz")]
+
+    assert run_concurrently(uploads, max_workers=2) == [len(DATA)] * 2
+    assert server.max_open_channels <= 2
+    assert bytes(server.files["/remote/b.tar.gz"]) == DATA
+
+
+def write_sink(sink, data, size=4096):
+    for offset in range(0, len(data), size):
+        sink.write(data[offset : offset + size])
+
+
+def test_sftp_sink(mocker):
+    server = MockSftpServer()
+    mocker.patch("src.sftp.connect", side_effect=server.connect)
+    sink = SftpSink(sftp_source(), "a.tar.gz", chunk_size=32 * 1024)
+
+    write_sink(sink, DATA)
+    sink.close()
+
+    assert sink.complete
+    assert not sink.detached
+    assert sink.size == sink.confirmed == len(DATA)
+    assert bytes(server.files["/remote/a.tar.gz"]) == DATA
+    assert "/remote/a.tar.gz.partial" not in server.files
+
+
+def test_sftp_sink_detaches_slow_source(mocker):
+    server = MockSftpServer()
+    mocker.patch("src.sftp.connect", side_effect=server.connect)
+    server.accepting.clear()
+    sink = SftpSink(sftp_source(), "a.tar.gz", buffer_size=16 * 1024, stall_timeout=0.05)
+
+    write_sink(sink, DATA)
+    server.accepting.set()
+    sink.close()
+
+    assert sink.detached
+    assert not sink.complete
+    assert sink.error == "fell behind the backup for 0.05s"
+    assert "/remote/a.tar.gz" not in server.files
+    assert len(server.files["/remote/a.tar.gz.partial"]) == sink.confirmed < len(DATA)
+
+
+def test_sftp_sink_failed_connection(mocker):
+    server = MockSftpServer(fail_after_writes=2)
+    mocker.patch("src.sftp.connect", side_effect=server.connect)
+    sink = SftpSink(sftp_source(), "a.tar.gz", chunk_size=4096)
+
+    write_sink(sink, DATA)
+    sink.close()
+
+    assert sink.detached
+    assert sink.error == "connection dropped"
+    assert sink.confirmed <= 2 * 4096
+
+
+def test_sftp_sink_abort(mocker):
+    server = MockSftpServer()
+    mocker.patch("src.sftp.connect", side_effect=server.connect)
+    sink = SftpSink(sftp_source(), "a.tar.gz")
+
+    write_sink(sink, DATA[:8192])
+    sink.abort()
+
+    assert not sink.complete
+    assert server.files == {}
+
+
+def test_read_remote_file():
+    server = MockSftpServer()
+    server.files["/remote/a.tar.gz"] = bytearray(DATA)
+
+    chunks = list(
+        read_remote_file(
+            server.connect(), "/remote/a.tar.gz", len(DATA), streams=3, chunk_size=4096, read_ahead=8192
+        )
+    )
+
+    assert b"".join(chunks) == DATA
+    assert {len(chunk) for chunk in chunks[:-1]} == {4096}
+    assert server.open_channels == 0
+
+
+def test_read_remote_file_short():
+    server = MockSftpServer()
+    server.files["/remote/a.tar.gz"] = bytearray(DATA[:10000])
+
+    with pytest.raises(RuntimeError, match="shorter than"):
+        list(read_remote_file(server.connect(), "/remote/a.tar.gz", len(DATA), chunk_size=4096))
+    assert server.open_channels == 0
+
+
+def test_read_remote_file_stopped():
+    server = MockSftpServer()
+    server.files["/remote/a.tar.gz"] = bytearray(DATA)
+
+    chunks = read_remote_file(server.connect(), "/remote/a.tar.gz", len(DATA), chunk_size=4096)
+    assert next(chunks) == DATA[:4096]
+    chunks.close()
+
+    assert server.open_channels == 0
+
+
+def test_remote_sha256():
+    server = MockSftpServer()
+    server.files["/remote/a b.tar.gz"] = bytearray(DATA)
+
+    assert remote_sha256(server.connect(), "/remote/a b.tar.gz") == hashlib.sha256(DATA).hexdigest()
+    assert server.commands == ["sha256sum '/remote/a b.tar.gz'"]
+    assert remote_sha256(server.connect(), "/remote/missing.tar.gz") is None
+    assert len(server.commands) == 4
+
+    server.sftp_only = True
+    assert remote_sha256(server.connect(), "/remote/a b.tar.gz") is None
+    # the other commands would run the sftp server too
+    assert len(server.commands) == 5
+
+
+def test_connection_run(mocker):
+    transport = mocker.MagicMock()
+    channel = transport.open_session.return_value
+    channel.makefile.return_value.read.return_value = b"output\n"
+    channel.recv_exit_status.return_value = 0
+    connection = SftpConnection(transport)
+
+    assert connection.run("true", timeout=5) == (0, b"output\n")
+    channel.settimeout.assert_called_once_with(5)
+    # the command's input is closed so a server running an sftp server for it doesn't wait on it
+    assert channel.method_calls[:3] == [
+        mocker.call.settimeout(5),
+        mocker.call.exec_command("true"),
+        mocker.call.shutdown_write(),
+    ]
+    channel.close.assert_called_once()
+
+
+def test_remote_sha256_timeout(mocker):
+    transport = mocker.MagicMock()
+    channel = transport.open_session.return_value
+    channel.makefile.return_value.read.side_effect = TimeoutError
+
+    assert remote_sha256(SftpConnection(transport), "/remote/a.tar.gz") is None
+    # the other commands aren't tried
+    channel.exec_command.assert_called_once_with("sha256sum /remote/a.tar.gz")
+    channel.close.assert_called_once()
+
+
+def test_sampled_ranges():
+    assert sampled_ranges(0, 4, 100) == []
+    assert sampled_ranges(300, 4, 100) == [(0, 300)]
+
+    ranges = sampled_ranges(10000, 4, 100)
+    assert ranges[0] == (0, 100)
+    assert ranges[-1] == (9900, 100)
+    assert 2 <= len(ranges) <= 4
+    assert all(0 <= offset <= 9900 and size == 100 for offset, size in ranges)
+
+
+def test_verify_remote_file(tmp_path):
+    local_path = tmp_path / "a.tar.gz"
+    local_path.write_bytes(DATA)
+    server = MockSftpServer()
+    server.files["/remote/a.tar.gz"] = bytearray(DATA)
+    checksum = hashlib.sha256(DATA).hexdigest()
+
+    result = verify_remote_file(server.connect(), "/remote/a.tar.gz", len(DATA), checksum, local_path)
+    assert (result.verified, result.method, result.checksum) == (True, UploadVerifyMethod.Hash, checksum)
+
+    result = verify_remote_file(server.connect(), "/remote/a.tar.gz", len(DATA), "0" * 64, local_path)
+    assert (result.verified, result.method) == (False, UploadVerifyMethod.Hash)
+
+    # without a hash command ranges are compared with the local archive
+    server.sftp_only = True
+    result = verify_remote_file(server.connect(), "/remote/a.tar.gz", len(DATA), checksum, local_path)
+    assert (result.verified, result.method) == (True, UploadVerifyMethod.Sampled)
+
+    server.files["/remote/a.tar.gz"][0] ^= 0xFF
+    result = verify_remote_file(server.connect(), "/remote/a.tar.gz", len(DATA), checksum, local_path)
+    assert (result.verified, result.method) == (False, UploadVerifyMethod.Sampled)
+
+    result = verify_remote_file(server.connect(), "/remote/a.tar.gz", len(DATA) + 1, checksum, local_path)
+    assert (result.verified, result.method) == (False, None)
+
+    with pytest.raises(RuntimeError, match="the local archive is gone"):
+        verify_remote_file(server.connect(), "/remote/a.tar.gz", len(DATA), checksum, None)
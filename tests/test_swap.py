@@ -0,0 +1,76 @@
+import pytest
+
+from src.swap import swap_restore, verify_restored_volume
+from src.tar_index import ArchiveMember
+from tests.fixtures import MockContainer, MockVolume
+
+
+@pytest.fixture
+def mock_docker(mocker):
+    mocks = mocker.MagicMock()
+    for name in [
+        "get_volume",
+        "get_volume_containers",
+        "create_volume",
+        "remove_volume",
+        "exchange_volumes",
+        "list_volume_files",
+        "get_docker_client",
+    ]:
+        mocker.patch(f"src.swap.{name}", getattr(mocks, name))
+    mocks.get_volume.return_value = MockVolume(mountpoint="/var/lib/docker/volumes/test-volume/_data")
+    mocks.get_volume_containers.return_value = [MockContainer("id-1", "app")]
+    return mocks
+
+
+def member(path, size, member_type="file"):
+    return ArchiveMember(path=path, member_type=member_type, size=size, mtime=0, offset=0, data_offset=0)
+
+
+def test_swap_restore(mock_docker):
+    container = mock_docker.get_docker_client.return_value.container
+
+    with swap_restore("test-volume", "restore-id-1") as volume_name:
+        # the live volume isn't touched while restoring
+        mock_docker.exchange_volumes.assert_not_called()
+        container.stop.assert_not_called()
+
+    assert volume_name == "test-volume-rollback-restore-"
+    mock_docker.create_volume.assert_called_once_with(
+        volume_name, labels={"docker-volume-backup.rollback": "test-volume"}
+    )
+    lookups = {"get_volume", "get_volume_containers", "get_docker_client", "create_volume"}
+    assert [call[0] for call in mock_docker.mock_calls if call[0] not in lookups] == [
+        "get_docker_client().container.stop",
+        "exchange_volumes",
+        "get_docker_client().container.start",
+    ]
+    mock_docker.exchange_volumes.assert_called_once_with("test-volume", volume_name)
+    mock_docker.remove_volume.assert_not_called()
+
+
+def test_swap_restore_failed(mock_docker):
+    with pytest.raises(RuntimeError, match="tar failed"), swap_restore("test-volume", "restore-id-1"):
+        raise RuntimeError("tar failed")
+
+    mock_docker.exchange_volumes.assert_not_called()
+    mock_docker.remove_volume.assert_called_once_with("test-volume-rollback-restore-")
+
+
+def test_swap_restore_not_local_volume(mock_docker):
+    mock_docker.get_volume.return_value = MockVolume(options={"type": "nfs"})
+
+    with pytest.raises(ValueError, match="can't be swapped"), swap_restore("test-volume", "restore-id-1"):
+        pass
+
+    mock_docker.create_volume.assert_not_called()
+
+
+def test_verify_restored_volume(mock_docker):
+    mock_docker.list_volume_files.return_value = {"a.txt": 3, "dir/b.txt": 5, "extra.txt": 1}
+
+    verify_restored_volume("test-volume", [member("a.txt", 3), member("dir", 0, "dir"), member("dir/b.txt", 5)])
+
+    mock_docker.list_volume_files.return_value = {"a.txt": 4}
+    with pytest.raises(RuntimeError, match="1 files are missing and 1 have another size"):
+        verify_restored_volume("test-volume", [member("a.txt", 3), member("dir/b.txt", 5)])
@@ -0,0 +1,110 @@
+import io
+import tarfile
+
+import pytest
+
+from src.archive import FileSink, write_archive
+from src.models import BackupCodec
+from src.tar_index import ArchiveFrame, ArchiveMember, TarIndexer, read_archive_members, read_archive_ranges
+
+LONG_NAME = "nested/" + "a" * 120 + "/file.txt"
+
+
+def build_tar(files: dict[str, bytes], tar_format: int = tarfile.GNU_FORMAT) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w", format=tar_format) as tar:
+        directory = tarfile.TarInfo("./nested")
+        directory.type = tarfile.DIRTYPE
+        tar.addfile(directory)
+        for name, data in files.items():
+            info = tarfile.TarInfo(f"./{name}")
+            info.size = len(data)
+            info.mtime = 1700000000
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+def chunked(data: bytes, size: int = 1000) -> list[bytes]:
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+FILES = {
+    "first.txt": b"first" * 100,
+    "nested/big.bin": bytes(range(256)) * 400,
+    LONG_NAME: b"long name",
+}
+
+
+@pytest.mark.parametrize("tar_format", [tarfile.GNU_FORMAT, tarfile.PAX_FORMAT])
+def test_tar_indexer(tar_format):
+    data = build_tar(FILES, tar_format)
+    indexer = TarIndexer()
+
+    assert b"".join(indexer.observe(chunked(data))) == data
+
+    members = {member.path: member for member in indexer.members}
+    assert list(members) == ["nested", "first.txt", "nested/big.bin", LONG_NAME]
+    assert members["nested"].member_type == "dir"
+    for name, content in FILES.items():
+        member = members[name]
+        assert member.member_type == "file"
+        assert member.size == len(content)
+        assert member.mtime == 1700000000
+        assert data[member.data_offset : member.data_offset + member.size] == content
+    # the long name header is part of the member
+    assert members[LONG_NAME].offset < members[LONG_NAME].data_offset - 512
+
+
+@pytest.mark.parametrize("codec", [BackupCodec.GZIP, BackupCodec.NONE])
+def test_read_archive_ranges(tmp_path, codec):
+    data = build_tar(FILES)
+    indexer = TarIndexer()
+    path = tmp_path / "test-volume.tar"
+
+    result = write_archive(indexer.observe(chunked(data)), [FileSink(path)], codec=codec, frame_size=4096)
+
+    if codec == BackupCodec.GZIP:
+        assert len(result.frames) > 1
+    members = {member.path: member for member in indexer.members}
+    member = members["nested/big.bin"]
+    extracted = b"".join(
+        read_archive_ranges(
+            path, codec, result.frames, [(member.data_offset, member.data_offset + member.size)]
+        )
+    )
+    assert extracted == FILES["nested/big.bin"]
+
+
+def test_read_archive_members(tmp_path):
+    data = build_tar(FILES)
+    indexer = TarIndexer()
+    path = tmp_path / "test-volume.tar.gz"
+    result = write_archive(indexer.observe(chunked(data)), [FileSink(path)], frame_size=4096)
+    members = [member for member in indexer.members if member.path in ("first.txt", LONG_NAME)]
+
+    stream = b"".join(read_archive_members([path], BackupCodec.GZIP, result.frames, members))
+
+    with tarfile.open(fileobj=io.BytesIO(stream)) as tar:
+        assert tar.getnames() == ["./first.txt", f"./{LONG_NAME}"]
+        assert tar.extractfile(f"./{LONG_NAME}").read() == b"long name"
+
+
+def test_read_archive_members_parts(tmp_path):
+    paths, frames, members = [], [], []
+    for part, files in enumerate([{"first.txt": FILES["first.txt"]}, {"other.txt": b"other"}]):
+        indexer = TarIndexer()
+        path = tmp_path / f"test-volume.part{part:03d}.tar.gz"
+        result = write_archive(indexer.observe(chunked(build_tar(files))), [FileSink(path)], frame_size=4096)
+        paths.append(path)
+        frames.extend(ArchiveFrame(frame.source_offset, frame.offset, frame.size, part) for frame in result.frames)
+        members.extend(
+            ArchiveMember(m.path, m.member_type, m.size, m.mtime, m.offset, m.data_offset, part)
+            for m in indexer.members
+            if m.member_type == "file"
+        )
+
+    stream = b"".join(read_archive_members(paths, BackupCodec.GZIP, frames, members))
+
+    with tarfile.open(fileobj=io.BytesIO(stream)) as tar:
+        assert tar.getnames() == ["./first.txt", "./other.txt"]
+        assert tar.extractfile("./other.txt").read() == b"other"